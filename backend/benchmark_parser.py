@@ -0,0 +1,400 @@
+"""
+Parser Benchmark Suite
+
+Times each stage of the agreement parser over a fixed corpus:
+- sample_agreement.txt and the real agreement embedded in test_real_agreement.py
+- generated synthetic agreements of 10 to 300 pages, as TXT, DOCX and PDF
+
+Stages:
+    extract     DocumentParser.extract_text_from_file (PDF/DOCX/TXT to text)
+    sections    section index and prompt chunks (agreement_sections)
+    patterns    fallback pattern parse (_parse_with_patterns)
+    normalize   schedule normalization (_normalize_parsed_data)
+
+With --prompts, each TXT document is also parsed through the full LLM path
+against llm_stub_server.py (whose latency grows with prompt size), with and
+without prompt compaction, to compare prompt tokens, latency and the parsed
+fields.
+
+Every (stage, document) pair runs in its own subprocess, so the reported
+peak RSS belongs to that stage alone. Output is pages/s, p50/p99 latency and
+peak RSS per stage. Pages/s counts the whole document, so PDF extraction
+that stops early (PDF_EARLY_EXIT) shows as higher throughput.
+
+Usage:
+    python benchmark_parser.py                       # full run
+    python benchmark_parser.py --quick               # 10/50-page documents, 3 iterations
+    python benchmark_parser.py --save-baseline       # write benchmarks/parser_baseline.json
+    python benchmark_parser.py --compare             # show change against the saved baseline
+    python benchmark_parser.py --quick --prompts     # also measure prompt compaction
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "parser_baseline.json")
+SAMPLE_AGREEMENT = os.path.join(BACKEND_DIR, "..", "sample_agreement.txt")
+
+STAGES = ["extract", "sections", "patterns", "normalize"]
+PAGE_SIZES = [10, 50, 100, 300]
+FORMATS = ["txt", "docx", "pdf"]
+LINES_PER_PAGE = 40
+# Rough text size of one printed page, for documents that aren't paginated
+CHARS_PER_PAGE = 3000
+
+FILLER = (
+    "The parties acknowledge that this provision was negotiated at arm's length and is fair and reasonable."
+)
+
+
+def synthetic_pages(page_count: int) -> List[List[str]]:
+    """A long settlement agreement: custody articles up front, then property articles and exhibits."""
+    pages = [
+        ["MARITAL SETTLEMENT AGREEMENT", "This agreement is made between Jane Doe (Parent 1) and John Doe (Parent 2)."],
+        ["ARTICLE 1 - LEGAL CUSTODY", "The parents shall share joint legal custody of the minor children."],
+        ["ARTICLE 2 - PHYSICAL CUSTODY AND PARENTING TIME",
+         "The parents shall follow a 2-2-3 rotating schedule, alternating weekends.",
+         "Holidays shall alternate between the parents each year."],
+        ["ARTICLE 3 - CHILD SUPPORT AND EXPENSES",
+         "Parent 1 shall pay child support of $850 per month. Expenses are split 50/50."],
+    ]
+    article = 4
+    while len(pages) < page_count:
+        title = f"ARTICLE {article} - PROPERTY DIVISION" if len(pages) < page_count * 0.6 else f"EXHIBIT {article}"
+        pages.append([title])
+        article += 1
+    for lines in pages:
+        lines.extend(f"{number}. {FILLER}" for number in range(len(lines), LINES_PER_PAGE))
+    return pages[:page_count]
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Minimal text-layer PDF (Helvetica, one content stream per page)."""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")  # filled in once the page ids are known
+    kids = []
+    for lines in pages:
+        ops = ["BT /F1 9 Tf 11 TL 40 800 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font, content)
+        ))
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % kid for kid in kids) + b"] /Count %d >>" % len(kids)
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def make_docx(pages: List[List[str]]) -> bytes:
+    from docx import Document
+    from docx.enum.text import WD_BREAK
+
+    document = Document()
+    for lines in pages:
+        for line in lines:
+            document.add_paragraph(line)
+        document.paragraphs[-1].add_run().add_break(WD_BREAK.PAGE)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def build_corpus(directory: str, page_sizes: List[int], formats: List[str]) -> List[Dict]:
+    """Write the corpus files to `directory`; returns one entry per document."""
+    corpus = []
+
+    def add(name: str, file_type: str, content: bytes, pages: int):
+        path = os.path.join(directory, f"{name}.{file_type}")
+        with open(path, "wb") as f:
+            f.write(content)
+        corpus.append({"name": name, "file_type": file_type, "path": path, "pages": pages, "bytes": len(content)})
+
+    if os.path.exists(SAMPLE_AGREEMENT):
+        with open(SAMPLE_AGREEMENT, "rb") as f:
+            content = f.read()
+        add("sample_agreement", "txt", content, max(1, round(len(content) / CHARS_PER_PAGE)))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from test_real_agreement import REAL_AGREEMENT
+    add("real_agreement", "txt", REAL_AGREEMENT.encode("utf-8"), max(1, round(len(REAL_AGREEMENT) / CHARS_PER_PAGE)))
+
+    for page_count in page_sizes:
+        pages = synthetic_pages(page_count)
+        for file_type in formats:
+            if file_type == "txt":
+                content = "\n\n".join("\n".join(lines) for lines in pages).encode("utf-8")
+            elif file_type == "docx":
+                content = make_docx(pages)
+            else:
+                content = make_pdf(pages)
+            add(f"synthetic_{page_count}p", file_type, content, page_count)
+    return corpus
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_stage(stage: str, path: str, file_type: str, iterations: int) -> Dict:
+    """Run one stage on one document in this process and return its timings."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        from services import agreement_sections
+        from services.document_parser import DocumentParser
+        parser = DocumentParser(ai_provider="none")
+
+    with open(path, "rb") as f:
+        content = f.read()
+    # Inputs for the later stages are prepared before the RSS baseline
+    text = parser.extract_text_from_file(content, file_type) if stage != "extract" else None
+    rss_before = _peak_rss_mb()
+
+    def once():
+        if stage == "extract":
+            parser.extract_text_from_file(content, file_type)
+        elif stage == "sections":
+            agreement_sections.SectionIndex(text).chunks()
+        elif stage == "patterns":
+            agreement_sections.index_for.cache_clear()
+            parser._parse_with_patterns(text)
+        elif stage == "normalize":
+            agreement_sections.index_for.cache_clear()
+            parser._normalize_parsed_data({"custodySchedule": "Custom schedule"}, text)
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(iterations):
+            started = time.perf_counter()
+            once()
+            samples.append(time.perf_counter() - started)
+    return {"samples": samples, "rss_before_mb": rss_before, "peak_rss_mb": _peak_rss_mb()}
+
+
+def _run_in_subprocess(stage: str, document: Dict, iterations: int) -> Dict:
+    command = [sys.executable, os.path.abspath(__file__), "--worker", stage, document["path"], document["file_type"], str(iterations)]
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=BACKEND_DIR)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{stage} on {document['name']}.{document['file_type']} failed:\n{completed.stderr.strip()}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(stage: str, document: Dict, measured: Dict) -> Dict:
+    from services.metrics import percentile
+
+    samples = measured["samples"]
+    p50 = percentile(samples, 50)
+    return {
+        "stage": stage,
+        "document": f"{document['name']}.{document['file_type']}",
+        "pages": document["pages"],
+        "bytes": document["bytes"],
+        "iterations": len(samples),
+        "p50_ms": round(p50 * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "pages_per_s": round(document["pages"] / p50, 1) if p50 else None,
+        "peak_rss_mb": measured["peak_rss_mb"],
+        "rss_delta_mb": round(measured["peak_rss_mb"] - measured["rss_before_mb"], 1),
+    }
+
+
+# Fields compared between compacted and full prompts
+PROMPT_FIELDS = ("custodyArrangement", "custodySchedule", "holidaySchedule", "decisionMaking", "childSupport")
+
+
+async def _parse_with_stub(handler, text: str, token_budget: int):
+    from services.document_parser import DocumentParser
+
+    parser = DocumentParser(api_key="stub", tiered=False)
+    parser.prompt_token_budget = token_budget
+    tokens_before = handler.prompt_tokens
+    started = time.perf_counter()
+    parsed = await parser.parse_with_ai(text)
+    return time.perf_counter() - started, handler.prompt_tokens - tokens_before, parsed
+
+
+def benchmark_prompts(corpus: List[Dict], token_delay: float) -> List[Dict]:
+    """Prompt tokens, stub LLM latency and parsed fields with and without compaction."""
+    from llm_stub_server import start_in_thread
+    from services import agreement_sections
+
+    server, base_url = start_in_thread(token_delay=token_delay)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    handler = server.RequestHandlerClass
+    results = []
+
+    async def run():
+        # The first request also opens the connection; keep that out of the timings
+        await _parse_with_stub(handler, "Warm-up agreement with a 2-2-3 schedule.", 0)
+        for document in corpus:
+            if document["file_type"] != "txt":
+                continue
+            with open(document["path"], encoding="utf-8") as f:
+                text = f.read()
+            full_seconds, full_tokens, full = await _parse_with_stub(handler, text, 0)
+            compact_seconds, compact_tokens, compact = await _parse_with_stub(handler, text, agreement_sections.PROMPT_TOKEN_BUDGET)
+            results.append({
+                "document": f"{document['name']}.{document['file_type']}",
+                "pages": document["pages"],
+                "full_tokens": full_tokens,
+                "compact_tokens": compact_tokens,
+                "full_ms": round(full_seconds * 1000, 1),
+                "compact_ms": round(compact_seconds * 1000, 1),
+                "fields_match": all(full.get(field) == compact.get(field) for field in PROMPT_FIELDS),
+            })
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+    finally:
+        server.shutdown()
+        os.environ.pop("OPENAI_BASE_URL", None)
+    return results
+
+
+def print_prompt_table(results: List[Dict]):
+    header = f"{'document':<24} {'tokens':>7} {'compact':>8} {'saved':>6} {'full ms':>8} {'compact ms':>11} {'fields':>7}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        saved = (1 - row["compact_tokens"] / row["full_tokens"]) * 100 if row["full_tokens"] else 0.0
+        print(f"{row['document']:<24} {row['full_tokens']:>7} {row['compact_tokens']:>8} {saved:>5.0f}% "
+              f"{row['full_ms']:>8.1f} {row['compact_ms']:>11.1f} {'same' if row['fields_match'] else 'DIFF':>7}")
+
+
+def print_table(results: List[Dict], baseline: Dict = None):
+    header = f"{'stage':<10} {'document':<24} {'pages':>5} {'p50 ms':>9} {'p99 ms':>9} {'pages/s':>9} {'peak MB':>8} {'+MB':>6}"
+    if baseline:
+        header += f" {'p50 vs base':>12}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        line = (f"{row['stage']:<10} {row['document']:<24} {row['pages']:>5} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+                f"{(row['pages_per_s'] or 0):>9.1f} {row['peak_rss_mb']:>8.1f} {row['rss_delta_mb']:>6.1f}")
+        if baseline:
+            previous = baseline.get((row["stage"], row["document"]))
+            if previous and previous["p50_ms"]:
+                change = (row["p50_ms"] - previous["p50_ms"]) / previous["p50_ms"] * 100
+                line += f" {change:>+11.1f}%"
+            else:
+                line += f" {'new' if previous is None else '-':>12}"
+        print(line)
+
+
+def load_baseline(path: str) -> Dict:
+    with open(path) as f:
+        saved = json.load(f)
+    return {(row["stage"], row["document"]): row for row in saved["results"]}
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the agreement parser stages")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    parser.add_argument("--pages", default=",".join(map(str, PAGE_SIZES)), help="Synthetic document sizes in pages")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="Synthetic document formats")
+    parser.add_argument("--iterations", type=int, help="Timed runs per stage and document (default 5, 3 with --quick)")
+    parser.add_argument("--quick", action="store_true", help="10 and 50 pages, 3 iterations")
+    parser.add_argument("--prompts", action="store_true", help="Also compare prompt tokens and latency with and without compaction")
+    parser.add_argument("--token-delay", type=float, default=0.5, help="Stub LLM seconds per 1,000 prompt tokens (--prompts)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="Save results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="Compare against a saved baseline")
+    parser.add_argument("--worker", nargs=4, metavar=("STAGE", "PATH", "TYPE", "ITERATIONS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        stage, path, file_type, iterations = args.worker
+        print(json.dumps(run_stage(stage, path, file_type, int(iterations))))
+        return 0
+
+    if args.quick:
+        args.pages = "10,50"
+    if args.iterations is None:
+        args.iterations = 3 if args.quick else 5
+    stages = [stage for stage in args.stages.split(",") if stage]
+    page_sizes = [int(pages) for pages in args.pages.split(",") if pages]
+    formats = [file_type for file_type in args.formats.split(",") if file_type]
+
+    baseline = None
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print(f"❌ No baseline at {args.compare}; run with --save-baseline first")
+            return 1
+        baseline = load_baseline(args.compare)
+
+    print("\n" + "=" * 60)
+    print("⏱️  PARSER BENCHMARK")
+    print("=" * 60)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="parser-bench-") as corpus_dir:
+        corpus = build_corpus(corpus_dir, page_sizes, formats)
+        print(f"{len(corpus)} documents, stages: {', '.join(stages)}, {args.iterations} iterations each\n")
+        for stage in stages:
+            for document in corpus:
+                results.append(summarize(stage, document, _run_in_subprocess(stage, document, args.iterations)))
+        prompt_results = benchmark_prompts(corpus, args.token_delay) if args.prompts else None
+
+    print_table(results, baseline)
+    if prompt_results:
+        print(f"\nPrompt compaction (stub LLM, {args.token_delay}s per 1k prompt tokens)\n")
+        print_prompt_table(prompt_results)
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "env": {key: os.environ[key] for key in ("PDF_EARLY_EXIT", "PDF_PAGE_BUDGET", "EXTRACTION_REQUIRED_SECTIONS") if key in os.environ},
+        "results": results,
+    }
+    if prompt_results:
+        report["prompts"] = prompt_results
+    for path in filter(None, [args.json, args.save_baseline]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Saved results to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Upload Path Benchmark
+
+Compares the memory and CPU cost of taking a base64 JSON upload from the
+request body to stored file + parse input, before and after uploads were
+decoded once into a shared buffer:
+
+    legacy    the previous sequence of operations: documents decoded the
+              base64 string once for the size, again to save the file and
+              again to parse it; contracts were decoded and hashed in the
+              pipeline and the base64 string was stored on the family
+    single    file_storage.decode_base64 once, then the same memoryview is
+              sized, hashed and written (write_buffer) and handed to the
+              parser with its digest
+
+Every (path, flow, size) case runs in its own subprocess, so peak RSS
+belongs to that case alone. The base64 payload is built before the RSS
+baseline, as the request body would already be in memory.
+
+Usage:
+    python benchmark_upload.py                     # 1, 10 and 50 MB files
+    python benchmark_upload.py --sizes 1,5 --iterations 3
+    python benchmark_upload.py --json results.json
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import file_storage
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PATHS = ["legacy", "single"]
+FLOWS = ["document", "contract"]
+SIZES_MB = [1, 10, 50]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def legacy_upload(flow: str, encoded: str, path: str):
+    if flow == "document":
+        file_size = len(base64.b64decode(encoded))
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(encoded))
+        file_content = base64.b64decode(encoded)
+    else:
+        file_content = base64.b64decode(encoded)
+        file_size = len(file_content)
+        with open(path, "w") as f:
+            # The base64 string went into the family document
+            f.write(encoded)
+    return file_size, hashlib.sha256(file_content).hexdigest(), file_content
+
+
+def single_upload(flow: str, encoded: str, path: str):
+    file_content = file_storage.decode_base64(encoded, max_bytes=0)
+    stored = file_storage.write_buffer(file_content, path)
+    return stored.size, stored.sha256, file_content
+
+
+def run_case(path_name: str, flow: str, size_mb: int, iterations: int) -> Dict:
+    """Run one case in this process and return its timings."""
+    upload = legacy_upload if path_name == "legacy" else single_upload
+    encoded = base64.b64encode(os.urandom(size_mb * 1024 * 1024)).decode("ascii")
+    rss_before = _peak_rss_mb()
+    samples, cpu = [], []
+    with tempfile.TemporaryDirectory(prefix="upload-bench-") as directory:
+        target = os.path.join(directory, "upload.bin")
+        for _ in range(iterations):
+            cpu_started = _cpu_seconds()
+            started = time.perf_counter()
+            result = upload(flow, encoded, target)
+            samples.append(time.perf_counter() - started)
+            cpu.append(_cpu_seconds() - cpu_started)
+            del result
+    return {"samples": samples, "cpu": cpu, "rss_before_mb": rss_before, "peak_rss_mb": _peak_rss_mb()}
+
+
+def _run_in_subprocess(path_name: str, flow: str, size_mb: int, iterations: int) -> Dict:
+    command = [sys.executable, os.path.abspath(__file__), "--worker", path_name, flow, str(size_mb), str(iterations)]
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=BACKEND_DIR)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{path_name} {flow} {size_mb} MB failed:\n{completed.stderr.strip()}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(path_name: str, flow: str, size_mb: int, measured: Dict) -> Dict:
+    from services.metrics import percentile
+
+    return {
+        "path": path_name,
+        "flow": flow,
+        "size_mb": size_mb,
+        "iterations": len(measured["samples"]),
+        "p50_ms": round(percentile(measured["samples"], 50) * 1000, 1),
+        "cpu_ms": round(percentile(measured["cpu"], 50) * 1000, 1),
+        "peak_rss_mb": measured["peak_rss_mb"],
+        "rss_delta_mb": round(measured["peak_rss_mb"] - measured["rss_before_mb"], 1),
+    }
+
+
+def print_table(results: List[Dict]):
+    legacy = {(row["flow"], row["size_mb"]): row for row in results if row["path"] == "legacy"}
+    header = f"{'flow':<9} {'size MB':>7} {'path':<7} {'p50 ms':>8} {'cpu ms':>8} {'+MB':>7} {'cpu vs legacy':>14} {'+MB vs legacy':>14}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        line = (f"{row['flow']:<9} {row['size_mb']:>7} {row['path']:<7} {row['p50_ms']:>8.1f} "
+                f"{row['cpu_ms']:>8.1f} {row['rss_delta_mb']:>7.1f}")
+        before = legacy.get((row["flow"], row["size_mb"]))
+        if row["path"] != "legacy" and before:
+            cpu_change = (row["cpu_ms"] - before["cpu_ms"]) / before["cpu_ms"] * 100 if before["cpu_ms"] else 0.0
+            line += f" {cpu_change:>+13.0f}% {row['rss_delta_mb'] - before['rss_delta_mb']:>+14.1f}"
+        print(line)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the base64 upload path before and after single decoding")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES_MB)), help="File sizes in MB")
+    parser.add_argument("--flows", default=",".join(FLOWS), help="document, contract")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--worker", nargs=4, metavar=("PATH", "FLOW", "SIZE_MB", "ITERATIONS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        path_name, flow, size_mb, iterations = args.worker
+        print(json.dumps(run_case(path_name, flow, int(size_mb), int(iterations))))
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    flows = [flow for flow in args.flows.split(",") if flow]
+
+    print("\n" + "=" * 60)
+    print("⏱️  UPLOAD PATH BENCHMARK")
+    print("=" * 60)
+    print(f"sizes {', '.join(f'{size} MB' for size in sizes)}, {args.iterations} iterations each\n")
+    results = []
+    for flow in flows:
+        for size_mb in sizes:
+            for path_name in PATHS:
+                results.append(summarize(path_name, flow, size_mb, _run_in_subprocess(path_name, flow, size_mb, args.iterations)))
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+        print(f"\n💾 Saved results to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -28,6 +28,9 @@ class InMemoryCursor:
         sorted_docs = sorted(self._documents, key=sort_key, reverse=reverse)
         return InMemoryCursor(sorted_docs)
 
+    def limit(self, count: int) -> "InMemoryCursor":
+        return InMemoryCursor(self._documents[:count] if count else self._documents)
+
     def __iter__(self):
         return iter(self._documents)
 
@@ -78,13 +81,42 @@ class InMemoryCollection:
                     return False
                 continue
 
-            expected = self._normalize(value)
             actual = self._normalize(self._get_value(document, key))
+            if isinstance(value, dict) and value and all(op.startswith("$") for op in value):
+                if not self._matches_operators(actual, value):
+                    return False
+                continue
+
+            expected = self._normalize(value)
             if actual != expected:
                 return False
 
         return True
 
+    def _matches_operators(self, actual: Any, conditions: Dict[str, Any]) -> bool:
+        for operator, operand in conditions.items():
+            operand = [self._normalize(item) for item in operand] if isinstance(operand, list) else self._normalize(operand)
+            try:
+                if operator == "$in" and actual not in operand:
+                    return False
+                if operator == "$nin" and actual in operand:
+                    return False
+                if operator == "$ne" and actual == operand:
+                    return False
+                if operator == "$exists" and (actual is not None) != bool(operand):
+                    return False
+                if operator == "$gt" and not (actual is not None and actual > operand):
+                    return False
+                if operator == "$gte" and not (actual is not None and actual >= operand):
+                    return False
+                if operator == "$lt" and not (actual is not None and actual < operand):
+                    return False
+                if operator == "$lte" and not (actual is not None and actual <= operand):
+                    return False
+            except TypeError:
+                return False
+        return True
+
     def insert_one(self, document: Dict[str, Any]):
         doc_copy = deepcopy(document)
         if "_id" not in doc_copy:
@@ -93,19 +125,34 @@ class InMemoryCollection:
         self.data.append(doc_copy)
         return SimpleNamespace(inserted_id=doc_copy["_id"])
 
+    def insert_many(self, documents: List[Dict[str, Any]]):
+        inserted_ids = [self.insert_one(document).inserted_id for document in documents]
+        return SimpleNamespace(inserted_ids=inserted_ids)
+
     def find_one(self, query: Optional[Dict[str, Any]] = None):
         for doc in self.data:
             if self._matches(doc, query):
                 return doc
         return None
     
-    def find(self, query: Optional[Dict[str, Any]] = None) -> InMemoryCursor:
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> InMemoryCursor:
+        # Projections only save transfer in MongoDB; whole documents are returned here
         matched = [doc for doc in self.data if self._matches(doc, query)]
         return InMemoryCursor(matched)
 
-    def update_one(self, query: Dict[str, Any], update: Dict[str, Any]):
+    def count_documents(self, query: Optional[Dict[str, Any]] = None) -> int:
+        return sum(1 for doc in self.data if self._matches(doc, query))
+
+    def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False):
         doc = self.find_one(query)
         if not doc:
+            if upsert:
+                # Like MongoDB: seed the new document from the query's equality fields
+                seed = {key: value for key, value in query.items() if not key.startswith("$") and not isinstance(value, dict)}
+                for key, value in {**update.get("$setOnInsert", {}), **update.get("$set", {}), **update.get("$inc", {})}.items():
+                    self._set_value(seed, key, value)
+                result = self.insert_one(seed)
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=result.inserted_id)
             return SimpleNamespace(matched_count=0, modified_count=0)
 
         modified = False
@@ -124,6 +171,11 @@ class InMemoryCollection:
                     current.append(value)
             modified = True
 
+        if "$inc" in update:
+            for key, value in update["$inc"].items():
+                self._set_value(doc, key, (self._get_value(doc, key) or 0) + value)
+            modified = True
+
         return SimpleNamespace(matched_count=1, modified_count=int(modified))
 
     def update_many(self, query: Dict[str, Any], update: Dict[str, Any]):
@@ -146,6 +198,12 @@ class InMemoryCollection:
             return SimpleNamespace(deleted_count=1)
         return SimpleNamespace(deleted_count=0)
 
+    def delete_many(self, query: Dict[str, Any]):
+        remaining = [doc for doc in self.data if not self._matches(doc, query)]
+        deleted = len(self.data) - len(remaining)
+        self.data = remaining
+        return SimpleNamespace(deleted_count=deleted)
+
 
 class InMemoryDB:
     def __init__(self):
@@ -158,6 +216,11 @@ class InMemoryDB:
         self.expenses = InMemoryCollection()
         self.documents = InMemoryCollection()
         self.document_folders = InMemoryCollection()
+        self.parse_cache = InMemoryCollection()
+        self.parse_jobs = InMemoryCollection()
+        self.reparse_runs = InMemoryCollection()
+        self.blobs = InMemoryCollection()
+        self.document_counts = InMemoryCollection()
 
 
 try:
@@ -0,0 +1,157 @@
+"""
+Local OpenAI-compatible stub completion server for parser tests.
+
+Answers POST /v1/chat/completions with a JSON parse built from simple keyword
+checks on the document text in the prompt, after an optional delay, so the
+chunked parsing path can be exercised (and timed) without an API key.
+`token_delay` adds that many seconds per 1,000 prompt tokens, so prompt
+size shows up in latency the way it does with a real model.
+Error responses can be injected to exercise retries: each status in the
+handler's `fail_with` list answers one request before normal replies resume.
+
+Usage:
+    python llm_stub_server.py --port 8089 --delay 0.5 --fail 429,503
+    export OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub
+
+Or from a test script:
+    server, base_url = start_in_thread(delay=0.2, fail_with=[429])
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def stub_parse(document_text: str) -> Dict[str, Any]:
+    """Fill in only the fields the text mentions, like a real excerpt parse."""
+    text = document_text.lower()
+    parsed: Dict[str, Any] = {"extractedTerms": [], "fieldConfidence": {}}
+
+    def report(field: str, value: Any, confidence: float):
+        parsed[field] = value
+        parsed["fieldConfidence"][field] = confidence
+
+    if re.search(r"2\s*-\s*2\s*-\s*3", text):
+        report("custodySchedule", "2-2-3 schedule", 0.9)
+    elif re.search(r"week[- ]on|alternating weeks", text):
+        report("custodySchedule", "Week-on/week-off", 0.85)
+    if "holiday" in text:
+        report("holidaySchedule", "Alternating holidays", 0.8)
+    if "joint legal custody" in text:
+        report("decisionMaking", "joint", 0.95)
+        parsed["extractedTerms"].append({"term": "Legal Custody", "value": "Joint Legal Custody", "confidence": 0.95})
+    if re.search(r"50\s*[/-]\s*50|equal time", text):
+        report("custodyArrangement", "50-50", 0.85)
+    support = re.search(r"child support[^$]{0,80}\$\s*([\d,]+)", text)
+    if support:
+        report("childSupport", {"amount": int(support.group(1).replace(",", "")), "payer": "parent1", "frequency": "monthly"}, 0.8)
+
+    parsed["confidence"] = 0.8 if parsed["fieldConfidence"] else 0.2
+    return parsed
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    token_delay = 0.0
+    prompt_tokens = 0
+    fail_with: List[int] = []
+    retry_after: Optional[float] = None
+    request_count = 0
+    max_in_flight = 0
+    _in_flight = 0
+    _lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass  # Keep test output readable
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        prompt = body["messages"][-1]["content"]
+
+        cls = type(self)
+        with cls._lock:
+            cls.request_count += 1
+            cls.prompt_tokens += len(prompt) // 4
+            cls._in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls._in_flight)
+            status = cls.fail_with.pop(0) if cls.fail_with else None
+        try:
+            time.sleep(cls.delay + cls.token_delay * len(prompt) / 4000)
+            if status:
+                self._send_error_status(status)
+                return
+            document_text = prompt.split("Document text:", 1)[-1]
+            content = json.dumps(stub_parse(document_text))
+        finally:
+            with cls._lock:
+                cls._in_flight -= 1
+
+        payload = json.dumps({
+            "id": f"stub-{cls.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4, "total_tokens": (len(prompt) + len(content)) // 4},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error_status(self, status: int):
+        payload = json.dumps({"error": {"message": f"Injected {status}", "type": "stub_error", "code": str(status)}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if self.retry_after is not None:
+            self.send_header("Retry-After", str(self.retry_after))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_in_thread(port: int = 0, delay: float = 0.0, fail_with: Optional[List[int]] = None, token_delay: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub in a daemon thread; returns (server, base_url for OPENAI_BASE_URL)."""
+    handler = type("Handler", (StubHandler,), {
+        "delay": delay, "token_delay": token_delay, "prompt_tokens": 0, "fail_with": list(fail_with or []), "request_count": 0,
+        "max_in_flight": 0, "_in_flight": 0, "_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub completion server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering each request")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Extra seconds per 1,000 prompt tokens")
+    parser.add_argument("--fail", default="", help="Comma-separated HTTP statuses to answer the first requests with")
+    args = parser.parse_args(argv)
+
+    StubHandler.delay = args.delay
+    StubHandler.token_delay = args.token_delay
+    StubHandler.fail_with = [int(status) for status in args.fail.split(",") if status]
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"Stub LLM listening on http://127.0.0.1:{args.port}/v1 (delay {args.delay}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
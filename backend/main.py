@@ -1,10 +1,25 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import auth, family, calendar, admin, messaging, expenses, activity, documents, support
 from database import db
+from services import custody_scheduler, extraction_pool, llm_client, parse_jobs
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background workers start with the app and stop with it
+    custody_scheduler.start()
+    parse_jobs.start()
+    yield
+    await parse_jobs.stop()
+    await custody_scheduler.stop()
+    extraction_pool.shutdown()
+    await llm_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware must be added BEFORE including routers
 app.add_middleware(
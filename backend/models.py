@@ -24,6 +24,9 @@ class CustodyAgreement(BaseModel):
     fileName: Optional[str] = None
     fileType: Optional[str] = None  # File extension (pdf, docx, etc.)
     fileContent: Optional[str] = None  # Base64 encoded file content for download
+    storedFile: Optional[str] = None  # File name under contracts/ (multipart uploads, instead of fileContent)
+    fileSize: Optional[int] = None
+    sha256: Optional[str] = None
     parsedData: Optional[dict] = None  # AI-parsed key terms
     custodySchedule: Optional[str] = None
     holidaySchedule: Optional[str] = None
@@ -95,6 +98,17 @@ class Event(BaseModel):
     isSwappable: Optional[bool] = False
     createdBy_email: Optional[str] = None
 
+class EventConflict(BaseModel):
+    kind: str  # 'custody-overlap', 'duplicate-custody', 'other-parent-time', 'overlap'
+    event_id: str
+    title: Optional[str] = None
+    date: datetime
+    parent: Optional[str] = None
+    message: str
+
+class EventWithConflicts(Event):
+    conflicts: List[EventConflict] = []  # Warnings only; the event is still saved
+
 class EventCreate(BaseModel):
     date: datetime
     type: str
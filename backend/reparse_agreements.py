@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Re-parse stored custody agreements after a parser upgrade.
+
+Parses every family's stored agreement file again, writes back the ones
+whose result changed and regenerates custody events where the schedule
+changed. Progress is checkpointed after every batch, so the run can be
+stopped (Ctrl-C stops after the current batch) and resumed:
+
+    python reparse_agreements.py --dry-run            # report what would change
+    python reparse_agreements.py                      # re-parse everything
+    python reparse_agreements.py --resume <run id>    # continue a stopped run
+
+See services/agreement_reparse.py for the batching and rate limits.
+"""
+
+import argparse
+import asyncio
+import signal
+import sys
+from typing import List
+
+from services import agreement_reparse, llm_client, parsing_pipeline
+
+
+def print_progress(run: dict):
+    counters = run["counters"]
+    print(
+        f"  scanned {counters['scanned']:>7}  changed {counters['changed']:>6}  "
+        f"schedules {counters['schedulesChanged']:>5}  failed {counters['failed']:>4}  "
+        f"(last family {run['last_family_id']})"
+    )
+
+
+async def run_cli(args) -> dict:
+    if args.resume:
+        run = agreement_reparse.get_run(args.resume)
+        if not run:
+            raise ValueError(f"Re-parse run {args.resume} not found")
+        print(f"🔄 Resuming re-parse run {run['id']} after family {run['last_family_id'] or '(start)'}")
+    else:
+        run = agreement_reparse.create_run(dry_run=args.dry_run, limit=args.limit, created_by="cli")
+        print(f"🔄 Started re-parse run {run['id']}{' (dry run)' if args.dry_run else ''}")
+
+    def stop():
+        print("\n⏸️  Stopping after the current batch...")
+        agreement_reparse.request_stop(run["id"])
+
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGINT, stop)
+    try:
+        return await agreement_reparse.reparse(
+            run["id"],
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            max_per_second=args.rate,
+            parser=parsing_pipeline.default_parser(),
+            on_batch=print_progress,
+        )
+    finally:
+        loop.remove_signal_handler(signal.SIGINT)
+        await llm_client.close()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-parse stored custody agreements with the current parser")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Continue a stopped run from its checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="Diff and count changes without writing them")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many agreements (0 = all)")
+    parser.add_argument("--batch-size", type=int, default=agreement_reparse.REPARSE_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=agreement_reparse.REPARSE_CONCURRENCY, help="Agreements parsed at once")
+    parser.add_argument("--rate", type=float, default=agreement_reparse.REPARSE_MAX_PER_SECOND, help="New parses per second (0 = unpaced)")
+    args = parser.parse_args(argv)
+
+    try:
+        run = asyncio.run(run_cli(args))
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    counters = run["counters"]
+    print("\n" + "=" * 60)
+    print(f"Run {run['id']}: {run['status']}")
+    print(f"Scanned {counters['scanned']}, changed {counters['changed']} "
+          f"({counters['written']} written), unchanged {counters['unchanged']}, failed {counters['failed']}")
+    print(f"Custody schedules regenerated: {counters['schedulesChanged'] if not run['dry_run'] else 0}")
+    if run["changed_fields"]:
+        print("Changed fields: " + ", ".join(f"{name} {count}" for name, count in sorted(run["changed_fields"].items())))
+    if run["status"] == "paused":
+        print(f"Resume with: python reparse_agreements.py --resume {run['id']}")
+    return 0 if counters["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
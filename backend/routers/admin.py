@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
 from datetime import datetime
 
 from models import User, Family, Child
 from routers.auth import get_current_user
 from database import db
+from services import agreement_reparse, metrics
 
 try:
     from bson import ObjectId
@@ -175,3 +176,48 @@ async def get_all_users(admin: User = Depends(get_admin_user)):
         print(f"Error fetching users: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching users: {str(e)}")
 
+@router.get("/api/v1/admin/metrics")
+async def get_metrics(admin: User = Depends(get_admin_user)):
+    """Get in-process service metrics such as cache hit rates (Admin only)"""
+    return metrics.snapshot()
+
+
+@router.post("/api/v1/admin/reparse")
+async def start_reparse(
+    response: Response,
+    run_id: Optional[str] = Query(None, alias="runId", description="Resume this run from its checkpoint"),
+    dry_run: bool = Query(False, alias="dryRun", description="Diff and count changes without writing them"),
+    limit: int = Query(0, ge=0, description="Stop after this many agreements (0 = all)"),
+    admin: User = Depends(get_admin_user)
+):
+    """Re-parse stored custody agreements with the current parser, in the background (Admin only)"""
+    if run_id:
+        run = agreement_reparse.get_run(run_id)
+        if not run:
+            raise HTTPException(status_code=404, detail="Re-parse run not found")
+    else:
+        run = agreement_reparse.create_run(dry_run=dry_run, limit=limit, created_by=admin.email)
+
+    try:
+        agreement_reparse.start_in_background(run["id"])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    response.status_code = 202
+    return agreement_reparse.run_view(run)
+
+
+@router.get("/api/v1/admin/reparse/{run_id}")
+async def get_reparse(run_id: str, admin: User = Depends(get_admin_user)):
+    """Get the progress of a re-parse run (Admin only)"""
+    run = agreement_reparse.get_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Re-parse run not found")
+    return agreement_reparse.run_view(run)
+
+
+@router.post("/api/v1/admin/reparse/{run_id}/stop")
+async def stop_reparse(run_id: str, admin: User = Depends(get_admin_user)):
+    """Stop a re-parse run after its current batch; resume it later with ?runId= (Admin only)"""
+    if not agreement_reparse.request_stop(run_id):
+        raise HTTPException(status_code=404, detail="Re-parse run not found")
+    return agreement_reparse.run_view(agreement_reparse.get_run(run_id))
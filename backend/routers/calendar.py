@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Optional
+import json
 import uuid
 from datetime import datetime
 from bson import ObjectId
@@ -7,6 +8,7 @@ from bson import ObjectId
 from models import (
     Event,
     EventCreate,
+    EventWithConflicts,
     User,
     ChangeRequest,
     ChangeRequestCreate,
@@ -14,6 +16,7 @@ from models import (
 )
 from routers.auth import get_current_user
 from database import db
+from services import calendar_cache, event_conflicts, holiday_rules
 
 router = APIRouter(prefix="/api/v1/calendar", tags=["calendar"])
 
@@ -87,6 +90,16 @@ def _get_family_for_user(current_user: User) -> tuple[dict, str]:
     return family, family_id
 
 
+def _apply_holiday_override(event_obj: Event, family: dict, holiday_overrides) -> None:
+    """Reassign a base-rotation custody day to the parent who has the holiday."""
+    override = holiday_overrides.get(event_obj.date.date())
+    if not override:
+        return
+    parent_key, holiday_name = override
+    event_obj.parent = family.get(f"{parent_key}_email") or event_obj.parent
+    event_obj.title = f"Custody ({holiday_name})"
+
+
 def _find_event_for_family(event_id: str, family_id: str) -> dict:
     event = db.events.find_one({"id": event_id})
     if not event:
@@ -117,8 +130,14 @@ async def get_calendar_events(
     month: int = Query(..., description="Month to fetch events for (1-12)"),
     current_user: User = Depends(get_current_user),
 ):
-    """Get calendar events for a specific month."""
-    _, family_id = _get_family_for_user(current_user)
+    """Get calendar events for a specific month, with holiday custody overrides applied."""
+    family, family_id = _get_family_for_user(current_user)
+    cached = calendar_cache.get(family_id, year, month)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    generation = calendar_cache.generation(family_id)
+
+    holiday_overrides = holiday_rules.overrides_for_family(family, year)
 
     events_cursor = db.events.find({"family_id": family_id})
     events: List[Event] = []
@@ -126,17 +145,21 @@ async def get_calendar_events(
     for event_doc in events_cursor:
         event_obj = _serialize_event_document(event_doc)
         if event_obj.date.year == year and event_obj.date.month == month:
+            if event_obj.type == "custody":
+                _apply_holiday_override(event_obj, family, holiday_overrides)
             events.append(event_obj)
 
-    return events
+    payload = json.dumps([event.model_dump(mode="json") for event in events]).encode()
+    calendar_cache.put(family_id, year, month, payload, generation)
+    return Response(content=payload, media_type="application/json")
 
 
-@router.post("/events", response_model=Event)
+@router.post("/events", response_model=EventWithConflicts)
 async def create_calendar_event(
     event_data: EventCreate,
     current_user: User = Depends(get_current_user),
 ):
-    """Create a new calendar event."""
+    """Create a new calendar event. Overlapping or contradictory events are returned as conflicts."""
     _, family_id = _get_family_for_user(current_user)
 
     event_id = str(uuid.uuid4())
@@ -153,11 +176,18 @@ async def create_calendar_event(
         "updatedAt": datetime.utcnow(),
     }
 
+    conflicts = event_conflicts.find_conflicts(family_id, event_doc)
     db.events.insert_one(event_doc)
-    return _serialize_event_document(event_doc)
+    event_conflicts.record_event(family_id, event_doc)
+    calendar_cache.invalidate_family(family_id)
+
+    return EventWithConflicts(
+        **_serialize_event_document(event_doc).model_dump(),
+        conflicts=conflicts,
+    )
 
 
-@router.put("/events/{event_id}", response_model=Event)
+@router.put("/events/{event_id}", response_model=EventWithConflicts)
 async def update_calendar_event(
     event_id: str,
     event_data: EventCreate,
@@ -187,7 +217,14 @@ async def update_calendar_event(
     db.events.update_one({"_id": event_doc.get("_id")}, {"$set": update_fields})
     event_doc.update(update_fields)
 
-    return _serialize_event_document(event_doc)
+    conflicts = event_conflicts.find_conflicts(family_id, event_doc)
+    event_conflicts.record_event(family_id, event_doc)
+    calendar_cache.invalidate_family(family_id)
+
+    return EventWithConflicts(
+        **_serialize_event_document(event_doc).model_dump(),
+        conflicts=conflicts,
+    )
 
 
 @router.delete("/events/{event_id}", status_code=204)
@@ -199,6 +236,8 @@ async def delete_calendar_event(
     _, family_id = _get_family_for_user(current_user)
     event_doc = _find_event_for_family(event_id, family_id)
     db.events.delete_one({"_id": event_doc.get("_id")})
+    event_conflicts.remove_event(family_id, event_doc.get("id") or str(event_doc.get("_id")))
+    calendar_cache.invalidate_family(family_id)
     return Response(status_code=204)
 
 
@@ -355,4 +394,7 @@ async def update_change_request(
             )
             db.events.delete_one({"_id": event_doc.get("_id")})
 
+        event_conflicts.invalidate_family(family_id)
+        calendar_cache.invalidate_family(family_id)
+
     return _serialize_change_request_document(change_request_doc)
\ No newline at end of file
@@ -1,18 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Query
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Response, Query, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import List, Optional
-from datetime import datetime, timedelta
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
 from bson import ObjectId
 import uuid
-import base64
 import os
 from pathlib import Path
+from urllib.parse import quote
 
 from models import Document, DocumentUpload, DocumentFolder, DocumentFolderCreate, DocumentFolderUpdate, User, EventCreate
 from routers.auth import get_current_user
 from database import db
-from services.document_parser import DocumentParser
-from services.calendar_generator import generate_custody_events
+from services.calendar_generator import find_family
+from services import blob_store, document_classifier, document_counts, file_storage, parse_jobs, parsing_pipeline
 
 router = APIRouter(prefix="/api/v1/documents", tags=["documents"])
 
@@ -71,25 +74,116 @@ DEFAULT_FOLDERS = [
     }
 ]
 
-def save_document_file(file_content: str, file_name: str, document_id: str) -> str:
-    """Save document file and return URL/path"""
-    documents_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "documents")
-    if not os.path.exists(documents_dir):
-        os.makedirs(documents_dir)
-    
-    # Get file extension
-    file_extension = file_name.split('.')[-1] if '.' in file_name else 'pdf'
-    file_path = os.path.join(documents_dir, f"{document_id}.{file_extension}")
-    
-    try:
-        decoded_content = base64.b64decode(file_content)
-        with open(file_path, 'wb') as f:
-            f.write(decoded_content)
-        # Return API endpoint path
-        return f"/api/v1/documents/files/{document_id}.{file_extension}"
-    except Exception as e:
-        print(f"Error saving document: {e}")
-        return ""
+# Files uploaded before the blob store; new uploads are in services/blob_store
+DOCUMENTS_DIR = file_storage.DOCUMENTS_DIR
+
+# Files accepted by one batch upload, and how many are stored and classified at once
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", "50"))
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "8"))
+
+
+def file_extension_of(file_name: str) -> str:
+    return file_name.split('.')[-1] if '.' in file_name else 'pdf'
+
+
+def document_file_url(file_name: str, document_id: str) -> str:
+    """API URL of a document's file."""
+    return f"/api/v1/documents/files/{document_id}.{file_extension_of(file_name)}"
+
+
+# Hashed file URLs (?v=<hash prefix>) always name the same content, so browsers keep them this long
+FILE_CACHE_MAX_AGE = int(os.getenv("FILE_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+FILE_VERSION_CHARS = 16
+
+
+def versioned_file_url(file_url: Optional[str], sha256: Optional[str]) -> Optional[str]:
+    """File URL with its content version, for files whose hash is known."""
+    if not file_url or not sha256:
+        return file_url
+    return f"{file_url}?v={sha256[:FILE_VERSION_CHARS]}"
+
+
+def _http_date(value: datetime) -> str:
+    # Stored datetimes are naive UTC
+    return formatdate(value.replace(tzinfo=timezone.utc).timestamp(), usegmt=True)
+
+
+def _cache_headers(request: Request, sha256: Optional[str], uploaded_at: Optional[datetime]) -> dict:
+    headers = {}
+    if sha256:
+        headers["etag"] = f'"{sha256}"'
+    if isinstance(uploaded_at, datetime):
+        headers["last-modified"] = _http_date(uploaded_at)
+    version = request.query_params.get("v")
+    if sha256 and version and len(version) >= 8 and sha256.startswith(version):
+        headers["cache-control"] = f"private, max-age={FILE_CACHE_MAX_AGE}, immutable"
+    else:
+        # Keep a copy, but check it is still current (usually a 304) before using it
+        headers["cache-control"] = "private, no-cache"
+    return headers
+
+
+def _not_modified(request: Request, headers) -> bool:
+    """Whether the client's copy is current (If-None-Match, else If-Modified-Since)."""
+    etag = headers.get("etag")
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return bool(etag) and ("*" in tags or etag in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = headers.get("last-modified")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _not_modified_response(headers) -> Response:
+    return Response(status_code=304, headers={
+        name: headers[name] for name in ("etag", "last-modified", "cache-control") if name in headers
+    })
+
+
+def stored_file_response(
+    request: Request,
+    media_type: str,
+    filename: str,
+    sha256: Optional[str] = None,
+    legacy_path: Optional[str] = None,
+    uploaded_at: Optional[datetime] = None,
+) -> Response:
+    """
+    Serve a document or receipt: from the blob store by hash, or from
+    legacy_path for files stored before it. Answers conditional GETs with
+    304 and Range requests with 206 (FileResponse handles ranges).
+    """
+    headers = _cache_headers(request, sha256, uploaded_at)
+    if legacy_path is None:
+        blob = blob_store.get(sha256) if sha256 else None
+        if not blob or not os.path.exists(blob_store.blob_path(blob.sha256, blob.compression)):
+            raise HTTPException(status_code=404, detail="File not found")
+        if _not_modified(request, headers):
+            return _not_modified_response(headers)
+        if blob.compression:
+            # Only small text formats are compressed; they are sent whole
+            quoted = quote(filename)
+            disposition = f"attachment; filename*=utf-8''{quoted}" if quoted != filename else f'attachment; filename="{filename}"'
+            headers.update({"content-disposition": disposition, "accept-ranges": "none"})
+            return Response(content=blob_store.read(blob.sha256), media_type=media_type, headers=headers)
+        path = blob_store.blob_path(blob.sha256)
+    else:
+        path = legacy_path
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="File not found")
+
+    # Without a hash, the ETag and Last-Modified come from the file itself
+    response = FileResponse(path, media_type=media_type, filename=filename, headers=headers, stat_result=os.stat(path))
+    if _not_modified(request, response.headers):
+        return _not_modified_response(response.headers)
+    return response
+
 
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human-readable format"""
@@ -134,8 +228,8 @@ async def get_folders(current_user: User = Depends(get_current_user)):
         # Get custom folders from database
         custom_folders = list(db.document_folders.find({"family_id": family_id}))
         
-        # Get document counts for each folder
-        all_documents = list(db.documents.find({"family_id": family_id}))
+        # Get document counts for each folder (maintained on upload and delete)
+        counts = document_counts.get_counts(family_id)
         
         # Build folder list with counts
         folders = []
@@ -146,10 +240,7 @@ async def get_folders(current_user: User = Depends(get_current_user)):
             document_types = default_folder["document_types"]
             
             # Count documents in this folder
-            if folder_id == "memories":
-                count = sum(1 for doc in all_documents if doc.get("type") == "memories")
-            else:
-                count = sum(1 for doc in all_documents if doc.get("type") in document_types)
+            count = document_counts.folder_count(counts, document_types)
             
             folders.append({
                 "id": folder_id,
@@ -170,7 +261,7 @@ async def get_folders(current_user: User = Depends(get_current_user)):
             custom_category = custom_folder.get("custom_category", "")
             
             # Count documents in this custom folder
-            count = sum(1 for doc in all_documents if doc.get("custom_category") == custom_category)
+            count = document_counts.folder_count(counts, custom_category=custom_category)
             
             folders.append({
                 "id": folder_id,
@@ -314,8 +405,9 @@ async def update_folder(
         })
         
         # Count documents
-        all_documents = list(db.documents.find({"family_id": family_id}))
-        count = sum(1 for doc in all_documents if doc.get("custom_category") == updated_folder.get("custom_category", ""))
+        count = document_counts.folder_count(
+            document_counts.get_counts(family_id), custom_category=updated_folder.get("custom_category", "")
+        )
         
         return {
             "id": folder_id,
@@ -447,7 +539,7 @@ async def get_documents(
                 "isProtected": doc.get("is_protected", False),
                 "protectionReason": doc.get("protection_reason"),
                 "fileType": doc.get("file_type", "other"),
-                "fileUrl": doc.get("file_url"),
+                "fileUrl": versioned_file_url(doc.get("file_url"), doc.get("sha256")),
                 "fileName": doc.get("file_name"),
             })
         
@@ -461,6 +553,141 @@ async def get_documents(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def _resolve_document_type(family_id: str, folder_id: Optional[str], requested_type: str) -> tuple:
+    """(document type, custom category) for an upload into `folder_id`."""
+    if folder_id:
+        # Check if it's a custom folder
+        custom_folder = db.document_folders.find_one({
+            "family_id": family_id,
+            "id": folder_id
+        })
+        if custom_folder:
+            return "custom", custom_folder.get("custom_category", "")
+    # Default folder - use provided type
+    return requested_type, None
+
+
+def _create_document(
+    family_id: str,
+    document_id: str,
+    folder_id: Optional[str],
+    requested_type: str,
+    file_url: str,
+    file_name: str,
+    file_size: int,
+    uploaded_by: str,
+    name: str,
+    description: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    children_ids: Optional[List[str]] = None,
+    sha256: Optional[str] = None,
+    type_confirmed: bool = True,
+) -> dict:
+    """
+    Insert the document record of a file in the blob store and queue its
+    parse job; returns the upload response. A type that was guessed rather
+    than given (type_confirmed=False) files the document but doesn't protect
+    it or parse it as the family's agreement.
+
+    The caller's blob reference passes to the record: it is released here if
+    the record can't be inserted, and kept once it has been, even if a later
+    step fails.
+    """
+    try:
+        document_type, custom_category = _resolve_document_type(family_id, folder_id, requested_type)
+    except Exception:
+        blob_store.release(sha256)
+        raise
+    file_type = get_file_type(file_name)
+    is_agreement = type_confirmed and document_type == "custody-agreement"
+
+    # Check if this is a protected document type
+    is_protected = type_confirmed and document_type in ["custody-agreement", "court-order"]
+    protection_reason = None
+    if is_protected:
+        if document_type == "custody-agreement":
+            protection_reason = "This is your official divorce contract and cannot be deleted. It serves as the legal foundation for your co-parenting arrangement."
+        elif document_type == "court-order":
+            protection_reason = "This is your official divorce decree and cannot be deleted. It contains critical legal information and court orders."
+    
+    # Custody agreements are parsed by a background job; the document
+    # stays "processing" until it finishes
+    status = "processing" if is_agreement else "processed"
+
+    # Create document document
+    document_doc = {
+        "id": document_id,
+        "family_id": family_id,
+        "folder_id": folder_id,
+        "name": name,
+        "type": document_type,
+        "custom_category": custom_category,
+        "file_url": file_url,
+        "file_name": file_name,
+        "file_type": file_type,
+        "file_size": file_size,
+        "sha256": sha256,
+        "storage": "blob",
+        "description": description,
+        "tags": tags or [],
+        "status": status,
+        "is_protected": is_protected,
+        "protection_reason": protection_reason,
+        "uploaded_by": uploaded_by,
+        "children_ids": children_ids or [],
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    
+    try:
+        db.documents.insert_one(document_doc)
+    except Exception:
+        # No document references the blob
+        blob_store.release(sha256)
+        raise
+    document_counts.record_added(family_id, document_type, custom_category)
+
+    # If custody agreement, parse and create events in the background
+    job_id = None
+    if is_agreement:
+        job = parse_jobs.enqueue(
+            CUSTODY_AGREEMENT_JOB,
+            family_id,
+            {"blob": sha256, "fileType": file_url.rsplit(".", 1)[-1]},
+            document_id=document_id,
+            created_by=uploaded_by
+        )
+        job_id = job["id"]
+    
+    return {
+        "id": document_id,
+        "name": name,
+        "type": document_type,
+        "customCategory": custom_category,
+        "uploadDate": document_doc["created_at"].isoformat(),
+        "size": format_file_size(file_size),
+        "status": status,
+        "tags": tags or [],
+        "description": description,
+        "isProtected": is_protected,
+        "protectionReason": protection_reason,
+        "fileType": file_type,
+        "fileUrl": versioned_file_url(file_url, sha256),
+        "fileName": file_name,
+        "jobId": job_id,
+    }
+
+
+def _find_user_family(current_user: User) -> dict:
+    family = db.families.find_one({"$or": [
+        {"parent1_email": current_user.email},
+        {"parent2_email": current_user.email}
+    ]})
+    if not family:
+        raise HTTPException(status_code=404, detail="Family not found")
+    return family
+
+
 @router.post("/upload", response_model=dict)
 async def upload_document(
     document_data: DocumentUpload,
@@ -469,112 +696,40 @@ async def upload_document(
     """Upload a new document"""
     try:
         # Get user's family
-        family = db.families.find_one({"$or": [
-            {"parent1_email": current_user.email},
-            {"parent2_email": current_user.email}
-        ]})
-        
-        if not family:
-            raise HTTPException(status_code=404, detail="Family not found")
-        
+        family = _find_user_family(current_user)
         family_id = str(family["_id"])
         
         # Generate document ID
         document_id = str(uuid.uuid4())
         
-        # Determine file type and size
-        file_type = get_file_type(document_data.file_name)
-        file_size = len(base64.b64decode(document_data.file_content))
+        # Decode once; the same buffer is sized, hashed and saved
+        try:
+            file_content = file_storage.decode_base64(document_data.file_content)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        file_url = document_file_url(document_data.file_name, document_id)
+        try:
+            stored = await blob_store.store_buffer(file_content, file_extension_of(document_data.file_name))
+        except Exception as e:
+            print(f"[ERROR] Saving document: {e}")
+            raise HTTPException(status_code=500, detail="Failed to save document file")
         
-        # Save file
-        file_url = save_document_file(
-            document_data.file_content,
+        return _create_document(
+            family_id,
+            document_id,
+            document_data.folder_id,
+            document_data.type,
+            file_url,
             document_data.file_name,
-            document_id
+            stored.size,
+            current_user.email,
+            name=document_data.name,
+            description=document_data.description,
+            tags=document_data.tags,
+            children_ids=document_data.children_ids,
+            sha256=stored.sha256,
         )
         
-        if not file_url:
-            raise HTTPException(status_code=500, detail="Failed to save document file")
-        
-        # Determine folder and custom category
-        folder_id = document_data.folder_id
-        custom_category = None
-        
-        if folder_id:
-            # Check if it's a custom folder
-            custom_folder = db.document_folders.find_one({
-                "family_id": family_id,
-                "id": folder_id
-            })
-            if custom_folder:
-                custom_category = custom_folder.get("custom_category", "")
-                document_type = "custom"
-            else:
-                # Default folder - use provided type
-                document_type = document_data.type
-        else:
-            document_type = document_data.type
-        
-        # Check if this is a protected document type
-        is_protected = document_type in ["custody-agreement", "court-order"]
-        protection_reason = None
-        if is_protected:
-            if document_type == "custody-agreement":
-                protection_reason = "This is your official divorce contract and cannot be deleted. It serves as the legal foundation for your co-parenting arrangement."
-            elif document_type == "court-order":
-                protection_reason = "This is your official divorce decree and cannot be deleted. It contains critical legal information and court orders."
-        
-        # Create document document
-        document_doc = {
-            "id": document_id,
-            "family_id": family_id,
-            "folder_id": folder_id,
-            "name": document_data.name,
-            "type": document_type,
-            "custom_category": custom_category,
-            "file_url": file_url,
-            "file_name": document_data.file_name,
-            "file_type": file_type,
-            "file_size": file_size,
-            "description": document_data.description,
-            "tags": document_data.tags or [],
-            "status": "processed",
-            "is_protected": is_protected,
-            "protection_reason": protection_reason,
-            "uploaded_by": current_user.email,
-            "children_ids": document_data.children_ids or [],
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        
-        db.documents.insert_one(document_doc)
-
-        # If custody agreement, parse and create events
-        if document_type == "custody-agreement":
-            await create_custody_events(
-                document_data.file_content,
-                file_type,
-                family,
-                current_user
-            )
-        
-        return {
-            "id": document_id,
-            "name": document_data.name,
-            "type": document_type,
-            "customCategory": custom_category,
-            "uploadDate": document_doc["created_at"].isoformat(),
-            "size": format_file_size(file_size),
-            "status": "processed",
-            "tags": document_data.tags or [],
-            "description": document_data.description,
-            "isProtected": is_protected,
-            "protectionReason": protection_reason,
-            "fileType": file_type,
-            "fileUrl": file_url,
-            "fileName": document_data.file_name,
-        }
-        
     except HTTPException:
         raise
     except Exception as e:
@@ -583,6 +738,163 @@ async def upload_document(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+
+def _split_form_list(value: Optional[str]) -> List[str]:
+    """Comma-separated form field -> list."""
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+@router.post("/upload/stream", response_model=dict)
+async def upload_document_stream(
+    file: UploadFile = File(...),
+    name: str = Form(...),
+    type: str = Form(...),
+    folder_id: Optional[str] = Form(None),
+    description: Optional[str] = Form(None),
+    tags: Optional[str] = Form(None, description="Comma-separated tags"),
+    children_ids: Optional[str] = Form(None, description="Comma-separated child ids"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Upload a new document as multipart form data. Same result as /upload,
+    but the file is streamed to storage instead of sent as base64 JSON.
+    """
+    family = _find_user_family(current_user)
+    family_id = str(family["_id"])
+    document_id = str(uuid.uuid4())
+    file_name = os.path.basename(file.filename or "") or name
+    file_url = document_file_url(file_name, document_id)
+
+    try:
+        stored = await blob_store.store_upload(file, file_extension_of(file_name))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"[ERROR] Upload document stream: {e}")
+        raise HTTPException(status_code=500, detail="Failed to save document file")
+
+    try:
+        return _create_document(
+            family_id,
+            document_id,
+            folder_id,
+            type,
+            file_url,
+            file_name,
+            stored.size,
+            current_user.email,
+            name=name,
+            description=description,
+            tags=_split_form_list(tags),
+            children_ids=_split_form_list(children_ids),
+            sha256=stored.sha256,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[ERROR] Upload document stream: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _ingest_batch_file(
+    upload: UploadFile,
+    family_id: str,
+    folder_id: Optional[str],
+    requested_type: Optional[str],
+    tags: List[str],
+    uploaded_by: str,
+) -> dict:
+    """Store, classify and record one file of a batch upload; returns its manifest entry."""
+    file_name = os.path.basename(upload.filename or "") or "upload"
+    document_id = str(uuid.uuid4())
+    file_url = document_file_url(file_name, document_id)
+    stored = None
+    try:
+        stored = await blob_store.store_upload(upload, file_extension_of(file_name))
+        if requested_type:
+            classification = {"type": requested_type, "confidence": 1.0, "source": "given"}
+        else:
+            extension = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
+            content = b""
+            if extension in document_classifier.TEXT_EXTENSIONS:
+                content = await asyncio.to_thread(blob_store.read, stored.sha256)
+            document_type, confidence = await document_classifier.classify_file(file_name, content)
+            classification = {
+                "type": document_type,
+                "confidence": confidence,
+                "source": "auto",
+                # Filed by its guessed type, but not protected or parsed; uploading it with a type does that
+                "needsReview": not document_classifier.is_confirmed(confidence),
+            }
+    except Exception as e:
+        print(f"[ERROR] Batch upload {file_name}: {e}")
+        if stored:
+            blob_store.release(stored.sha256)
+        return {"fileName": file_name, "status": "failed", "error": str(e)}
+
+    try:
+        # Takes over the blob reference
+        document = _create_document(
+            family_id,
+            document_id,
+            folder_id,
+            classification["type"],
+            file_url,
+            file_name,
+            stored.size,
+            uploaded_by,
+            name=os.path.splitext(file_name)[0] or file_name,
+            tags=tags,
+            sha256=stored.sha256,
+            type_confirmed=not classification.get("needsReview"),
+        )
+    except Exception as e:
+        print(f"[ERROR] Batch upload {file_name}: {e}")
+        return {"fileName": file_name, "status": "failed", "error": str(e)}
+    return {"fileName": file_name, "status": "stored", "classification": classification, "document": document}
+
+
+@router.post("/upload/batch", response_model=dict)
+async def upload_documents_batch(
+    files: List[UploadFile] = File(..., description="The documents, as one multipart request"),
+    folder_id: Optional[str] = Form(None),
+    type: Optional[str] = Form(None, description="Document type of every file; classified per file when omitted"),
+    tags: Optional[str] = Form(None, description="Comma-separated tags for every file"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Upload many documents in one request (e.g. an attorney's bundle).
+    Files are stored and classified concurrently; custody agreements get
+    a parse job as with single uploads when their type was given or
+    classified with high confidence (see document_classifier.is_confirmed).
+    Returns a manifest with the outcome of every file - one bad file
+    doesn't fail the batch.
+    """
+    family = _find_user_family(current_user)
+    family_id = str(family["_id"])
+
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    if len(files) > BATCH_UPLOAD_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files: at most {BATCH_UPLOAD_MAX_FILES} per batch")
+
+    tag_list = _split_form_list(tags)
+    semaphore = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+
+    async def ingest(upload: UploadFile) -> dict:
+        async with semaphore:
+            return await _ingest_batch_file(upload, family_id, folder_id, type, tag_list, current_user.email)
+
+    entries = await asyncio.gather(*(ingest(upload) for upload in files))
+    stored = sum(entry["status"] == "stored" for entry in entries)
+    return {
+        "total": len(entries),
+        "stored": stored,
+        "failed": len(entries) - stored,
+        "parseJobs": [entry["document"]["jobId"] for entry in entries if entry["status"] == "stored" and entry["document"]["jobId"]],
+        "files": entries,
+    }
+
 @router.delete("/{document_id}")
 async def delete_document(
     document_id: str,
@@ -623,10 +935,11 @@ async def delete_document(
         
         # Delete file from filesystem
         file_url = document.get("file_url", "")
-        if file_url and file_url.startswith("/api/v1/documents/files/"):
+        if document.get("storage") == "blob":
+            blob_store.release(document.get("sha256"))
+        elif file_url and file_url.startswith("/api/v1/documents/files/"):
             file_name = file_url.replace("/api/v1/documents/files/", "")
-            documents_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "documents")
-            file_path = os.path.join(documents_dir, file_name)
+            file_path = os.path.join(DOCUMENTS_DIR, file_name)
             if os.path.exists(file_path):
                 try:
                     os.remove(file_path)
@@ -634,12 +947,14 @@ async def delete_document(
                     print(f"Warning: Could not delete file {file_path}: {e}")
         
         # Delete document from database
-        db.documents.delete_one({
+        result = db.documents.delete_one({
             "$or": [
                 {"id": document_id},
                 {"_id": document.get("_id")}
             ]
         })
+        if result.deleted_count:
+            document_counts.record_removed(document["family_id"], document.get("type"), document.get("custom_category"))
         
         return {"message": "Document deleted successfully"}
         
@@ -652,9 +967,14 @@ async def delete_document(
 @router.get("/files/{file_name}")
 async def get_document_file(
     file_name: str,
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
-    """Serve document file"""
+    """
+    Serve document file. Supports Range requests (video seeking) and
+    conditional GETs; request it as the listed fileUrl (?v=<hash>) to let
+    the browser cache it for good.
+    """
     try:
         # Extract document ID from filename
         document_id = file_name.split('.')[0]
@@ -679,13 +999,6 @@ async def get_document_file(
         if not family or str(family["_id"]) != document["family_id"]:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Get file path
-        documents_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "documents")
-        file_path = os.path.join(documents_dir, file_name)
-        
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="Document file not found")
-        
         # Determine media type
         file_extension = file_name.split('.')[-1].lower()
         media_types = {
@@ -702,10 +1015,14 @@ async def get_document_file(
         }
         media_type = media_types.get(file_extension, 'application/octet-stream')
         
-        return FileResponse(
-            file_path,
-            media_type=media_type,
-            filename=document.get("file_name", file_name)
+        legacy_path = None if document.get("storage") == "blob" else os.path.join(DOCUMENTS_DIR, file_name)
+        return stored_file_response(
+            request,
+            media_type,
+            document.get("file_name", file_name),
+            sha256=document.get("sha256"),
+            legacy_path=legacy_path,
+            uploaded_at=document.get("created_at"),
         )
         
     except HTTPException:
@@ -713,26 +1030,103 @@ async def get_document_file(
     except Exception as e:
         print(f"[ERROR] Get document file: {e}")
 
-async def create_custody_events(
-    file_content: str,
-    file_type: str,
-    family: dict,
-    current_user: User
+async def create_custody_events(file_content: bytes, file_type: str, family: dict, digest: str = "") -> parsing_pipeline.ParseRun:
+    """Parse custody agreement and create calendar events if it has a custody schedule."""
+    run = await parsing_pipeline.pipeline.run(
+        parsing_pipeline.default_parser(), file_type, file_content=file_content, family=family, digest=digest
+    )
+    if not run.events_generated:
+        print("No custody schedule found in document")
+    return run
+
+
+CUSTODY_AGREEMENT_JOB = "custody-agreement-document"
+
+
+def _set_document_status(document_id: Optional[str], status: str):
+    if document_id:
+        db.documents.update_one({"id": document_id}, {"$set": {"status": status, "updated_at": datetime.utcnow()}})
+
+
+async def run_custody_agreement_job(job: dict) -> dict:
+    """Parse job for an uploaded custody-agreement document."""
+    family = find_family(job["family_id"])
+    if not family:
+        raise ValueError("Family not found")
+
+    payload = job["payload"]
+    if payload.get("blob"):
+        file_content = await asyncio.to_thread(blob_store.read, payload["blob"])
+    else:
+        # Queued before the blob store
+        file_path = os.path.join(DOCUMENTS_DIR, payload["storedFile"])
+        if not os.path.exists(file_path):
+            raise ValueError("Document file not found")
+        with open(file_path, "rb") as f:
+            file_content = f.read()
+
+    run = await create_custody_events(file_content, payload["fileType"], family, digest=payload.get("blob") or "")
+    _set_document_status(job.get("document_id"), "processed" if run.events_generated else "needs-review")
+    return {
+        "custodySchedule": run.parsed.get("custodySchedule") or None,
+        "eventsGenerated": run.events_generated,
+        "stages": run.timings(),
+    }
+
+
+def _custody_agreement_job_failed(job: dict, error: str):
+    _set_document_status(job.get("document_id"), "needs-review")
+
+
+parse_jobs.register_handler(CUSTODY_AGREEMENT_JOB, run_custody_agreement_job, on_failure=_custody_agreement_job_failed)
+
+
+def _get_family_job(job_id: str, current_user: User) -> dict:
+    job = parse_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    family = db.families.find_one({"$or": [
+        {"parent1_email": current_user.email},
+        {"parent2_email": current_user.email}
+    ]})
+    if not family or job["family_id"] not in (str(family["_id"]), family.get("id")):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=dict)
+async def get_parse_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
 ):
-    """Parse custody agreement and create calendar events"""
-    try:
-        parser = DocumentParser()
-        decoded_content = base64.b64decode(file_content)
-        parsed_data = await parser.parse_document(decoded_content, file_type)
+    """Get the status of a background parse job"""
+    return parse_jobs.job_view(_get_family_job(job_id, current_user))
 
-        if parsed_data and parsed_data.get("custodySchedule"):
-            family_id = str(family["_id"])
-            generate_custody_events(family_id, parsed_data)
-        else:
-            print("No custody schedule found in document")
 
-    except Exception as e:
-        print(f"Error creating custody events: {e}")
-        # We don't re-raise the exception to avoid failing the whole upload
-        # if calendar generation fails. This can be handled async later.
+@router.get("/jobs/{job_id}/events")
+async def stream_parse_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Server-sent events with the job's status until it finishes"""
+    job = _get_family_job(job_id, current_user)
+
+    async def events():
+        listener = parse_jobs.subscribe(job_id)
+        try:
+            view = parse_jobs.job_view(job)
+            while True:
+                yield f"data: {json.dumps(view)}\n\n"
+                if view["status"] in parse_jobs.TERMINAL_STATUSES:
+                    return
+                try:
+                    view = await asyncio.wait_for(listener.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep-alive; also re-read in case the job ran in another worker process
+                    latest = parse_jobs.get_job(job_id)
+                    view = parse_jobs.job_view(latest) if latest else view
+        finally:
+            parse_jobs.unsubscribe(job_id, listener)
 
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
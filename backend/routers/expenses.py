@@ -1,16 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from fastapi.responses import FileResponse
-from typing import List
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, status, Response, UploadFile
+from typing import List, Optional
 from datetime import datetime, date
 from bson import ObjectId
 import uuid
-import base64
 import os
 from pathlib import Path
 
 from models import Expense, ExpenseCreate, ExpenseUpdate, User
 from routers.auth import get_current_user
+from routers.documents import stored_file_response, versioned_file_url
 from database import db
+from services import blob_store, file_storage
 
 router = APIRouter(prefix="/api/v1/expenses", tags=["expenses"])
 
@@ -25,26 +25,10 @@ def get_family_expense_split(family: dict) -> dict:
     # Default to 50-50 if no agreement
     return {"parent1": 50, "parent2": 50}
 
-def save_receipt(receipt_content: str, receipt_file_name: str, expense_id: str) -> str:
-    """Save receipt file and return URL/path"""
-    # In production, this would upload to S3 or similar
-    # For now, we'll store in a receipts directory
-    receipts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "receipts")
-    if not os.path.exists(receipts_dir):
-        os.makedirs(receipts_dir)
-    
-    file_extension = receipt_file_name.split('.')[-1] if '.' in receipt_file_name else 'jpg'
-    file_path = f"{receipts_dir}/{expense_id}.{file_extension}"
-    
-    try:
-        decoded_content = base64.b64decode(receipt_content)
-        with open(file_path, 'wb') as f:
-            f.write(decoded_content)
-        # Return API endpoint path instead of relative path
-        return f"/api/v1/expenses/receipts/{expense_id}.{file_extension}"
-    except Exception as e:
-        print(f"Error saving receipt: {e}")
-        return ""
+async def save_receipt(receipt_content: str, receipt_file_name: str) -> blob_store.Blob:
+    """Decode a base64 receipt and store it in the blob store. Raises ValueError for bad content."""
+    decoded_content = file_storage.decode_base64(receipt_content)
+    return await blob_store.store_buffer(decoded_content, receipt_extension(receipt_file_name))
 
 @router.get("", response_model=List[dict])
 async def get_expenses(current_user: User = Depends(get_current_user)):
@@ -76,6 +60,8 @@ async def get_expenses(current_user: User = Depends(get_current_user)):
             # Use the stored 'id' field (UUID) if available, otherwise fall back to _id
             expense_id = exp.get("id") or str(exp.get("_id", ""))
             
+            receipt_url = versioned_file_url(receipt_url, exp.get("receipt_sha256"))
+            
             result.append({
                 "id": expense_id,
                 "description": exp["description"],
@@ -103,6 +89,84 @@ async def get_expenses(current_user: User = Depends(get_current_user)):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def receipt_extension(receipt_file_name: str) -> str:
+    return receipt_file_name.split('.')[-1] if '.' in receipt_file_name else 'jpg'
+
+
+def receipt_url_for(receipt_file_name: str, expense_id: str) -> str:
+    """API URL of an expense's receipt."""
+    return f"/api/v1/expenses/receipts/{expense_id}.{receipt_extension(receipt_file_name)}"
+
+
+def _find_user_family(current_user: User) -> dict:
+    family = db.families.find_one({"$or": [
+        {"parent1_email": current_user.email},
+        {"parent2_email": current_user.email}
+    ]})
+    if not family:
+        raise HTTPException(status_code=404, detail="Family not found")
+    return family
+
+
+def _insert_expense(
+    family: dict,
+    expense_id: str,
+    paid_by_email: str,
+    description: str,
+    amount: float,
+    category: str,
+    expense_date: date,
+    receipt_url: Optional[str],
+    receipt_file_name: Optional[str],
+    children_ids: Optional[List[str]],
+    receipt_sha256: Optional[str] = None,
+) -> dict:
+    """Insert an expense record; returns the create response."""
+    family_id = str(family["_id"])
+    
+    # Get expense split ratio from custody agreement
+    split_ratio = get_family_expense_split(family)
+    
+    # Convert date to string for MongoDB compatibility
+    date_str = expense_date.isoformat() if isinstance(expense_date, date) else str(expense_date)
+    
+    expense_doc = {
+        "id": expense_id,
+        "family_id": family_id,
+        "description": description,
+        "amount": amount,
+        "category": category,
+        "date": date_str,
+        "paid_by_email": paid_by_email,
+        "status": "pending",
+        "split_ratio": split_ratio,
+        "receipt_url": receipt_url,
+        "receipt_file_name": receipt_file_name,
+        "receipt_sha256": receipt_sha256,
+        # Receipts saved before the blob store are files under receipts/
+        "receipt_storage": "blob" if receipt_sha256 else None,
+        "children_ids": children_ids or [],
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    
+    db.expenses.insert_one(expense_doc)
+    
+    return {
+        "id": expense_id,
+        "description": description,
+        "amount": amount,
+        "category": category,
+        "date": date_str,
+        "paidBy": paid_by_email,
+        "status": "pending",
+        "splitRatio": split_ratio,
+        "receiptUrl": versioned_file_url(receipt_url, receipt_sha256),
+        "receiptFileName": receipt_file_name,
+        "childrenIds": children_ids or [],
+    }
+
+
 @router.post("", response_model=dict)
 async def create_expense(
     expense_data: ExpenseCreate,
@@ -111,66 +175,38 @@ async def create_expense(
     """Create a new expense"""
     try:
         # Get user's family
-        family = db.families.find_one({"$or": [
-            {"parent1_email": current_user.email},
-            {"parent2_email": current_user.email}
-        ]})
-        
-        if not family:
-            raise HTTPException(status_code=404, detail="Family not found")
-        
-        family_id = str(family["_id"])
-        
-        # Get expense split ratio from custody agreement
-        split_ratio = get_family_expense_split(family)
+        family = _find_user_family(current_user)
         
         # Create expense document
         expense_id = str(uuid.uuid4())
-        receipt_url = None
+        receipt_url = stored = None
         
         # Save receipt if provided
         if expense_data.receipt_content and expense_data.receipt_file_name:
-            receipt_url = save_receipt(
-                expense_data.receipt_content,
+            try:
+                stored = await save_receipt(expense_data.receipt_content, expense_data.receipt_file_name)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            receipt_url = receipt_url_for(expense_data.receipt_file_name, expense_id)
+        
+        try:
+            return _insert_expense(
+                family,
+                expense_id,
+                current_user.email,
+                expense_data.description,
+                expense_data.amount,
+                expense_data.category,
+                expense_data.date,
+                receipt_url,
                 expense_data.receipt_file_name,
-                expense_id
+                expense_data.children_ids,
+                receipt_sha256=stored.sha256 if stored else None,
             )
-        
-        # Convert date to string for MongoDB compatibility
-        date_str = expense_data.date.isoformat() if isinstance(expense_data.date, date) else str(expense_data.date)
-        
-        expense_doc = {
-            "id": expense_id,
-            "family_id": family_id,
-            "description": expense_data.description,
-            "amount": expense_data.amount,
-            "category": expense_data.category,
-            "date": date_str,
-            "paid_by_email": current_user.email,
-            "status": "pending",
-            "split_ratio": split_ratio,
-            "receipt_url": receipt_url,
-            "receipt_file_name": expense_data.receipt_file_name,
-            "children_ids": expense_data.children_ids or [],
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        
-        db.expenses.insert_one(expense_doc)
-        
-        return {
-            "id": expense_id,
-            "description": expense_data.description,
-            "amount": expense_data.amount,
-            "category": expense_data.category,
-            "date": expense_data.date.isoformat(),
-            "paidBy": current_user.email,
-            "status": "pending",
-            "splitRatio": split_ratio,
-            "receiptUrl": receipt_url,
-            "receiptFileName": expense_data.receipt_file_name,
-            "childrenIds": expense_data.children_ids or [],
-        }
+        except Exception:
+            if stored:
+                blob_store.release(stored.sha256)
+            raise
     except HTTPException:
         raise
     except Exception as e:
@@ -179,6 +215,54 @@ async def create_expense(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.post("/stream", response_model=dict)
+async def create_expense_stream(
+    description: str = Form(...),
+    amount: float = Form(...),
+    category: str = Form(...),
+    expense_date: date = Form(..., alias="date"),
+    children_ids: Optional[str] = Form(None, description="Comma-separated child ids"),
+    receipt: Optional[UploadFile] = File(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Create a new expense as multipart form data. Same result as POST
+    /api/v1/expenses, but the receipt is streamed to storage instead of
+    sent as base64 JSON.
+    """
+    family = _find_user_family(current_user)
+    expense_id = str(uuid.uuid4())
+    receipt_url = receipt_file_name = stored = None
+
+    if receipt is not None and receipt.filename:
+        receipt_file_name = os.path.basename(receipt.filename)
+        receipt_url = receipt_url_for(receipt_file_name, expense_id)
+        try:
+            stored = await blob_store.store_upload(receipt, receipt_extension(receipt_file_name))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        return _insert_expense(
+            family,
+            expense_id,
+            current_user.email,
+            description,
+            amount,
+            category,
+            expense_date,
+            receipt_url,
+            receipt_file_name,
+            [child_id.strip() for child_id in (children_ids or "").split(",") if child_id.strip()],
+            receipt_sha256=stored.sha256 if stored else None,
+        )
+    except Exception as e:
+        if stored:
+            blob_store.release(stored.sha256)
+        print(f"[ERROR] Create expense: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.put("/{expense_id}", response_model=dict)
 async def update_expense(
     expense_id: str,
@@ -251,6 +335,7 @@ async def update_expense(
         if receipt_url and receipt_url.startswith("/receipts/"):
             receipt_filename = receipt_url.replace("/receipts/", "")
             receipt_url = f"/api/v1/expenses/receipts/{receipt_filename}"
+        receipt_url = versioned_file_url(receipt_url, updated_expense.get("receipt_sha256"))
         
         return {
             "id": expense_id,
@@ -309,6 +394,9 @@ async def delete_expense(
         else:
             db.expenses.delete_one({"_id": expense.get("_id")})
         
+        if expense.get("receipt_storage") == "blob":
+            blob_store.release(expense.get("receipt_sha256"))
+        
         return {"message": "Expense deleted successfully"}
     except HTTPException:
         raise
@@ -381,9 +469,10 @@ async def get_expense_summary(current_user: User = Depends(get_current_user)):
 @router.get("/receipts/{receipt_filename}")
 async def get_receipt(
     receipt_filename: str,
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
-    """Serve receipt file"""
+    """Serve receipt file (with Range and conditional GET support, like document files)"""
     try:
         # Extract expense ID from filename (format: expense_id.extension)
         expense_id = receipt_filename.split('.')[0]
@@ -410,13 +499,6 @@ async def get_receipt(
         if not family or str(family["_id"]) != expense["family_id"]:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Get file path
-        receipts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "receipts")
-        file_path = os.path.join(receipts_dir, receipt_filename)
-        
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="Receipt file not found")
-        
         # Determine media type
         file_extension = receipt_filename.split('.')[-1].lower()
         media_types = {
@@ -428,10 +510,14 @@ async def get_receipt(
         }
         media_type = media_types.get(file_extension, 'application/octet-stream')
         
-        return FileResponse(
-            file_path,
-            media_type=media_type,
-            filename=expense.get("receipt_file_name", receipt_filename)
+        legacy_path = None if expense.get("receipt_storage") == "blob" else os.path.join(file_storage.RECEIPTS_DIR, receipt_filename)
+        return stored_file_response(
+            request,
+            media_type,
+            expense.get("receipt_file_name", receipt_filename),
+            sha256=expense.get("receipt_sha256"),
+            legacy_path=legacy_path,
+            uploaded_at=expense.get("created_at"),
         )
     except HTTPException:
         raise
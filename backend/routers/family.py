@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
+from fastapi.responses import FileResponse
+from typing import List, Optional, Tuple
+import asyncio
+import os
 import uuid
 import random
 import string
-import os
 from datetime import datetime, date, timedelta, timezone
 import base64
 import re
@@ -11,6 +13,7 @@ import re
 from models import Family, FamilyCreate, FamilyLink, ContractUpload, CustodyAgreement, Child, ChildCreate, ChildUpdate, User, CustodyManualData
 from routers.auth import get_current_user
 from database import db
+from services import calendar_cache, event_conflicts, file_storage, parse_jobs, parsing_pipeline
 
 router = APIRouter()
 
@@ -79,6 +82,8 @@ async def link_to_family(link_data: FamilyLink, current_user: User = Depends(get
     )
     
     updated_family = db.families.find_one({"familyCode": link_data.familyCode})
+    # Holiday overrides resolve parent emails, so cached months are now stale
+    calendar_cache.invalidate_family(family_calendar_id(updated_family))
     return Family(**updated_family)
 
 @router.get("/api/v1/family", response_model=Family)
@@ -204,163 +209,233 @@ async def delete_child(child_id: str, current_user: User = Depends(get_current_u
         
     return {"message": "Child removed successfully"}
 
-def parse_contract_with_ai(file_content: str, file_type: str):
+from services.calendar_generator import find_family, regenerate_custody_events, family_calendar_id
+
+def _contract_persister(user_family: dict, file_name: str, file_type: str, stored: file_storage.StoredFile):
+    """Pipeline persist stage for a contract upload: store it as the family's custody agreement."""
+    async def persist(run: parsing_pipeline.ParseRun):
+        # Create custody agreement object (the original file stays on disk for download)
+        custody_agreement = CustodyAgreement(
+            uploadDate=datetime.utcnow(),
+            fileName=file_name,
+            fileType=file_type,
+            storedFile=os.path.basename(stored.path),
+            fileSize=stored.size,
+            sha256=stored.sha256,
+            **parsing_pipeline.agreement_fields(run.parsed)
+        )
+        run.schedule_data = custody_agreement.model_dump()
+        previous = (user_family.get("custodyAgreement") or {}).get("storedFile")
+        # Update family with custody agreement
+        db.families.update_one(
+            {"_id": user_family["_id"]},
+            {"$set": {"custodyAgreement": run.schedule_data}}
+        )
+        # The replaced agreement's file is no longer referenced
+        if previous and previous != custody_agreement.storedFile:
+            file_storage.remove_file(os.path.join(file_storage.CONTRACTS_DIR, previous))
+    return persist
+
+
+CONTRACT_FILE_TYPES = ("pdf", "doc", "docx", "txt")
+
+
+def _family_key(user_family: dict) -> str:
+    # Families created before the `id` field only have _id
+    return user_family.get("id") or str(user_family["_id"])
+
+
+def _contract_file(file_name: Optional[str]) -> Tuple[str, str]:
     """
-    Simulate AI parsing of custody agreement.
-    In production, this would use GPT-4, Claude, or a specialized legal AI.
+    (file name, file type) of an uploaded contract, taken from the file name
+    without its directories. Raises ValueError for unsupported types.
     """
-    # This is a simulation - in production, you'd send to an AI API
-    # For now, we'll extract some common patterns
-    
-    parsed_data = {
-        "parsed": True,
-        "confidence": 0.85,
-        "extractedTerms": []
+    file_name = os.path.basename(file_name or "") or "custody_agreement.pdf"
+    file_type = os.path.splitext(file_name)[1].lower().lstrip(".") or "pdf"
+    if file_type not in CONTRACT_FILE_TYPES:
+        raise ValueError(f"Unsupported file type: {file_type}. Supported: {', '.join(CONTRACT_FILE_TYPES)}")
+    return file_name, file_type
+
+
+def _contract_path(user_family: dict, file_type: str) -> str:
+    # file_type comes from _contract_file, never straight from the client
+    return os.path.join(file_storage.CONTRACTS_DIR, f"{_family_key(user_family)}-{uuid.uuid4()}.{file_type}")
+
+
+async def _store_contract_upload(user_family: dict, contract: ContractUpload):
+    """
+    Decode a JSON contract upload once and save it; returns (file name,
+    file type, StoredFile, decoded buffer) so the parse reuses the buffer
+    and its hash. Raises ValueError for unsupported file names and for
+    content that isn't base64 or is empty.
+    """
+    file_name, file_type = _contract_file(contract.fileName)
+    file_content = file_storage.decode_base64(contract.fileContent)
+    stored = await file_storage.store_buffer(file_content, _contract_path(user_family, file_type))
+    return file_name, file_type, stored, file_content
+
+
+async def _parse_contract(
+    user_family: dict,
+    file_name: str,
+    file_type: str,
+    stored: file_storage.StoredFile,
+    file_content=None,
+) -> parsing_pipeline.ParseRun:
+    """
+    Parse a stored agreement, save it and regenerate the family's custody
+    events. Pass file_content when the upload is still in memory; otherwise
+    the stored file is read. Raises ValueError for bad or unsupported files.
+    """
+    if file_content is None:
+        file_content = await asyncio.to_thread(file_storage.read_file, stored.path)
+    return await parsing_pipeline.pipeline.run(
+        parsing_pipeline.default_parser(),
+        file_type,
+        file_content=file_content,
+        family=user_family,
+        persist=_contract_persister(user_family, file_name, file_type, stored),
+        digest=stored.sha256,
+    )
+
+
+def _contract_response(run: parsing_pipeline.ParseRun) -> dict:
+    return {
+        "message": "Contract uploaded and parsed successfully",
+        "custodyAgreement": run.schedule_data,
+        "aiAnalysis": run.parsed.get("parsedData", run.parsed)
     }
-    
-    # Simulate extracting key information
-    content_lower = file_content.lower()
-    
-    # Check for custody split patterns
-    if "50/50" in content_lower or "50-50" in content_lower or "equal time" in content_lower:
-        parsed_data["extractedTerms"].append({
-            "term": "Custody Split",
-            "value": "50/50 Equal Time",
-            "confidence": 0.9
-        })
-        expense_split = {"ratio": "50-50", "parent1": 50, "parent2": 50}
-    elif "primary" in content_lower and "secondary" in content_lower:
-        parsed_data["extractedTerms"].append({
-            "term": "Custody Split",
-            "value": "Primary/Secondary",
-            "confidence": 0.8
-        })
-        expense_split = {"ratio": "60-40", "parent1": 60, "parent2": 40}
+
+
+CONTRACT_JOB = "family-contract"
+
+
+def _contract_payload(file_name: str, file_type: str, stored: file_storage.StoredFile) -> dict:
+    return {"fileName": file_name, "fileType": file_type, "storedFile": os.path.basename(stored.path), "fileSize": stored.size, "sha256": stored.sha256}
+
+
+def _discard_unsaved_contract(family_id: str, stored: file_storage.StoredFile):
+    """Remove an upload's file after a failed parse, unless its agreement was saved before the failure."""
+    family = find_family(family_id) or {}
+    if (family.get("custodyAgreement") or {}).get("storedFile") != os.path.basename(stored.path):
+        file_storage.remove_file(stored.path)
+
+
+def _stored_contract(payload: dict) -> file_storage.StoredFile:
+    return file_storage.StoredFile(os.path.join(file_storage.CONTRACTS_DIR, payload["storedFile"]), payload["fileSize"], payload["sha256"])
+
+
+def _enqueue_contract_job(user_family: dict, file_name: str, file_type: str, stored: file_storage.StoredFile, response: Response, created_by: str) -> dict:
+    job = parse_jobs.enqueue(CONTRACT_JOB, _family_key(user_family), _contract_payload(file_name, file_type, stored), created_by=created_by)
+    response.status_code = 202
+    return {
+        "message": "Contract uploaded; parsing in progress",
+        "jobId": job["id"],
+        "status": job["status"]
+    }
+
+
+async def _parse_contract_upload(user_family: dict, file_name: str, file_type: str, stored: file_storage.StoredFile, file_content=None) -> dict:
+    """Parse a stored upload for the request; its file is removed if the parse fails."""
+    try:
+        run = await _parse_contract(user_family, file_name, file_type, stored, file_content)
+        return _contract_response(run)
+    except ValueError as e:
+        _discard_unsaved_contract(_family_key(user_family), stored)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        _discard_unsaved_contract(_family_key(user_family), stored)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error parsing document: {str(e)}"
+        )
+
+
+async def run_contract_job(job: dict) -> dict:
+    """Parse job for a contract uploaded with ?background=true."""
+    user_family = find_family(job["family_id"])
+    if not user_family:
+        raise ValueError("Family profile not found")
+    payload = job["payload"]
+    # ValueError (bad or unsupported file) fails the job; retrying won't help
+    if payload.get("storedFile"):
+        run = await _parse_contract(user_family, payload["fileName"], payload["fileType"], _stored_contract(payload))
     else:
-        expense_split = {"ratio": "custom", "parent1": 50, "parent2": 50}
-    
-    # Check for decision-making terms
-    if "joint legal custody" in content_lower:
-        parsed_data["extractedTerms"].append({
-            "term": "Legal Custody",
-            "value": "Joint Legal Custody",
-            "confidence": 0.95
-        })
-    
-    # Check for holiday scheduling
-    if "alternate" in content_lower and "holiday" in content_lower:
-        parsed_data["extractedTerms"].append({
-            "term": "Holiday Schedule",
-            "value": "Alternating Holidays",
-            "confidence": 0.85
-        })
-    
+        # Queued as base64 JSON before uploads were stored first
+        file_name, file_type, stored, file_content = await _store_contract_upload(user_family, ContractUpload(**payload))
+        try:
+            run = await _parse_contract(user_family, file_name, file_type, stored, file_content)
+        except Exception:
+            _discard_unsaved_contract(_family_key(user_family), stored)
+            raise
     return {
-        "custodySchedule": "Extracted from agreement",
-        "holidaySchedule": "Alternating holidays as specified",
-        "decisionMaking": "Joint legal custody",
-        "expenseSplit": expense_split,
-        "parsedData": parsed_data
+        "custodySchedule": run.schedule_data["custodySchedule"],
+        "eventsGenerated": run.events_generated,
+        "stages": run.timings(),
     }
 
-from services.calendar_generator import generate_custody_events
+
+def _contract_job_failed(job: dict, error: str):
+    # An upload's file is only kept once its agreement is saved
+    if job["payload"].get("storedFile"):
+        _discard_unsaved_contract(job["family_id"], _stored_contract(job["payload"]))
+
+
+parse_jobs.register_handler(CONTRACT_JOB, run_contract_job, on_failure=_contract_job_failed)
+
 
 @router.post("/api/v1/family/contract")
-async def upload_contract(contract: ContractUpload, current_user: User = Depends(get_current_user)):
+async def upload_contract(
+    contract: ContractUpload,
+    response: Response,
+    background: bool = Query(False, description="Parse in a background job and return its id right away"),
+    current_user: User = Depends(get_current_user)
+):
     """Upload and parse custody agreement document."""
     # Find the user's family
     user_family = db.families.find_one({"$or": [{"parent1_email": current_user.email}, {"parent2_email": current_user.email}]})
     
     if not user_family:
         raise HTTPException(status_code=404, detail="Family profile not found")
+
+    # Decode once: the same buffer is hashed, saved and parsed
+    try:
+        file_name, file_type, stored, file_content = await _store_contract_upload(user_family, contract)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if background:
+        return _enqueue_contract_job(user_family, file_name, file_type, stored, response, current_user.email)
+
+    return await _parse_contract_upload(user_family, file_name, file_type, stored, file_content)
+
+
+@router.post("/api/v1/family/contract/stream")
+async def upload_contract_stream(
+    response: Response,
+    file: UploadFile = File(...),
+    background: bool = Query(False, description="Parse in a background job and return its id right away"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Upload and parse custody agreement document as multipart form data.
+    The file is streamed to storage instead of sent as base64 JSON.
+    """
+    user_family = db.families.find_one({"$or": [{"parent1_email": current_user.email}, {"parent2_email": current_user.email}]})
     
+    if not user_family:
+        raise HTTPException(status_code=404, detail="Family profile not found")
+
     try:
-        # Decode base64 content to bytes (not text - PDFs/DOCs are binary)
-        file_bytes = base64.b64decode(contract.fileContent)
-        
-        # Try to use the new DocumentParser service
-        try:
-            from services.document_parser import DocumentParser
-            parser = DocumentParser(
-                ai_provider=os.getenv("AI_PROVIDER", "openai"),
-                api_key=os.getenv("OPENAI_API_KEY") or os.getenv("ANTHROPIC_API_KEY")
-            )
-            
-            # Parse document (extracts text and uses AI)
-            parsed_info = await parser.parse_document(file_bytes, contract.fileType)
-            
-            # Map parsed data to expected format
-            custody_schedule = parsed_info.get("custodySchedule", "Extracted from agreement")
-            holiday_schedule = parsed_info.get("holidaySchedule", "As specified in agreement")
-            decision_making = parsed_info.get("decisionMaking", "Joint legal custody")
-            expense_split = parsed_info.get("expenseSplit", {"ratio": "50-50", "parent1": 50, "parent2": 50})
-            
-        except (ImportError, ValueError) as e:
-            # Fallback to old pattern matching if new parser not available or PDF support missing
-            error_msg = str(e)
-            
-            # If it's a PDF/DOC file and libraries aren't available, provide helpful error
-            if contract.fileType.lower() not in ['txt', 'text']:
-                if "PDF support not available" in error_msg or "DOCX support not available" in error_msg:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=error_msg
-                    )
-                else:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"PDF/DOC parsing requires additional libraries. Install: pip install pdfplumber python-docx openai. Error: {error_msg}"
-                    )
-            
-            # For TXT files, fallback to old pattern matching
-            if contract.fileType.lower() in ['txt', 'text']:
-                file_content = file_bytes.decode('utf-8', errors='ignore')
-                parsed_info = parse_contract_with_ai(file_content, contract.fileType)
-                custody_schedule = parsed_info["custodySchedule"]
-                holiday_schedule = parsed_info["holidaySchedule"]
-                decision_making = parsed_info["decisionMaking"]
-                expense_split = parsed_info["expenseSplit"]
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"PDF/DOC parsing requires additional libraries. Install: pip install pdfplumber python-docx openai. Error: {error_msg}"
-                )
-        
-        # Create custody agreement object (store original file for download)
-        custody_agreement = CustodyAgreement(
-            uploadDate=datetime.utcnow(),
-            fileName=contract.fileName,
-            fileType=contract.fileType,
-            fileContent=contract.fileContent,  # Store base64 for download
-            custodySchedule=custody_schedule,
-            holidaySchedule=holiday_schedule,
-            decisionMaking=decision_making,
-            expenseSplit=expense_split,
-            parsedData=parsed_info.get("parsedData", parsed_info)
-        )
-        
-        # Update family with custody agreement
-        db.families.update_one(
-            {"_id": user_family["_id"]},
-            {"$set": {"custodyAgreement": custody_agreement.model_dump()}}
-        )
-        
-        # Generate calendar events from the new agreement
-        generate_custody_events(user_family["id"], custody_agreement.model_dump())
-        
-        return {
-            "message": "Contract uploaded and parsed successfully",
-            "custodyAgreement": custody_agreement,
-            "aiAnalysis": parsed_info.get("parsedData", parsed_info)
-        }
-        
+        file_name, file_type = _contract_file(file.filename)
+        stored = await file_storage.store_upload(file, _contract_path(user_family, file_type))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error parsing document: {str(e)}"
-        )
+
+    if background:
+        return _enqueue_contract_job(user_family, file_name, file_type, stored, response, current_user.email)
+
+    return await _parse_contract_upload(user_family, file_name, file_type, stored)
 
 @router.get("/api/v1/family/contract")
 async def get_contract(current_user: User = Depends(get_current_user)):
@@ -391,11 +466,10 @@ async def download_contract(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="No custody agreement found")
     
     file_content = custody_agreement.get("fileContent")
-    if not file_content:
+    stored_file = custody_agreement.get("storedFile")
+    if not file_content and not stored_file:
         raise HTTPException(status_code=404, detail="Original file not available")
     
-    # Decode base64 to bytes
-    file_bytes = base64.b64decode(file_content)
     file_name = custody_agreement.get("fileName", "custody_agreement")
     file_type = custody_agreement.get("fileType", "pdf")
     
@@ -427,6 +501,19 @@ async def download_contract(current_user: User = Depends(get_current_user)):
     # For PDFs, use 'inline' to open in browser; for others, use 'attachment' to download
     disposition = "inline" if file_type.lower() == "pdf" else "attachment"
     
+    if stored_file:
+        # Uploads are kept on disk and streamed back from there
+        file_path = os.path.join(file_storage.CONTRACTS_DIR, stored_file)
+        if not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="Original file not available")
+        return FileResponse(
+            file_path,
+            media_type=media_type,
+            headers={"Content-Disposition": f'{disposition}; filename="{file_name}"'}
+        )
+    
+    # Agreements uploaded before files were kept on disk carry base64
+    file_bytes = base64.b64decode(file_content)
     return Response(
         content=file_bytes,
         media_type=media_type,
@@ -571,8 +658,7 @@ async def save_manual_custody(data: CustodyManualData, current_user: User = Depe
         )
         
         # Generate calendar events from the new agreement
-        from services.calendar_generator import generate_custody_events
-        generate_custody_events(user_family["id"], custody_agreement.model_dump())
+        await regenerate_custody_events(_family_key(user_family), custody_agreement.model_dump())
         
         return {
             "message": "Custody information saved successfully",
@@ -600,12 +686,18 @@ async def delete_contract(current_user: User = Depends(get_current_user)):
             {"_id": user_family["_id"]},
             {"$unset": {"custodyAgreement": ""}}
         )
+        stored_file = (user_family.get("custodyAgreement") or {}).get("storedFile")
+        if stored_file:
+            file_storage.remove_file(os.path.join(file_storage.CONTRACTS_DIR, stored_file))
         
         # Delete future custody events
+        calendar_id = family_calendar_id(user_family)
         db.events.delete_many({
-            "family_id": user_family["id"],
+            "family_id": calendar_id,
             "type": "custody"
         })
+        event_conflicts.invalidate_family(calendar_id)
+        calendar_cache.invalidate_family(calendar_id)
         
         return {"message": "Custody agreement and associated events deleted successfully"}
         
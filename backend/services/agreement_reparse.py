@@ -0,0 +1,321 @@
+"""
+Agreement Re-parse
+
+When the parser changes (normalization in _normalize_parsed_data, the
+pattern rules, the prompt), families keep the custodyAgreement that the
+old version parsed. A re-parse run walks every family with a stored
+agreement file in `_id` order and parses the file again through the
+parsing pipeline, bypassing the parse cache. Then:
+
+- the stored fields are diffed against the new parse, and only families
+  whose agreement changed are written. parsedData is compared without the
+  fields that vary from one LLM answer to the next (VOLATILE_PARSED_FIELDS)
+- each write is guarded on the agreement's uploadDate, so an agreement
+  uploaded while the run was parsing is never overwritten
+- custody events are regenerated only where the schedule kind changed and
+  the guarded write went through; every write that goes through drops the
+  family's cached calendar months
+- progress (the last family `_id` and the counters) is checkpointed in
+  `reparse_runs` after every batch, so a stopped or crashed run resumes
+  where it left off instead of starting over
+
+LLM load is bounded twice. At most REPARSE_CONCURRENCY agreements are
+parsed at once, on top of the process-wide LLM_GLOBAL_CONCURRENCY.
+REPARSE_MAX_PER_SECOND paces how fast new parses start, so a backfill
+leaves capacity for live uploads.
+
+Start a run from the command line (reparse_agreements.py) or with
+POST /api/v1/admin/reparse.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import db
+from services import calendar_cache, file_storage, metrics, parsing_pipeline
+from services.calendar_generator import custody_schedule_kind, family_calendar_id, regenerate_custody_events
+
+REPARSE_BATCH_SIZE = int(os.getenv("REPARSE_BATCH_SIZE", "100"))
+REPARSE_CONCURRENCY = int(os.getenv("REPARSE_CONCURRENCY", "4"))
+# New parses started per second across a run (0 = no pacing)
+REPARSE_MAX_PER_SECOND = float(os.getenv("REPARSE_MAX_PER_SECOND", "2"))
+# Failures kept on the run document for inspection
+MAX_RECORDED_ERRORS = 50
+
+AGREEMENT_FIELDS = ("custodySchedule", "holidaySchedule", "decisionMaking", "expenseSplit", "parsedData")
+# Confidence scores and quoted terms differ between two parses of the same file
+VOLATILE_PARSED_FIELDS = ("confidence", "fieldConfidence", "extractedTerms", "parseTier")
+
+_stats = {"runs_started": 0, "families_reparsed": 0, "agreements_changed": 0, "schedules_regenerated": 0, "failures": 0}
+_family_latency = metrics.LatencyRecorder()
+_active: Dict[str, asyncio.Task] = {}
+
+
+def _empty_counters() -> Dict[str, int]:
+    return {"scanned": 0, "changed": 0, "unchanged": 0, "written": 0, "schedulesChanged": 0, "failed": 0}
+
+
+def create_run(dry_run: bool = False, limit: int = 0, created_by: Optional[str] = None) -> dict:
+    """Record a new re-parse run; reparse() then works through it."""
+    now = datetime.utcnow()
+    run = {
+        "id": str(uuid.uuid4()),
+        "status": "pending",
+        "dry_run": dry_run,
+        "limit": limit,
+        "last_family_id": "",
+        "cursor": None,
+        "counters": _empty_counters(),
+        "changed_fields": {},
+        "errors": [],
+        "stop_requested": False,
+        "created_by": created_by,
+        "created_at": now,
+        "updated_at": now,
+        "finished_at": None,
+    }
+    db.reparse_runs.insert_one(run)
+    return run
+
+
+def get_run(run_id: str) -> Optional[dict]:
+    return db.reparse_runs.find_one({"id": run_id})
+
+
+def request_stop(run_id: str) -> bool:
+    """Ask a run to stop after its current batch. It can be resumed later."""
+    result = db.reparse_runs.update_one({"id": run_id}, {"$set": {"stop_requested": True}})
+    return result.matched_count > 0
+
+
+def run_view(run: dict) -> dict:
+    """Client-facing representation of a run."""
+    def iso(value):
+        return value.isoformat() if isinstance(value, datetime) else value
+
+    return {
+        "id": run["id"],
+        "status": run["status"],
+        "dryRun": run.get("dry_run", False),
+        "limit": run.get("limit", 0),
+        "lastFamilyId": run.get("last_family_id"),
+        "counters": run.get("counters", {}),
+        "changedFields": run.get("changed_fields", {}),
+        "errors": run.get("errors", []),
+        "createdAt": iso(run.get("created_at")),
+        "updatedAt": iso(run.get("updated_at")),
+        "finishedAt": iso(run.get("finished_at")),
+    }
+
+
+def _comparable(name: str, value: Any) -> str:
+    if name == "parsedData" and isinstance(value, dict):
+        value = {key: item for key, item in value.items() if key not in VOLATILE_PARSED_FIELDS}
+    # Stored agreements went through pydantic and MongoDB, so compare by JSON value
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def diff_agreement(stored: dict, fields: dict) -> List[str]:
+    """Names of the agreement fields whose new value differs from the stored one."""
+    return [name for name in AGREEMENT_FIELDS if _comparable(name, stored.get(name)) != _comparable(name, fields.get(name))]
+
+
+def _family_label(family: dict) -> str:
+    return family.get("id") or str(family["_id"])
+
+
+class _Pacer:
+    """Spaces out starts to at most `per_second` per second."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1 / per_second if per_second > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def _reparse_family(family: dict, parser, semaphore: asyncio.Semaphore, pacer: _Pacer) -> Tuple[dict, List[str], bool]:
+    """Parse one family's stored agreement again; returns (new fields, changed field names, schedule changed)."""
+    stored = family["custodyAgreement"]
+    await pacer.wait()
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            if stored.get("storedFile"):
+                file_content = await asyncio.to_thread(file_storage.read_file, os.path.join(file_storage.CONTRACTS_DIR, stored["storedFile"]))
+            else:
+                file_content = base64.b64decode(stored["fileContent"])
+            run = await parsing_pipeline.pipeline.run(
+                parser, stored.get("fileType") or "txt", file_content=file_content, refresh=True, digest=stored.get("sha256") or ""
+            )
+        finally:
+            _family_latency.record(time.perf_counter() - started)
+    fields = parsing_pipeline.agreement_fields(run.parsed)
+    changed = diff_agreement(stored, fields)
+    schedule_changed = bool(changed) and custody_schedule_kind(stored) != custody_schedule_kind({**stored, **fields})
+    return fields, changed, schedule_changed
+
+
+async def reparse(
+    run_id: str,
+    batch_size: int = REPARSE_BATCH_SIZE,
+    concurrency: int = REPARSE_CONCURRENCY,
+    max_per_second: float = REPARSE_MAX_PER_SECOND,
+    parser=None,
+    on_batch: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Work through a run from its checkpoint until every agreement is done,
+    its limit is reached, or a stop is requested. Returns the run document.
+    """
+    run = get_run(run_id)
+    if not run:
+        raise ValueError("Re-parse run not found")
+    if run["status"] == "completed":
+        return run
+
+    _stats["runs_started"] += 1
+    parser = parser or parsing_pipeline.default_parser()
+    semaphore = asyncio.Semaphore(concurrency)
+    pacer = _Pacer(max_per_second)
+    counters, changed_fields, errors = run["counters"], run["changed_fields"], run["errors"]
+    # Runs checkpointed before paging by _id have no cursor and start over;
+    # families already current are not written again
+    cursor = run.get("cursor")
+    db.reparse_runs.update_one({"id": run_id}, {"$set": {"status": "running", "stop_requested": False, "updated_at": datetime.utcnow()}})
+
+    status = "completed"
+    while True:
+        if (get_run(run_id) or {}).get("stop_requested"):
+            status = "paused"
+            break
+        size = batch_size
+        if run["limit"]:
+            size = min(size, run["limit"] - counters["scanned"])
+            if size <= 0:
+                break
+        # Agreements entered by hand have neither, and nothing to re-parse
+        query = {"$or": [{"custodyAgreement.fileContent": {"$ne": None}}, {"custodyAgreement.storedFile": {"$ne": None}}]}
+        if cursor is not None:
+            query["_id"] = {"$gt": cursor}
+        families = list(db.families.find(query, {"_id": 1, "id": 1, "custodyAgreement": 1}).sort("_id", 1).limit(size))
+        if not families:
+            break
+
+        # The upload each parse is based on, taken before parsing starts
+        upload_dates = [family["custodyAgreement"].get("uploadDate") for family in families]
+        results = await asyncio.gather(
+            *(_reparse_family(family, parser, semaphore, pacer) for family in families),
+            return_exceptions=True,
+        )
+
+        writes = []
+        for family, upload_date, result in zip(families, upload_dates, results):
+            counters["scanned"] += 1
+            if isinstance(result, Exception):
+                counters["failed"] += 1
+                _stats["failures"] += 1
+                if len(errors) < MAX_RECORDED_ERRORS:
+                    errors.append({"familyId": _family_label(family), "error": str(result)[:200]})
+                print(f"[ERROR] Re-parse family {_family_label(family)}: {result}")
+                continue
+            fields, changed, schedule_changed = result
+            _stats["families_reparsed"] += 1
+            if not changed:
+                counters["unchanged"] += 1
+                continue
+            counters["changed"] += 1
+            _stats["agreements_changed"] += 1
+            for name in changed:
+                changed_fields[name] = changed_fields.get(name, 0) + 1
+            if schedule_changed:
+                counters["schedulesChanged"] += 1
+            writes.append((family, upload_date, fields, changed, schedule_changed))
+
+        if not run["dry_run"]:
+            for family, upload_date, fields, changed, schedule_changed in writes:
+                stored = family["custodyAgreement"]
+                update = {f"custodyAgreement.{name}": fields[name] for name in changed}
+                update["custodyAgreement.reparsedAt"] = datetime.utcnow()
+                # Matching uploadDate means a new upload since the batch was read is never overwritten
+                result = db.families.update_one(
+                    {"_id": family["_id"], "custodyAgreement.uploadDate": upload_date},
+                    {"$set": update},
+                )
+                if not result.matched_count:
+                    # The family uploaded a new agreement meanwhile; its own parse regenerates the calendar
+                    continue
+                counters["written"] += 1
+                try:
+                    if schedule_changed:
+                        await regenerate_custody_events(family.get("id") or str(family["_id"]), {**stored, **fields})
+                        _stats["schedules_regenerated"] += 1
+                finally:
+                    # Cached months overlay holidays from the agreement just written
+                    calendar_cache.invalidate_family(family_calendar_id(family))
+
+        cursor = families[-1]["_id"]
+        # Checkpoint only after the batch is written: a crash redoes at most one batch
+        db.reparse_runs.update_one({"id": run_id}, {"$set": {
+            "cursor": cursor,
+            "last_family_id": _family_label(families[-1]),
+            "counters": counters,
+            "changed_fields": changed_fields,
+            "errors": errors,
+            "updated_at": datetime.utcnow(),
+        }})
+        if on_batch:
+            on_batch(get_run(run_id))
+
+    now = datetime.utcnow()
+    db.reparse_runs.update_one({"id": run_id}, {"$set": {
+        "status": status,
+        "updated_at": now,
+        "finished_at": now if status == "completed" else None,
+    }})
+    return get_run(run_id)
+
+
+def start_in_background(run_id: str, **options) -> asyncio.Task:
+    """Run reparse() as a task of this process (the admin endpoint's path)."""
+    if is_active(run_id):
+        raise ValueError("Re-parse run is already in progress")
+
+    async def run_and_log():
+        try:
+            await reparse(run_id, **options)
+        except Exception as e:
+            print(f"[ERROR] Re-parse run {run_id}: {e}")
+            db.reparse_runs.update_one({"id": run_id}, {"$set": {"status": "failed", "updated_at": datetime.utcnow()}})
+        finally:
+            _active.pop(run_id, None)
+
+    task = _active[run_id] = asyncio.create_task(run_and_log())
+    return task
+
+
+def is_active(run_id: str) -> bool:
+    task = _active.get(run_id)
+    return task is not None and not task.done()
+
+
+def stats() -> dict:
+    return {**_stats, "active_runs": sum(not task.done() for task in _active.values()), "family_latency": _family_latency.summary()}
+
+
+metrics.register("agreement_reparse", stats)
@@ -0,0 +1,239 @@
+"""
+Blob Store
+
+Document files and expense receipts are stored once per distinct content.
+A blob lives under blobs/<first two hex digits>/<sha256> and has a record
+in the `blobs` collection with its size and a reference count:
+
+- storing a file whose SHA-256 is already known only increments the count
+  (a family that uploads the same decree or receipt twice costs one file
+  and no second write)
+- release() decrements it when a document or expense is deleted; the file
+  and the record go when the count reaches zero
+- new blobs are written to a temporary name and renamed into place, so a
+  write that fails half-way leaves nothing behind
+- storing and deleting a hash hold the same lock, so a file is never
+  unlinked after a concurrent upload has recorded it again
+
+Compressible formats (COMPRESSIBLE_EXTENSIONS) are stored zstd-compressed
+when the `zstandard` package is installed and compression saves at least
+MIN_COMPRESSION_SAVING of the size. Readers get the original bytes back
+either way.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, Iterator, Optional, Union
+
+from database import db
+from services import file_storage, metrics
+
+# Optional imports - install as needed
+try:
+    import zstandard
+    ZSTD_SUPPORT = True
+except ImportError:
+    ZSTD_SUPPORT = False
+
+BLOBS_DIR = os.path.join(file_storage.BACKEND_DIR, "blobs")
+# Multipart uploads are hashed here before their blob is known
+INCOMING_DIR = os.path.join(BLOBS_DIR, "incoming")
+
+# "zstd" or "" (store everything as uploaded)
+BLOB_COMPRESSION = os.getenv("BLOB_COMPRESSION", "zstd")
+BLOB_ZSTD_LEVEL = int(os.getenv("BLOB_ZSTD_LEVEL", "3"))
+COMPRESSIBLE_EXTENSIONS = ("txt", "docx", "csv")
+# Compressed copies that save less than this fraction are not kept
+MIN_COMPRESSION_SAVING = 0.1
+
+# One lock per two-hex-digit prefix (the blob's directory)
+_hash_locks = [threading.Lock() for _ in range(256)]
+
+_stats = {
+    "stored": 0, "deduplicated": 0, "bytes_written": 0, "bytes_deduplicated": 0,
+    "compressed": 0, "bytes_saved_by_compression": 0, "released": 0, "deleted": 0,
+}
+
+
+@dataclass
+class Blob:
+    sha256: str
+    size: int
+    stored_size: int
+    compression: Optional[str] = None
+    created: bool = False           # this call wrote the file (False: an existing blob was referenced)
+
+
+def blob_path(sha256: str, compression: Optional[str] = None) -> str:
+    return os.path.join(BLOBS_DIR, sha256[:2], sha256 + (".zst" if compression == "zstd" else ""))
+
+
+def _hash_lock(sha256: str) -> threading.Lock:
+    """Held while a blob is stored or deleted."""
+    return _hash_locks[int(sha256[:2], 16)]
+
+
+def _compression_for(extension: str) -> Optional[str]:
+    if BLOB_COMPRESSION == "zstd" and ZSTD_SUPPORT and extension.lower().lstrip(".") in COMPRESSIBLE_EXTENSIONS:
+        return "zstd"
+    return None
+
+
+def _blob(record: dict, created: bool = False) -> Blob:
+    return Blob(record["sha256"], record["size"], record["stored_size"], record.get("compression"), created)
+
+
+def get(sha256: str) -> Optional[Blob]:
+    record = db.blobs.find_one({"sha256": sha256})
+    return _blob(record) if record else None
+
+
+def _add_ref(sha256: str) -> Optional[Blob]:
+    """Reference an existing blob; None if there is no blob with this hash."""
+    result = db.blobs.update_one({"sha256": sha256}, {"$inc": {"refcount": 1}, "$set": {"updated_at": datetime.utcnow()}})
+    if result.matched_count == 0:
+        return None
+    blob = get(sha256)
+    _stats["deduplicated"] += 1
+    _stats["bytes_deduplicated"] += blob.size
+    return blob
+
+
+def _record_new(sha256: str, size: int, stored_size: int, compression: Optional[str]) -> Blob:
+    """Record a blob whose file was just written, with one reference."""
+    now = datetime.utcnow()
+    db.blobs.update_one(
+        {"sha256": sha256},
+        {
+            "$inc": {"refcount": 1},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"size": size, "stored_size": stored_size, "compression": compression, "created_at": now},
+        },
+        upsert=True,
+    )
+    blob = get(sha256)
+    if blob.compression != compression:
+        # Another upload of the same content was recorded first, stored the other way
+        file_storage.remove_file(blob_path(sha256, compression))
+        return blob
+    _stats["stored"] += 1
+    _stats["bytes_written"] += stored_size
+    if compression:
+        _stats["compressed"] += 1
+        _stats["bytes_saved_by_compression"] += size - stored_size
+    blob.created = True
+    return blob
+
+
+def _compress(buffer: Union[bytes, memoryview]) -> Optional[bytes]:
+    compressed = zstandard.ZstdCompressor(level=BLOB_ZSTD_LEVEL).compress(buffer)
+    return compressed if len(compressed) <= len(buffer) * (1 - MIN_COMPRESSION_SAVING) else None
+
+
+def put_buffer(buffer: Union[bytes, memoryview], extension: str = "") -> Blob:
+    """Store an in-memory file (or reference the identical blob). Blocking."""
+    sha256 = hashlib.sha256(buffer).hexdigest()
+    with _hash_lock(sha256):
+        existing = _add_ref(sha256)
+        if existing:
+            return existing
+
+        compression = _compression_for(extension)
+        data = _compress(buffer) if compression else None
+        if data is None:
+            compression, data = None, buffer
+        with file_storage.atomic_write(blob_path(sha256, compression)) as f:
+            f.write(data)
+        return _record_new(sha256, len(buffer), len(data), compression)
+
+
+def put_stream(source: BinaryIO, extension: str = "", max_bytes: int = file_storage.MAX_UPLOAD_BYTES) -> Blob:
+    """
+    Store a file object chunk by chunk (or reference the identical blob).
+    Blocking. Raises ValueError if it is empty or larger than max_bytes.
+    """
+    incoming = file_storage.copy_to_file(source, os.path.join(INCOMING_DIR, uuid.uuid4().hex), max_bytes)
+    try:
+        with _hash_lock(incoming.sha256):
+            existing = _add_ref(incoming.sha256)
+            if existing:
+                return existing
+
+            compression = _compression_for(extension)
+            stored_size = incoming.size
+            if compression:
+                compressed_path = incoming.path + ".zst"
+                with open(incoming.path, "rb") as src, open(compressed_path, "wb") as dst:
+                    zstandard.ZstdCompressor(level=BLOB_ZSTD_LEVEL).copy_stream(src, dst)
+                stored_size = os.path.getsize(compressed_path)
+                if stored_size <= incoming.size * (1 - MIN_COMPRESSION_SAVING):
+                    os.replace(compressed_path, incoming.path)
+                else:
+                    os.remove(compressed_path)
+                    compression, stored_size = None, incoming.size
+            path = blob_path(incoming.sha256, compression)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(incoming.path, path)
+            return _record_new(incoming.sha256, incoming.size, stored_size, compression)
+    finally:
+        file_storage.remove_file(incoming.path)
+
+
+async def store_buffer(buffer: Union[bytes, memoryview], extension: str = "") -> Blob:
+    """put_buffer() without blocking the event loop."""
+    return await asyncio.to_thread(put_buffer, buffer, extension)
+
+
+async def store_upload(upload, extension: str = "", max_bytes: int = file_storage.MAX_UPLOAD_BYTES) -> Blob:
+    """Stream a FastAPI UploadFile into the store without blocking the event loop."""
+    return await asyncio.to_thread(put_stream, upload.file, extension, max_bytes)
+
+
+def release(sha256: Optional[str]):
+    """Drop one reference; the blob is deleted with its last reference."""
+    if not sha256:
+        return
+    result = db.blobs.update_one({"sha256": sha256}, {"$inc": {"refcount": -1}, "$set": {"updated_at": datetime.utcnow()}})
+    if result.matched_count == 0:
+        return
+    _stats["released"] += 1
+    with _hash_lock(sha256):
+        blob = get(sha256)
+        # Filtering on the count means a reference added since is never deleted from under it
+        if not blob or not db.blobs.delete_one({"sha256": sha256, "refcount": {"$lte": 0}}).deleted_count:
+            return
+        # A store in another process may have recorded the hash again since
+        if get(sha256) is None:
+            file_storage.remove_file(blob_path(sha256, blob.compression))
+        _stats["deleted"] += 1
+
+
+def iter_chunks(blob: Blob, chunk_size: int = file_storage.UPLOAD_CHUNK_BYTES) -> Iterator[bytes]:
+    """The blob's original bytes, chunk by chunk."""
+    with open(blob_path(blob.sha256, blob.compression), "rb") as f:
+        reader = zstandard.ZstdDecompressor().stream_reader(f) if blob.compression == "zstd" else f
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def read(sha256: str) -> bytes:
+    """The original bytes of a blob. Raises ValueError if it doesn't exist."""
+    blob = get(sha256)
+    if not blob or not os.path.exists(blob_path(sha256, blob.compression)):
+        raise ValueError("Stored file not found")
+    return b"".join(iter_chunks(blob))
+
+
+def stats() -> dict:
+    return {**_stats, "compression": BLOB_COMPRESSION if ZSTD_SUPPORT else "", "zstd_available": ZSTD_SUPPORT}
+
+
+metrics.register("blob_store", stats)
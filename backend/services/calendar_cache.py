@@ -0,0 +1,106 @@
+"""
+Calendar Month Cache
+
+Caches the serialized JSON payload of GET /api/v1/calendar/events per
+(family, year, month), so repeat reads from both parents' devices skip the
+event scan, pydantic serialization and holiday overlay.
+
+Every event mutation path must call invalidate_family(). Entries also expire
+after CALENDAR_CACHE_TTL_SECONDS, which bounds staleness when several worker
+processes each hold their own cache.
+
+A reader takes the family's generation() before it scans the events and
+passes it to put(). Each invalidation bumps the generation, so a payload
+built from a scan that raced a regeneration is discarded instead of being
+cached after the invalidation that should have removed it.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from services import metrics
+
+MAX_ENTRIES = int(os.getenv("CALENDAR_CACHE_MAX_ENTRIES", "5000"))
+TTL_SECONDS = float(os.getenv("CALENDAR_CACHE_TTL_SECONDS", "60"))
+
+CacheKey = Tuple[str, int, int]
+
+_entries: "OrderedDict[CacheKey, Tuple[float, bytes]]" = OrderedDict()
+_keys_by_family: Dict[str, Set[CacheKey]] = {}
+_generations: Dict[str, int] = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0, "stale_puts": 0}
+
+
+def _drop(key: CacheKey):
+    _entries.pop(key, None)
+    family_keys = _keys_by_family.get(key[0])
+    if family_keys is not None:
+        family_keys.discard(key)
+        if not family_keys:
+            del _keys_by_family[key[0]]
+
+
+def get(family_id: str, year: int, month: int) -> Optional[bytes]:
+    """Return the cached payload for a month, or None on a miss."""
+    key = (family_id, year, month)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > TTL_SECONDS:
+            if entry is not None:
+                _drop(key)
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[1]
+
+
+def generation(family_id: str) -> int:
+    """The family's current generation; take it before reading the events to cache."""
+    with _lock:
+        return _generations.get(family_id, 0)
+
+
+def put(family_id: str, year: int, month: int, payload: bytes, generation: int):
+    """
+    Store a month payload, evicting the least recently used entries past
+    MAX_ENTRIES. Dropped if the family was invalidated since `generation`.
+    """
+    key = (family_id, year, month)
+    with _lock:
+        if _generations.get(family_id, 0) != generation:
+            _stats["stale_puts"] += 1
+            return
+        _entries[key] = (time.monotonic(), payload)
+        _entries.move_to_end(key)
+        _keys_by_family.setdefault(family_id, set()).add(key)
+        while len(_entries) > MAX_ENTRIES:
+            oldest = next(iter(_entries))
+            _drop(oldest)
+            _stats["evictions"] += 1
+
+
+def invalidate_family(family_id: str):
+    """Drop every cached month for a family after one of its events changed."""
+    with _lock:
+        for key in list(_keys_by_family.get(family_id, ())):
+            _drop(key)
+        _generations[family_id] = _generations.get(family_id, 0) + 1
+        _stats["invalidations"] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "bytes": sum(len(payload) for _, payload in _entries.values()),
+            "hit_rate": metrics.hit_rate(_stats["hits"], _stats["misses"]),
+        }
+
+
+metrics.register("calendar_cache", stats)
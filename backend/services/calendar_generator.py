@@ -1,87 +1,280 @@
-from datetime import date, timedelta
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from bson import ObjectId
 from database import db
 from models import Event
+from services import calendar_cache, event_conflicts, metrics
 
-def generate_custody_events(family_id: str, custody_agreement: dict):
+# How far ahead custody days are materialized
+HORIZON_DAYS = 365
+INSERT_BATCH_SIZE = 100
+# Requests for the same family arriving within this window share one regeneration
+REGENERATION_DEBOUNCE_SECONDS = float(os.getenv("CUSTODY_REGENERATION_DEBOUNCE_SECONDS", "0.25"))
+
+# 2-2-3 Schedule:
+# Week 1: P1 (2 days), P2 (2 days), P1 (3 days)
+# Week 2: P2 (2 days), P1 (2 days), P2 (3 days)
+# Cycle length: 14 days
+# Pattern for 14 days: [P1, P1, P2, P2, P1, P1, P1, P2, P2, P1, P1, P2, P2, P2]
+PATTERN_2_2_3 = [1, 1, 2, 2, 1, 1, 1, 2, 2, 1, 1, 2, 2, 2]
+
+def find_family(family_id: str):
+    """Look up a family by its `id` field or by its database `_id`."""
+    family = db.families.find_one({"id": family_id})
+    if family:
+        return family
+    try:
+        return db.families.find_one({"_id": ObjectId(family_id)})
+    except Exception:
+        return db.families.find_one({"_id": family_id})
+
+
+def family_calendar_id(family: dict) -> str:
+    """The family id calendar events are stored under (matches routers.calendar)."""
+    return str(family.get("_id") or family.get("id"))
+
+
+def custody_schedule_kind(custody_agreement: dict) -> str:
+    """Return "2-2-3" or "week-on-week-off" (the default for unknown schedules)."""
+    schedule_type = (custody_agreement.get("custodySchedule") or "").lower()
+    if "2-2-3" in schedule_type or "2-2-3" in str(custody_agreement):
+        return "2-2-3"
+    return "week-on-week-off"
+
+
+def custody_parent_number(day: date, schedule_kind: str, reference_date: date) -> int:
+    """Return 1 or 2 for the parent who has custody on `day` in the base rotation."""
+    # Calculate days since reference date (Jan 1st) for consistent pattern
+    days_since_reference = (day - reference_date).days
+
+    if schedule_kind == "2-2-3":
+        return PATTERN_2_2_3[days_since_reference % len(PATTERN_2_2_3)]
+
+    # Default: Week-on/week-off (Alternating Weeks)
+    # Alternate weeks: even weeks = Parent 1, odd weeks = Parent 2
+    week_number = days_since_reference // 7
+    return 1 if week_number % 2 == 0 else 2
+
+
+def _write_custody_days(family: dict, schedule_kind: str, start_date: date, end_date: date, reference_date: date) -> int:
+    """Insert one custody event per day in [start_date, end_date], in batches."""
+    family_id = family_calendar_id(family)
+    parents = {1: family.get("parent1_email"), 2: family.get("parent2_email")}
+
+    batch: List[dict] = []
+    written = 0
+    current_date = start_date
+    while current_date <= end_date:
+        event = Event(
+            family_id=family_id,
+            title="Custody",
+            date=current_date.isoformat(),
+            type="custody",
+            parent=parents[custody_parent_number(current_date, schedule_kind, reference_date)]
+        )
+        batch.append(event.model_dump())
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.events.insert_many(batch)
+            written += len(batch)
+            batch = []
+        current_date += timedelta(days=1)
+
+    if batch:
+        db.events.insert_many(batch)
+        written += len(batch)
+    return written
+
+
+def _record_horizon(family: dict, through: date, reference_date: date, schedule_kind: str):
+    # The schedule is kept with the horizon: the events may come from an
+    # uploaded agreement that was never saved as the family's custodyAgreement
+    db.families.update_one(
+        {"_id": family["_id"]},
+        {"$set": {"custodyHorizon": {
+            "through": through.isoformat(),
+            "referenceDate": reference_date.isoformat(),
+            "schedule": schedule_kind,
+            "updatedAt": datetime.utcnow(),
+        }}}
+    )
+
+
+def _invalidate_calendar(family_id: str):
+    event_conflicts.invalidate_family(family_id)
+    calendar_cache.invalidate_family(family_id)
+
+
+def generate_custody_events(family_id: str, custody_agreement: dict) -> int:
     """
     Generates custody events based on a parsed custody agreement.
     Supports "2-2-3" and "Week-on/week-off" schedules.
+    Holidays are not written here; they are overlaid when the calendar is read.
+    The generated range and schedule are recorded as the family's horizon so
+    the rolling scheduler can extend it incrementally. Returns the number of days written.
+
+    Request handlers should call regenerate_custody_events instead, which
+    keeps concurrent regenerations for one family from interleaving.
     """
-    family = db.families.find_one({"id": family_id})
-    if not family:
-        return
+    family = find_family(family_id)
+    if family:
+        family_id = family_calendar_id(family)
+    try:
+        if not family or not family.get("parent1_email") or not family.get("parent2_email"):
+            return 0
+
+        # Clear existing custody events for this family
+        db.events.delete_many({"family_id": family_id, "type": "custody"})
+
+        # Use January 1st of current year as reference date for consistent pattern
+        today = date.today()
+        reference_date = date(today.year, 1, 1)
+
+        # Generate events from today to HORIZON_DAYS in the future
+        end_date = today + timedelta(days=HORIZON_DAYS)
+        schedule_kind = custody_schedule_kind(custody_agreement)
+        written = _write_custody_days(family, schedule_kind, today, end_date, reference_date)
+        _record_horizon(family, end_date, reference_date, schedule_kind)
+        return written
+    finally:
+        # Also when nothing was written: the agreement the cached months show has changed
+        _invalidate_calendar(family_id)
+
+
+def _current_horizon(family: dict) -> Optional[tuple]:
+    """
+    Return (through, reference_date, schedule_kind) for a family's
+    materialized custody days.
+
+    Families generated before horizons were recorded fall back to their latest
+    stored custody day and the reference year of their agreement upload;
+    horizons recorded without a schedule fall back to the saved agreement's.
+    """
+    custody_agreement = family.get("custodyAgreement") or {}
+    horizon = family.get("custodyHorizon")
+    if horizon and horizon.get("through"):
+        schedule_kind = horizon.get("schedule")
+        if not schedule_kind:
+            if not custody_agreement:
+                return None
+            schedule_kind = custody_schedule_kind(custody_agreement)
+        return date.fromisoformat(horizon["through"]), date.fromisoformat(horizon["referenceDate"]), schedule_kind
+
+    if not custody_agreement:
+        return None
+
+    latest = next(iter(db.events.find({"family_id": family_calendar_id(family), "type": "custody"}).sort("date", -1)), None)
+    if not latest:
+        return None
+    latest_value = latest.get("date")
+    through = latest_value.date() if isinstance(latest_value, datetime) else date.fromisoformat(str(latest_value)[:10])
+    upload_date = custody_agreement.get("uploadDate")
+    reference_year = upload_date.year if isinstance(upload_date, datetime) else through.year - 1
+    return through, date(reference_year, 1, 1), custody_schedule_kind(custody_agreement)
 
-    parent1_email = family.get("parent1_email")
-    parent2_email = family.get("parent2_email")
 
-    if not parent1_email or not parent2_email:
-        return
+def extend_custody_events(family_id: str, batch_days: int, horizon_days: int = HORIZON_DAYS) -> int:
+    """
+    Materialize up to `batch_days` more custody days after the family's horizon,
+    never beyond today + `horizon_days`. Returns the number of days written.
+
+    The days follow the schedule recorded with the horizon, i.e. the one
+    that generated the existing events.
+
+    The target range is cleared before inserting, so a batch interrupted by a
+    restart is simply redone on the next run.
+    """
+    family = find_family(family_id)
+    if not family or not family.get("parent1_email") or not family.get("parent2_email"):
+        return 0
 
-    # Clear existing custody events for this family
-    db.events.delete_many({"family_id": family_id, "type": "custody"})
+    current = _current_horizon(family)
+    if current is None:
+        return 0
+    through, reference_date, schedule_kind = current
 
-    # Use January 1st of current year as reference date for consistent pattern
     today = date.today()
-    reference_date = date(today.year, 1, 1)
-    
-    # Generate events from today to 365 days in the future
-    start_date = today
-    end_date = start_date + timedelta(days=365)
-    current_date = start_date
-    
-    schedule_type = custody_agreement.get("custodySchedule", "").lower()
-    
-    # Default to alternating weeks if not specified or unknown
-    if "2-2-3" in schedule_type or "2-2-3" in str(custody_agreement):
-        # 2-2-3 Schedule:
-        # Week 1: P1 (2 days), P2 (2 days), P1 (3 days)
-        # Week 2: P2 (2 days), P1 (2 days), P2 (3 days)
-        # Cycle length: 14 days
-        
-        # Pattern for 14 days: [P1, P1, P2, P2, P1, P1, P1, P2, P2, P1, P1, P2, P2, P2]
-        pattern = [
-            parent1_email, parent1_email, 
-            parent2_email, parent2_email, 
-            parent1_email, parent1_email, parent1_email,
-            parent2_email, parent2_email, 
-            parent1_email, parent1_email, 
-            parent2_email, parent2_email, parent2_email
-        ]
-        
-        cycle_length = 14
-        
-        while current_date <= end_date:
-            # Calculate days since reference date (Jan 1st) for consistent pattern
-            days_since_reference = (current_date - reference_date).days
-            day_index = days_since_reference % cycle_length
-            current_parent = pattern[day_index]
-            
-            event = Event(
-                family_id=family_id,
-                title="Custody",
-                date=current_date.isoformat(),
-                type="custody",
-                parent=current_parent
-            )
-            db.events.insert_one(event.model_dump())
-            current_date += timedelta(days=1)
-            
+    start_date = max(through + timedelta(days=1), today)
+    end_date = min(start_date + timedelta(days=batch_days - 1), today + timedelta(days=horizon_days))
+    if end_date < start_date:
+        return 0
+
+    calendar_id = family_calendar_id(family)
+    try:
+        db.events.delete_many({
+            "family_id": calendar_id,
+            "type": "custody",
+            "date": {
+                "$gte": datetime.combine(start_date, datetime.min.time()),
+                "$lte": datetime.combine(end_date, datetime.max.time()),
+            },
+        })
+        written = _write_custody_days(family, schedule_kind, start_date, end_date, reference_date)
+        _record_horizon(family, end_date, reference_date, schedule_kind)
+        return written
+    finally:
+        _invalidate_calendar(calendar_id)
+
+
+class _Flight:
+    """One pending regeneration that every overlapping request for a family joins."""
+
+    def __init__(self, family_id: str, custody_agreement: dict):
+        self.family_id = family_id
+        self.custody_agreement = custody_agreement
+        self.task: Optional[asyncio.Task] = None
+
+
+_pending_flights: Dict[str, _Flight] = {}
+_write_locks: Dict[str, asyncio.Lock] = {}
+_regeneration_stats = {"requests": 0, "runs": 0, "coalesced": 0}
+
+
+def custody_write_lock(calendar_id: str) -> asyncio.Lock:
+    """Per-family lock held while custody days are being rewritten or extended."""
+    lock = _write_locks.get(calendar_id)
+    if lock is None:
+        lock = _write_locks[calendar_id] = asyncio.Lock()
+    return lock
+
+
+async def _run_flight(key: str, flight: _Flight) -> int:
+    await asyncio.sleep(REGENERATION_DEBOUNCE_SECONDS)
+    async with custody_write_lock(key):
+        # From here on, new requests start the next flight instead of joining this one
+        _pending_flights.pop(key, None)
+        _regeneration_stats["runs"] += 1
+        return await asyncio.to_thread(generate_custody_events, flight.family_id, flight.custody_agreement)
+
+
+async def regenerate_custody_events(family_id: str, custody_agreement: dict) -> int:
+    """
+    Single-flight wrapper around generate_custody_events.
+
+    Requests for the same family that arrive before a regeneration starts
+    (within the debounce window, or while a previous run still holds the
+    family's write lock) share one run using the most recent agreement, and
+    all of them await its result. Runs for one family never overlap.
+    """
+    _regeneration_stats["requests"] += 1
+    family = find_family(family_id)
+    key = family_calendar_id(family) if family else family_id
+
+    flight = _pending_flights.get(key)
+    if flight is not None:
+        flight.custody_agreement = custody_agreement
+        _regeneration_stats["coalesced"] += 1
     else:
-        # Default: Week-on/week-off (Alternating Weeks)
-        # Use reference date for consistent pattern
-        while current_date <= end_date:
-            # Calculate which week we're in from reference date
-            days_since_reference = (current_date - reference_date).days
-            week_number = days_since_reference // 7
-            # Alternate weeks: even weeks = Parent 1, odd weeks = Parent 2
-            current_parent = parent1_email if week_number % 2 == 0 else parent2_email
-                
-            event = Event(
-                family_id=family_id,
-                title="Custody",
-                date=current_date.isoformat(),
-                type="custody",
-                parent=current_parent
-            )
-            db.events.insert_one(event.model_dump())
-            current_date += timedelta(days=1)
+        flight = _pending_flights[key] = _Flight(family_id, custody_agreement)
+        flight.task = asyncio.create_task(_run_flight(key, flight))
+
+    # Shielded so one caller disconnecting doesn't cancel the shared run
+    return await asyncio.shield(flight.task)
+
+
+def regeneration_stats() -> dict:
+    return {**_regeneration_stats, "pending": len(_pending_flights)}
+
+
+metrics.register("custody_regeneration", regeneration_stats)
@@ -0,0 +1,125 @@
+"""
+Rolling Custody Horizon Scheduler
+
+generate_custody_events materializes one year of custody days. This
+scheduler keeps that window rolling: during off-peak hours it tops up each
+family's recorded horizon (`custodyHorizon.through`) in small batches, one
+family at a time with a pause in between, so writes are spread out instead
+of landing as a spike.
+
+All progress lives on the family documents, so the scheduler is restart-safe:
+after a restart it simply continues from each family's stored horizon. It
+runs in-process; deploy it in one worker only (CUSTODY_SCHEDULER_ENABLED=false
+elsewhere) so two processes don't top up the same family.
+"""
+
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from database import db
+from services import metrics
+from services.calendar_generator import HORIZON_DAYS, custody_write_lock, extend_custody_events, family_calendar_id
+
+ENABLED = os.getenv("CUSTODY_SCHEDULER_ENABLED", "true").lower() == "true"
+# Top families up once fewer than this many days are materialized ahead
+TOP_UP_THRESHOLD_DAYS = int(os.getenv("CUSTODY_TOP_UP_THRESHOLD_DAYS", "335"))
+BATCH_DAYS = int(os.getenv("CUSTODY_TOP_UP_BATCH_DAYS", "31"))
+# Off-peak window in UTC hours, e.g. "2-5" means 02:00 to 04:59
+OFF_PEAK_HOURS = os.getenv("CUSTODY_SCHEDULER_OFF_PEAK_HOURS", "2-5")
+TICK_SECONDS = float(os.getenv("CUSTODY_SCHEDULER_TICK_SECONDS", "300"))
+FAMILY_SPACING_SECONDS = float(os.getenv("CUSTODY_SCHEDULER_FAMILY_SPACING_SECONDS", "1.0"))
+MAX_FAMILIES_PER_TICK = int(os.getenv("CUSTODY_SCHEDULER_MAX_FAMILIES_PER_TICK", "200"))
+
+_task: Optional[asyncio.Task] = None
+_stats = {"ticks": 0, "families_extended": 0, "days_written": 0, "errors": 0, "last_run_at": None}
+
+
+def _in_off_peak(now: datetime) -> bool:
+    start_hour, end_hour = (int(part) for part in OFF_PEAK_HOURS.split("-"))
+    if start_hour <= end_hour:
+        return start_hour <= now.hour < end_hour
+    return now.hour >= start_hour or now.hour < end_hour
+
+
+def _short_horizon_query(today: date) -> dict:
+    """Families with both parents whose custody horizon is running short."""
+    cutoff = (today + timedelta(days=TOP_UP_THRESHOLD_DAYS)).isoformat()
+    return {
+        "parent2_email": {"$ne": None},
+        "$or": [
+            # ISO dates compare correctly as strings. Calendars generated from an
+            # uploaded agreement have a horizon but no saved custodyAgreement
+            {"custodyHorizon.through": {"$lt": cutoff}},
+            # Generated before horizons were recorded; extend_custody_events works it out
+            {"custodyHorizon.through": None, "custodyAgreement": {"$ne": None}},
+        ],
+    }
+
+
+async def run_once(max_families: int = MAX_FAMILIES_PER_TICK) -> int:
+    """Extend the horizon of up to `max_families` families that are running short."""
+    today = date.today()
+    extended = 0
+    # Only the ids: extend_custody_events loads the family it works on
+    for family in list(db.families.find(_short_horizon_query(today), {"_id": 1, "id": 1})):
+        if extended >= max_families:
+            break
+
+        family_id = family.get("id") or str(family.get("_id"))
+        try:
+            async with custody_write_lock(family_calendar_id(family)):
+                written = await asyncio.to_thread(extend_custody_events, family_id, BATCH_DAYS, HORIZON_DAYS)
+        except Exception as e:
+            _stats["errors"] += 1
+            print(f"[ERROR] Custody horizon top-up for family {family_id}: {e}")
+            continue
+
+        if written:
+            extended += 1
+            _stats["families_extended"] += 1
+            _stats["days_written"] += written
+            await asyncio.sleep(FAMILY_SPACING_SECONDS)
+
+    _stats["ticks"] += 1
+    _stats["last_run_at"] = datetime.utcnow().isoformat()
+    return extended
+
+
+async def _loop():
+    while True:
+        try:
+            if _in_off_peak(datetime.utcnow()):
+                await run_once()
+        except Exception as e:
+            _stats["errors"] += 1
+            print(f"[ERROR] Custody scheduler tick: {e}")
+        await asyncio.sleep(TICK_SECONDS)
+
+
+def start():
+    """Start the background loop (called from the app's lifespan)."""
+    global _task
+    if not ENABLED or _task is not None:
+        return
+    _task = asyncio.create_task(_loop())
+
+
+async def stop():
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+
+
+def stats() -> dict:
+    return {**_stats, "enabled": ENABLED, "running": _task is not None}
+
+
+metrics.register("custody_scheduler", stats)
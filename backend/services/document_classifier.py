@@ -0,0 +1,59 @@
+"""
+Document Classification
+
+Batch uploads (an attorney's bundle of decree, exhibits, school and
+medical forms) don't say what each file is. classify_file() picks a
+document type from the "document-type" rules in pattern_rules.json,
+matched against the file name and the start of the file's text.
+
+Only the first CLASSIFY_PAGES pages of a PDF are read, in the extraction
+pool, off the event loop. That text is not cached: it isn't the whole
+document, and most files of a bundle are never parsed.
+
+A classification decides which folder a file lands in. Protecting it and
+parsing it as the family's agreement (which regenerates the calendar)
+take more: see is_confirmed().
+"""
+
+import os
+from typing import Tuple
+
+from services import extraction_pool, pattern_rules
+
+# Only the start of a document is matched; titles and captions are there
+CLASSIFY_CHARS = int(os.getenv("CLASSIFY_CHARS", "4000"))
+CLASSIFY_PAGES = int(os.getenv("CLASSIFY_PAGES", "2"))
+# Automatic classifications below this confidence don't protect a document
+# or start an agreement parse
+CLASSIFY_CONFIRM_CONFIDENCE = float(os.getenv("CLASSIFY_CONFIRM_CONFIDENCE", "0.9"))
+
+TEXT_EXTENSIONS = ("pdf", "doc", "docx", "txt")
+MEDIA_EXTENSIONS = ("jpg", "jpeg", "png", "gif", "webp", "heic", "mp4", "mov", "avi", "mkv")
+
+
+def classify_text(file_name: str, text: str) -> Tuple[str, float]:
+    """(document type, confidence) for a file name and the start of its text."""
+    rule_set = pattern_rules.get_rule_set("document-type")
+    sample = f"{file_name.replace('_', ' ').replace('-', ' ')}\n{text[:CLASSIFY_CHARS]}"
+    document_type = rule_set.apply(sample)["type"]
+    return document_type, rule_set.field_confidence(sample).get("type", 0.0)
+
+
+def is_confirmed(confidence: float) -> bool:
+    """Whether an automatic classification is sure enough to act on beyond filing."""
+    return confidence >= CLASSIFY_CONFIRM_CONFIDENCE
+
+
+async def classify_file(file_name: str, file_content: bytes) -> Tuple[str, float]:
+    """Classify an uploaded file; files whose text can't be read are classified by name."""
+    extension = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
+    if extension in MEDIA_EXTENSIONS:
+        return "memories", 1.0
+
+    text = ""
+    if extension in TEXT_EXTENSIONS:
+        try:
+            text = await extraction_pool.extract_leading_text(file_content, extension, CLASSIFY_PAGES)
+        except ValueError as e:
+            print(f"⚠️  Could not read {file_name} for classification: {e}")
+    return classify_text(file_name, text)
@@ -0,0 +1,97 @@
+"""
+Document Counts
+
+The folder sidebar shows how many documents each folder holds. Instead of
+loading every document of the family to count them, the counts are kept
+in the `document_counts` collection, one counter per family and key:
+
+    type:<document type>          default folders sum the types they show
+    category:<custom category>    custom folders
+
+Uploads and deletes adjust the counters (record_added / record_removed),
+so reading them costs one query over O(folders) small records.
+
+Families whose documents predate the counters are counted once, on first
+read, and marked with a READY_KEY record. A document uploaded between that
+count and the marker can be missed; rebuild() recounts a family.
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+
+from database import db
+from services import metrics
+
+READY_KEY = "__ready__"
+
+_stats = {"increments": 0, "decrements": 0, "backfills": 0}
+
+
+def _keys(document_type: Optional[str], custom_category: Optional[str]):
+    keys = [f"type:{document_type or 'other'}"]
+    if custom_category:
+        keys.append(f"category:{custom_category}")
+    return keys
+
+
+def _adjust(family_id: str, document_type: Optional[str], custom_category: Optional[str], delta: int):
+    now = datetime.utcnow()
+    for key in _keys(document_type, custom_category):
+        db.document_counts.update_one(
+            {"family_id": family_id, "key": key},
+            {"$inc": {"count": delta}, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+
+
+def record_added(family_id: str, document_type: Optional[str], custom_category: Optional[str] = None):
+    """Count a new document of the family."""
+    _adjust(family_id, document_type, custom_category, 1)
+    _stats["increments"] += 1
+
+
+def record_removed(family_id: str, document_type: Optional[str], custom_category: Optional[str] = None):
+    """Uncount a deleted document of the family."""
+    _adjust(family_id, document_type, custom_category, -1)
+    _stats["decrements"] += 1
+
+
+def rebuild(family_id: str) -> Dict[str, int]:
+    """Count the family's documents from scratch and store the counters."""
+    counts: Dict[str, int] = {}
+    for document in db.documents.find({"family_id": family_id}, {"type": 1, "custom_category": 1}):
+        for key in _keys(document.get("type"), document.get("custom_category")):
+            counts[key] = counts.get(key, 0) + 1
+
+    now = datetime.utcnow()
+    # Counters left over from before (e.g. a type with no documents now) go to zero
+    for record in list(db.document_counts.find({"family_id": family_id})):
+        if record["key"] != READY_KEY and record["key"] not in counts:
+            counts[record["key"]] = 0
+    for key, count in counts.items():
+        db.document_counts.update_one({"family_id": family_id, "key": key}, {"$set": {"count": count, "updated_at": now}}, upsert=True)
+    db.document_counts.update_one({"family_id": family_id, "key": READY_KEY}, {"$set": {"count": 0, "updated_at": now}}, upsert=True)
+    _stats["backfills"] += 1
+    return counts
+
+
+def get_counts(family_id: str) -> Dict[str, int]:
+    """All counters of a family, keyed as above; counted once if the family has none yet."""
+    records = list(db.document_counts.find({"family_id": family_id}))
+    if not any(record["key"] == READY_KEY for record in records):
+        return rebuild(family_id)
+    return {record["key"]: record["count"] for record in records if record["key"] != READY_KEY}
+
+
+def folder_count(counts: Dict[str, int], document_types=(), custom_category: Optional[str] = None) -> int:
+    """Documents in a default folder (by its types) or a custom folder (by its category)."""
+    if custom_category is not None:
+        return max(counts.get(f"category:{custom_category}", 0), 0)
+    return max(sum(counts.get(f"type:{document_type}", 0) for document_type in document_types), 0)
+
+
+def stats() -> dict:
+    return dict(_stats)
+
+
+metrics.register("document_counts", stats)
@@ -10,13 +10,18 @@ To use:
 3. Import and use: parser = DocumentParser(); result = await parser.parse_document(file_bytes, file_type)
 """
 
+import asyncio
 import base64
+import hashlib
 import io
 import json
 import os
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import re
 
+from services import agreement_sections, llm_client, metrics, pattern_rules
+
 # Optional imports - install as needed
 try:
     import pdfplumber
@@ -32,30 +37,241 @@ except ImportError:
     DOCX_SUPPORT = False
     print("⚠️  python-docx not installed. DOCX parsing will not work. Install with: pip install python-docx")
 
-try:
-    from openai import AsyncOpenAI
+if llm_client.OPENAI_SUPPORT:
     OPENAI_SUPPORT = True
-except ImportError:
+else:
     OPENAI_SUPPORT = False
     print("⚠️  openai not installed. AI parsing will not work. Install with: pip install openai")
 
+# Bump when extraction or parsing logic changes; cached results keyed on the
+# old version are then ignored (see services/parse_cache.py)
+EXTRACTOR_VERSION = "1"
+PARSER_VERSION = "2"
+
+# Stop reading a PDF once the custody-related sections have been captured.
+# Off by default: anything after the required sections is not parsed
+PDF_EARLY_EXIT = os.getenv("PDF_EARLY_EXIT", "false").lower() == "true"
+# Never read more than this many pages (0 = no limit)
+PDF_PAGE_BUDGET = int(os.getenv("PDF_PAGE_BUDGET", "0"))
+
+# Concurrent LLM requests per document when a long agreement is parsed in excerpts
+# (services/llm_client.py also caps requests across all documents)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# Fields merged across excerpts by confidence
+MERGED_FIELDS = (
+    "custodyArrangement", "custodySchedule", "holidaySchedule", "decisionMaking",
+    "expenseSplit", "childSupport", "startDate", "endDate",
+)
+
+
+def _parse_thresholds(value: str) -> Dict[str, float]:
+    thresholds = {}
+    for item in value.split(","):
+        if "=" in item:
+            field, threshold = item.split("=", 1)
+            thresholds[field.strip()] = float(threshold)
+    return thresholds
+
+
+# Tiered parsing: pattern rules answer first, and the LLM is asked only about
+# fields whose pattern confidence is below their threshold ("field=threshold,...";
+# fields not listed never trigger an LLM call). TIERED_PARSING=false always uses the LLM.
+TIERED_PARSING = os.getenv("TIERED_PARSING", "true").lower() == "true"
+TIER_THRESHOLDS = _parse_thresholds(os.getenv("PARSE_TIER_THRESHOLDS", "custodyArrangement=0.8,custodySchedule=0.8,decisionMaking=0.8"))
+# Sections worth sending to the LLM for each field
+FIELD_SECTION_TERMS = {
+    "custodyArrangement": ["physical custody", "parenting time", "custody"],
+    "custodySchedule": ["physical custody", "parenting time", "schedule", "2-2-3", "week"],
+    "holidaySchedule": ["holiday", "vacation"],
+    "decisionMaking": ["legal custody", "decision"],
+    "expenseSplit": ["expense", "child support"],
+    "childSupport": ["child support"],
+    "startDate": ["effective", "commence"],
+    "endDate": ["terminat", "emancipat"],
+}
+
+_tier_stats = {"parses": 0, "patterns_only": 0, "llm": 0, "llm_fallbacks": 0, "llm_fields": 0}
+_tier_latency = {"patterns": metrics.LatencyRecorder(), "llm": metrics.LatencyRecorder()}
+
+
+def tier_stats() -> dict:
+    return {
+        **_tier_stats,
+        "patterns_hit_rate": metrics.hit_rate(_tier_stats["patterns_only"], _tier_stats["llm"]),
+        "thresholds": TIER_THRESHOLDS,
+        "latency": {tier: recorder.summary() for tier, recorder in _tier_latency.items()},
+    }
+
+
+metrics.register("parse_tiers", tier_stats)
+
+# Schedule phrasings checked near the custody headings during normalization
+SCHEDULE_2_2_3 = r'2\s*-\s*2\s*-\s*3|two.*two.*three'
+SCHEDULE_WEEKLY = r'week.*on.*week.*off|alternat.*week'
+SCHEDULE_2_2_3_RE = re.compile(SCHEDULE_2_2_3)
+SCHEDULE_WEEKLY_RE = re.compile(SCHEDULE_WEEKLY)
+OPENAI_MODEL = "gpt-4o"  # or "gpt-4-turbo" for better JSON
+SYSTEM_MESSAGE = "You are a legal document parser specializing in custody agreements. Extract structured information and return ONLY valid JSON, no markdown formatting, no code blocks."
+
+
+def count_pdf_pages(file_content: bytes) -> int:
+    """Return the number of pages in a PDF."""
+    if not PDF_SUPPORT:
+        raise ValueError("PDF support not available. Install pdfplumber: pip install pdfplumber")
+    try:
+        with pdfplumber.open(io.BytesIO(file_content)) as pdf:
+            return len(pdf.pages)
+    except Exception as e:
+        raise ValueError(f"Error extracting text from PDF: {str(e)}")
+
+
+def iter_pdf_pages(file_content: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+    """
+    Yield the text of pages [start, end) of a PDF one page at a time ("" for
+    pages without text), so callers can stop reading as soon as they have
+    what they need.
+    """
+    if not PDF_SUPPORT:
+        raise ValueError("PDF support not available. Install pdfplumber: pip install pdfplumber")
+    try:
+        with pdfplumber.open(io.BytesIO(file_content)) as pdf:
+            for page in pdf.pages[start:end]:
+                text = page.extract_text() or ""
+                # Release the page's parsed layout before moving on
+                page.close()
+                yield text
+    except Exception as e:
+        raise ValueError(f"Error extracting text from PDF: {str(e)}")
+
+
+def extract_pdf_pages(file_content: bytes, start: int = 0, end: Optional[int] = None) -> List[str]:
+    """
+    Extract the text of pages [start, end) of a PDF, skipping empty pages.
+
+    Module-level so extraction workers can run it on a slice of the document.
+    """
+    return [text for text in iter_pdf_pages(file_content, start, end) if text]
+
+
+def extract_pdf_pages_until_captured(file_content: bytes, page_budget: int = 0) -> List[str]:
+    """
+    Stream pages until the required agreement sections have been read (see
+    agreement_sections.SectionCapture) or `page_budget` pages (0 = no limit),
+    skipping empty pages.
+    """
+    capture = agreement_sections.SectionCapture()
+    text_parts = []
+    for text in iter_pdf_pages(file_content, 0, page_budget or None):
+        if text:
+            text_parts.append(text)
+        if capture.feed(text):
+            print(f"Stopped PDF extraction after page {capture.pages}: required sections captured")
+            break
+    return text_parts
+
+
+def extraction_cache_version() -> str:
+    """Extractor version plus the settings that change which pages are read."""
+    if not PDF_EARLY_EXIT and not PDF_PAGE_BUDGET:
+        return EXTRACTOR_VERSION
+    required = ",".join(agreement_sections.REQUIRED_SECTIONS) if PDF_EARLY_EXIT else "-"
+    return f"{EXTRACTOR_VERSION}+{required}+{PDF_PAGE_BUDGET}"
+
+
+def has_text_layer(text_parts: List[str]) -> bool:
+    """False for scans: pdfplumber found (next to) no text on the pages read."""
+    return len("\n\n".join(text_parts).strip()) >= 50
+
+
+def ocr_pdf_pages(file_content: bytes, page_budget: int = 0) -> List[str]:
+    """
+    OCR a scanned PDF page by page in this process (see services/ocr.py),
+    stopping early like extract_pdf_pages_until_captured when PDF_EARLY_EXIT
+    is set. extraction_pool does the same across its workers.
+    """
+    from services import ocr
+
+    page_count = count_pdf_pages(file_content)
+    limits = [limit for limit in (page_budget, ocr.OCR_MAX_PAGES) if limit]
+    if limits:
+        page_count = min([page_count] + limits)
+    capture = agreement_sections.SectionCapture()
+    text_parts = []
+    for text, _ in ocr.ocr_pdf_pages(file_content, page_count):
+        if text.strip():
+            text_parts.append(text)
+        if PDF_EARLY_EXIT and capture.feed(text):
+            break
+    return text_parts
+
+
+def join_pdf_pages(text_parts: List[str]) -> str:
+    """Join extracted page texts, rejecting PDFs with no usable text layer."""
+    extracted = "\n\n".join(text_parts)
+    if not has_text_layer(text_parts):
+        raise ValueError("Could not extract sufficient text from PDF. File may be scanned/image-based.")
+    return extracted
+
+
+def merge_partial_results(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-excerpt parse results. Each field takes the value reported with
+    the highest confidence (its fieldConfidence entry, else the excerpt's
+    overall confidence); on ties the earlier excerpt wins. Extracted terms are
+    combined, keeping the most confident value per term.
+    """
+    merged: Dict[str, Any] = {}
+    field_confidence: Dict[str, float] = {}
+    for partial in partials:
+        overall = partial.get("confidence")
+        overall = overall if isinstance(overall, (int, float)) else 0.5
+        reported = partial.get("fieldConfidence") or {}
+        for field in MERGED_FIELDS:
+            value = partial.get(field)
+            if value in (None, "", {}):
+                continue
+            confidence = reported.get(field, overall)
+            if not isinstance(confidence, (int, float)):
+                confidence = overall
+            if field not in merged or confidence > field_confidence[field]:
+                merged[field] = value
+                field_confidence[field] = float(confidence)
+
+    terms: Dict[str, Dict[str, Any]] = {}
+    for partial in partials:
+        for term in partial.get("extractedTerms") or []:
+            if not isinstance(term, dict) or not term.get("term"):
+                continue
+            key = term["term"].lower()
+            if key not in terms or term.get("confidence", 0) > terms[key].get("confidence", 0):
+                terms[key] = term
+
+    merged["extractedTerms"] = list(terms.values())
+    merged["fieldConfidence"] = field_confidence
+    merged["confidence"] = round(sum(field_confidence.values()) / len(field_confidence), 2) if field_confidence else 0.0
+    return merged
+
 
 class DocumentParser:
     """Parse divorce/custody agreement documents using AI."""
     
-    def __init__(self, ai_provider: str = "openai", api_key: Optional[str] = None):
+    def __init__(self, ai_provider: str = "openai", api_key: Optional[str] = None, tiered: bool = TIERED_PARSING):
         """
         Initialize document parser.
         
         Args:
             ai_provider: "openai", "anthropic", "google", or "local"
             api_key: API key for the chosen provider (or use env vars)
+            tiered: try pattern rules first and ask the LLM only about weak fields
         """
         self.ai_provider = ai_provider
+        self.tiered = tiered
+        self.prompt_token_budget = agreement_sections.PROMPT_TOKEN_BUDGET
         self.api_key = api_key or os.getenv("OPENAI_API_KEY") or os.getenv("ANTHROPIC_API_KEY")
         
         if ai_provider == "openai" and OPENAI_SUPPORT and self.api_key:
-            self.openai_client = AsyncOpenAI(api_key=self.api_key)
+            # Shared across parsers: one connection pool and concurrency limit per process
+            self.openai_client = llm_client.LLMClient(self.api_key)
         else:
             self.openai_client = None
     
@@ -86,21 +302,17 @@ class DocumentParser:
             raise ValueError(f"Unsupported file type: {file_type}. Supported: pdf, docx, doc, txt")
     
     def _extract_from_pdf(self, file_content: bytes) -> str:
-        """Extract text from PDF using pdfplumber."""
-        text_parts = []
-        try:
-            with pdfplumber.open(io.BytesIO(file_content)) as pdf:
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        text_parts.append(text)
-        except Exception as e:
-            raise ValueError(f"Error extracting text from PDF: {str(e)}")
-        
-        extracted = "\n\n".join(text_parts)
-        if not extracted or len(extracted.strip()) < 50:
-            raise ValueError("Could not extract sufficient text from PDF. File may be scanned/image-based.")
-        return extracted
+        """Extract text from PDF using pdfplumber, falling back to OCR for scans."""
+        from services import ocr
+
+        if PDF_EARLY_EXIT:
+            text_parts = extract_pdf_pages_until_captured(file_content, PDF_PAGE_BUDGET)
+        else:
+            text_parts = extract_pdf_pages(file_content, 0, PDF_PAGE_BUDGET or None)
+        if not has_text_layer(text_parts) and ocr.available():
+            print("No text layer found; running OCR")
+            text_parts = ocr_pdf_pages(file_content, PDF_PAGE_BUDGET) or text_parts
+        return join_pdf_pages(text_parts)
     
     def _extract_from_docx(self, file_content: bytes) -> str:
         """Extract text from Word documents."""
@@ -124,19 +336,120 @@ class DocumentParser:
         Returns:
             Dictionary with parsed custody agreement information
         """
-        if self.ai_provider == "openai" and self.openai_client:
-            return await self._parse_with_openai(text)
-        else:
-            # Fallback to pattern matching if AI not available
-            return self._parse_with_patterns(text)
+        parsed, _ = await self._parse_text(text)
+        return parsed
+
+    def _uses_ai(self) -> bool:
+        return self.ai_provider == "openai" and self.openai_client is not None
+
+    def _parse_mode(self) -> str:
+        """Cache mode for this parser: the AI prompt fingerprint, or "patterns"."""
+        if not self._uses_ai():
+            return "patterns"
+        parts = [OPENAI_MODEL, SYSTEM_MESSAGE, self._build_parsing_prompt("")]
+        if self.tiered:
+            parts.append("tiered:" + json.dumps(TIER_THRESHOLDS, sort_keys=True))
+        if self.prompt_token_budget:
+            parts.append(f"compact:{self.prompt_token_budget}")
+        fingerprint = hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:12]
+        return f"ai-{fingerprint}"
+
+    async def _parse_text(self, text: str) -> Tuple[Dict[str, Any], str]:
+        """Parse text, returning (parsed data, mode that produced it)."""
+        if self._uses_ai():
+            try:
+                if self.tiered:
+                    return await self._parse_tiered(text), self._parse_mode()
+                return await self._parse_with_openai(text, fallback=False), self._parse_mode()
+            except Exception as e:
+                print(f"⚠️  OpenAI API error: {e}")
+        # Fallback to pattern matching if AI not available
+        return self._parse_with_patterns(text), "patterns"
     
-    def _build_parsing_prompt(self, text: str) -> str:
-        """Build a prompt for AI to extract custody agreement information."""
-        # Limit text to avoid token limits (keep first 8000 chars)
-        text_sample = text[:8000] if len(text) > 8000 else text
+    async def _parse_tiered(self, text: str) -> Dict[str, Any]:
+        """
+        Pattern rules first; the LLM is asked only about the fields whose
+        pattern confidence is below TIER_THRESHOLDS, and only sees the
+        sections relevant to those fields. Raises on LLM errors.
+        """
+        parsed, weak = self._rule_parse(text)
+        if weak:
+            parsed = await self._llm_refine(text, parsed, weak)
+        return self._normalize_parsed_data(parsed, text)
+
+    def _rule_parse(self, text: str) -> Tuple[Dict[str, Any], List[str]]:
+        """Tier 1: the pattern parse with per-field confidence, and the fields too weak to keep."""
+        _tier_stats["parses"] += 1
+        started = time.perf_counter()
+        rule_set = pattern_rules.get_rule_set("agreement")
+        parsed = rule_set.apply(text)
+        field_confidence = rule_set.field_confidence(text)
+        parsed["fieldConfidence"] = field_confidence
+        weak = [field for field, threshold in TIER_THRESHOLDS.items() if field_confidence.get(field, 0.0) < threshold]
+        _tier_latency["patterns"].record(time.perf_counter() - started)
+
+        if not weak:
+            _tier_stats["patterns_only"] += 1
+            parsed["parseTier"] = "patterns"
+            parsed["confidence"] = round(min((field_confidence[field] for field in TIER_THRESHOLDS), default=parsed["confidence"]), 2)
+        return parsed, weak
+
+    async def _llm_refine(self, text: str, parsed: Dict[str, Any], weak: List[str]) -> Dict[str, Any]:
+        """Tier 2: ask the LLM about the weak fields only, keeping the confident pattern fields."""
+        _tier_stats["llm"] += 1
+        _tier_stats["llm_fields"] += len(weak)
+        started = time.perf_counter()
+        terms = sorted({term for field in weak for term in FIELD_SECTION_TERMS.get(field, [field.lower()])})
+        excerpt = agreement_sections.index_for(text).relevant_text(terms)
+        try:
+            answer = await self._request_openai_json(self._build_parsing_prompt(excerpt, fields=weak))
+        except Exception:
+            _tier_stats["llm_fallbacks"] += 1
+            raise
+        finally:
+            _tier_latency["llm"].record(time.perf_counter() - started)
+
+        # The LLM only decides the weak fields; the confident pattern fields stand.
+        # Fields the rules left at their defaults count as confidence 0.
+        field_confidence = parsed["fieldConfidence"]
+        reported = answer.get("fieldConfidence")
+        reported = reported if isinstance(reported, dict) else {}
+        answer = {key: value for key, value in answer.items() if key in weak or key in ("extractedTerms", "confidence")}
+        answer["fieldConfidence"] = {field: value for field, value in reported.items() if field in weak}
+        baseline = dict(parsed, fieldConfidence={field: field_confidence.get(field, 0.0) for field in MERGED_FIELDS})
+        merged = merge_partial_results([baseline, answer])
+        parsed.update(merged)
+        parsed["fieldConfidence"] = {field: value for field, value in merged["fieldConfidence"].items() if value > 0}
+        parsed["confidence"] = round(min(merged["fieldConfidence"].get(field, 0.0) for field in TIER_THRESHOLDS), 2)
+        parsed["parseTier"] = "llm"
+        return parsed
+
+    def _build_parsing_prompt(self, text: str, part: Optional[Tuple[int, int]] = None, fields: Optional[List[str]] = None) -> str:
+        """
+        Build a prompt for AI to extract custody agreement information.
+        `part` is (n, total) when the text is one excerpt of a longer document;
+        `fields` limits the answer to the fields the pattern tier was unsure of.
+        """
+        # Limit text to avoid token limits: keep the most relevant paragraphs
+        # within the token budget (or the first 8000 chars with compaction off)
+        if self.prompt_token_budget:
+            text_sample = agreement_sections.compact_text(text, self.prompt_token_budget)
+        else:
+            text_sample = text[:8000] if len(text) > 8000 else text
+        part_note = ""
+        if part:
+            part_note = f"""
+This is excerpt {part[0]} of {part[1]} from a longer agreement. Only report what this excerpt states:
+use null for any field it does not cover, and give a low fieldConfidence for anything you had to infer.
+"""
+        if fields:
+            part_note += f"""
+The text below holds only the sections relevant to these fields: {", ".join(fields)}.
+Only these fields are needed; use null for every other field.
+"""
         
         return f"""Analyze the following divorce/custody agreement document and extract key information.
-
+{part_note}
 CRITICAL INSTRUCTIONS FOR CUSTODY SCHEDULE:
 1. Find the PRIMARY/MAIN custody schedule in sections titled "Physical Custody", "Parenting Time", "Custody Schedule", or "Schedule"
 2. Look for explicit schedule types like "2-2-3", "2-2-3 rotating", "week-on/week-off", "alternating weeks", etc.
@@ -174,53 +487,94 @@ Return ONLY a valid JSON object with this exact structure (no markdown, no code
     ],
     "startDate": "YYYY-MM-DD" or null,
     "endDate": "YYYY-MM-DD" or null,
+    "fieldConfidence": {{
+        "custodySchedule": 0.9
+    }},
     "confidence": 0.85
 }}
 
+fieldConfidence holds a 0-1 confidence for each field above that you filled in.
+
 Document text:
 {text_sample}
 """
     
-    async def _parse_with_openai(self, text: str) -> Dict[str, Any]:
-        """Parse using OpenAI GPT-4."""
+    async def _request_openai_json(self, prompt: str) -> Dict[str, Any]:
+        """Send one parsing prompt and return the decoded JSON reply."""
+        content = await self.openai_client.complete(
+            model=OPENAI_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": SYSTEM_MESSAGE
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.1  # Lower temperature for more consistent parsing
+        )
+        
+        # Remove any markdown code blocks if present
+        content = re.sub(r'```json\n?', '', content)
+        content = re.sub(r'```\n?', '', content)
+        content = content.strip()
+        
+        return json.loads(content)
+
+    async def _parse_chunks(self, chunks: List[str]) -> Dict[str, Any]:
+        """Parse each excerpt concurrently (at most LLM_MAX_CONCURRENCY at once) and merge the results."""
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+        async def parse_chunk(index: int, chunk: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._request_openai_json(self._build_parsing_prompt(chunk, part=(index + 1, len(chunks))))
+
+        results = await asyncio.gather(*(parse_chunk(i, chunk) for i, chunk in enumerate(chunks)), return_exceptions=True)
+        partials = [result for result in results if isinstance(result, dict)]
+        if not partials:
+            # Every excerpt failed; surface the first error to the caller's fallback
+            raise next(result for result in results if isinstance(result, BaseException))
+        if len(partials) < len(chunks):
+            print(f"⚠️  {len(chunks) - len(partials)} of {len(chunks)} agreement excerpts failed to parse")
+
+        merged = merge_partial_results(partials)
+        merged["sectionsParsed"] = len(partials)
+        return merged
+
+    async def _request_ai_parse(self, text: str) -> Dict[str, Any]:
+        """The raw LLM parse of the whole document: one prompt, or its relevant excerpts concurrently."""
+        chunks = agreement_sections.index_for(text).chunks()
+        if len(chunks) == 1:
+            return await self._request_openai_json(self._build_parsing_prompt(text))
+        return await self._parse_chunks(chunks)
+
+    async def _parse_with_openai(self, text: str, fallback: bool = True) -> Dict[str, Any]:
+        """
+        Parse using OpenAI GPT-4. Documents longer than one prompt are split
+        into their relevant sections and parsed concurrently.
+        With fallback=False, errors are raised instead of falling back to patterns.
+        """
         if not self.openai_client:
             raise ValueError("OpenAI client not initialized. Check API key.")
         
-        prompt = self._build_parsing_prompt(text)
-        
         try:
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4o",  # or "gpt-4-turbo" for better JSON
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a legal document parser specializing in custody agreements. Extract structured information and return ONLY valid JSON, no markdown formatting, no code blocks."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.1  # Lower temperature for more consistent parsing
-            )
-            
-            content = response.choices[0].message.content
-            # Remove any markdown code blocks if present
-            content = re.sub(r'```json\n?', '', content)
-            content = re.sub(r'```\n?', '', content)
-            content = content.strip()
-            
-            parsed = json.loads(content)
+            parsed = await self._request_ai_parse(text)
             # Normalize the custody schedule to ensure correct format
             parsed = self._normalize_parsed_data(parsed, text)
             return parsed
             
         except json.JSONDecodeError as e:
             print(f"⚠️  Failed to parse AI response as JSON: {e}")
+            if not fallback:
+                raise
             # Fallback to pattern matching
             return self._parse_with_patterns(text)
         except Exception as e:
+            if not fallback:
+                raise
             print(f"⚠️  OpenAI API error: {e}")
             # Fallback to pattern matching
             return self._parse_with_patterns(text)
@@ -230,8 +584,8 @@ Document text:
         Normalize parsed data to ensure consistent format, especially for custody schedule.
         This fixes cases where AI might return variations or get confused by alternative schedules.
         """
-        text_lower = original_text.lower()
-        custody_schedule = parsed.get("custodySchedule", "").lower()
+        index = agreement_sections.index_for(original_text)
+        custody_schedule = (parsed.get("custodySchedule") or "").lower()
         
         print("\n" + "="*70)
         print("🔍 NORMALIZING PARSED DATA")
@@ -240,25 +594,21 @@ Document text:
         
         # Priority 1: Check if original text explicitly mentions 2-2-3 in main custody sections
         # Look for 2-2-3 in sections about Physical Custody, Parenting Time, or Schedule
+        # (the text after each heading's first occurrence, from the shared index)
         custody_sections = []
-        for section in ["physical custody", "parenting time", "custody schedule", "schedule", "article iii", "article iv"]:
-            if section in text_lower:
-                # Find the section and get text around it (next 500 chars)
-                idx = text_lower.find(section)
-                if idx >= 0:
-                    section_text = text_lower[idx:idx+500]
-                    custody_sections.append(section_text)
-                    print(f"Found section '{section}' at position {idx}")
+        for section, idx, section_text in index.custody_windows():
+            custody_sections.append(section_text)
+            print(f"Found section '{section}' at position {idx}")
         
         # Check if 2-2-3 is mentioned in main custody sections
         has_2_2_3_in_main = any(
-            re.search(r'2\s*-\s*2\s*-\s*3|two.*two.*three', section) 
+            SCHEDULE_2_2_3_RE.search(section)
             for section in custody_sections
         )
         
         # Check if week-on/week-off is mentioned in main custody sections
         has_weekly_in_main = any(
-            re.search(r'week.*on.*week.*off|alternat.*week', section) 
+            SCHEDULE_WEEKLY_RE.search(section)
             for section in custody_sections
         ) and not has_2_2_3_in_main  # Only if 2-2-3 is NOT in main sections
         
@@ -294,73 +644,16 @@ Document text:
         """
         Fallback pattern matching parser (basic implementation).
         Used when AI is not available or fails.
+        The rules are the "agreement" set in services/pattern_rules.json.
         """
-        text_lower = text.lower()
-        parsed_data = {
-            "parsed": True,
-            "confidence": 0.6,  # Lower confidence for pattern matching
-            "extractedTerms": [],
-            "custodyArrangement": "custom",
-            "custodySchedule": None,
-            "holidaySchedule": None,
-            "decisionMaking": "joint",
-            "expenseSplit": {"ratio": "50-50", "parent1": 50, "parent2": 50},
-            "childSupport": {"amount": 0, "payer": "none", "frequency": "none"},
-            "startDate": None,
-            "endDate": None
-        }
-        
-        # Check for custody split patterns
-        if re.search(r'50\s*[/-]\s*50|equal\s+time|fifty\s+fifty', text_lower):
-            parsed_data["custodyArrangement"] = "50-50"
-            parsed_data["extractedTerms"].append({
-                "term": "Custody Split",
-                "value": "50/50 Equal Time",
-                "confidence": 0.9
-            })
-            parsed_data["expenseSplit"] = {"ratio": "50-50", "parent1": 50, "parent2": 50}
-        elif re.search(r'primary.*secondary|primary\s+custody', text_lower):
-            parsed_data["custodyArrangement"] = "primary-secondary"
-            parsed_data["extractedTerms"].append({
-                "term": "Custody Split",
-                "value": "Primary/Secondary",
-                "confidence": 0.8
-            })
-            parsed_data["expenseSplit"] = {"ratio": "60-40", "parent1": 60, "parent2": 40}
-        
-        # Check for decision-making terms
-        if re.search(r'joint\s+legal\s+custody', text_lower):
-            parsed_data["decisionMaking"] = "joint"
-            parsed_data["extractedTerms"].append({
-                "term": "Legal Custody",
-                "value": "Joint Legal Custody",
-                "confidence": 0.95
-            })
-        elif re.search(r'sole\s+legal\s+custody', text_lower):
-            parsed_data["decisionMaking"] = "sole"
-        
-        # Check for holiday scheduling
-        if re.search(r'alternat.*holiday|holiday.*alternat', text_lower):
-            parsed_data["holidaySchedule"] = "Alternating holidays"
-            parsed_data["extractedTerms"].append({
-                "term": "Holiday Schedule",
-                "value": "Alternating Holidays",
-                "confidence": 0.85
-            })
-        
-        # Check for custody schedule patterns
-        # IMPORTANT: Check 2-2-3 FIRST, before week-on/week-off, because
-        # 2-2-3 descriptions often contain "alternates" which would incorrectly match week-on/week-off
-        if re.search(r'2\s*-\s*2\s*-\s*3|two.*two.*three', text_lower):
-            parsed_data["custodySchedule"] = "2-2-3 schedule"
-        elif re.search(r'week.*on.*week.*off|alternat.*week', text_lower):
-            parsed_data["custodySchedule"] = "Week-on/week-off"
-        
-        return parsed_data
+        return pattern_rules.get_rule_set("agreement").apply(text)
     
     async def parse_document(self, file_content: bytes, file_type: str) -> Dict[str, Any]:
         """
         Complete parsing pipeline: extract text and parse with AI.
+        Runs the stages of services/parsing_pipeline (without persisting);
+        extracted text and parse results are cached by file hash, so a
+        re-upload of the same file skips both steps.
         
         Args:
             file_content: Raw file bytes
@@ -369,11 +662,8 @@ Document text:
         Returns:
             Parsed custody agreement data
         """
-        # Step 1: Extract text
-        extracted_text = self.extract_text_from_file(file_content, file_type)
-        
-        # Step 2: Parse with AI (or fallback to patterns)
-        parsed_data = await self.parse_with_ai(extracted_text)
-        
-        return parsed_data
+        from services import parsing_pipeline
+
+        run = await parsing_pipeline.pipeline.run(self, file_type, file_content=file_content)
+        return run.parsed
 
@@ -0,0 +1,211 @@
+"""
+Event Conflict Index
+
+Keeps a per-family interval index of calendar event spans in memory so
+create/update requests can be checked for overlapping or contradictory
+events without scanning the whole month.
+
+Each family's events are stored as a sorted array of (start, event_id) pairs.
+Because no span is longer than MAX_SPAN, every event overlapping [start, end)
+starts inside [start - MAX_SPAN, end), so a lookup is two bisects plus the
+overlapping events themselves: O(log n + k).
+
+The index is built lazily from the database on first use, updated in place
+on single-event writes, and dropped (to be rebuilt on next use) after bulk
+writes such as custody generation or change-request approval.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import db
+
+ALL_DAY = timedelta(days=1)
+DEFAULT_EVENT_DURATION = timedelta(hours=1)
+MAX_SPAN = ALL_DAY
+
+# Rebuild an index from the database after this many seconds, so writes made by
+# other worker processes are eventually picked up.
+INDEX_TTL_SECONDS = float(os.getenv("EVENT_INDEX_TTL_SECONDS", "300"))
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    """Coerce a stored event date (datetime, date or ISO string) to a naive UTC datetime."""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def event_span(event_doc: dict) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Return the [start, end) span an event occupies.
+
+    Custody events and events at midnight cover the whole day; timed events
+    default to one hour.
+    """
+    start = _to_datetime(event_doc.get("date"))
+    if start is None:
+        return None
+
+    is_all_day = event_doc.get("type") == "custody" or start.time() == datetime.min.time()
+    if is_all_day:
+        day_start = datetime(start.year, start.month, start.day)
+        return day_start, day_start + ALL_DAY
+    return start, start + DEFAULT_EVENT_DURATION
+
+
+def _event_id(event_doc: dict) -> str:
+    return event_doc.get("id") or str(event_doc.get("_id"))
+
+
+class _FamilyIndex:
+    """Sorted array of event spans for one family."""
+
+    def __init__(self):
+        self.starts: List[Tuple[datetime, str]] = []
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.built_at = time.monotonic()
+
+    def add(self, event_doc: dict):
+        span = event_span(event_doc)
+        if span is None:
+            return
+        event_id = _event_id(event_doc)
+        self.remove(event_id)
+        start, end = span
+        self.entries[event_id] = {
+            "id": event_id,
+            "start": start,
+            "end": end,
+            "type": event_doc.get("type"),
+            "title": event_doc.get("title"),
+            "parent": event_doc.get("parent"),
+        }
+        insort(self.starts, (start, event_id))
+
+    def remove(self, event_id: str):
+        entry = self.entries.pop(event_id, None)
+        if not entry:
+            return
+        position = bisect_left(self.starts, (entry["start"], event_id))
+        if position < len(self.starts) and self.starts[position] == (entry["start"], event_id):
+            del self.starts[position]
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        low = bisect_left(self.starts, (start - MAX_SPAN, ""))
+        high = bisect_left(self.starts, (end, ""))
+        overlaps = []
+        for _, event_id in self.starts[low:high]:
+            entry = self.entries[event_id]
+            if entry["end"] > start:
+                overlaps.append(entry)
+        return overlaps
+
+
+_indexes: Dict[str, _FamilyIndex] = {}
+_lock = threading.Lock()
+
+
+def _get_index(family_id: str) -> _FamilyIndex:
+    """Return the warm index for a family, building it from the database if needed."""
+    index = _indexes.get(family_id)
+    if index is not None and time.monotonic() - index.built_at < INDEX_TTL_SECONDS:
+        return index
+
+    index = _FamilyIndex()
+    for event_doc in db.events.find({"family_id": family_id}):
+        index.add(event_doc)
+    _indexes[family_id] = index
+    return index
+
+
+def _classify(candidate: dict, existing: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """Return (kind, message) if the two events conflict, otherwise None."""
+    candidate_custody = candidate.get("type") == "custody"
+    existing_custody = existing["type"] == "custody"
+    candidate_parent = candidate.get("parent")
+    existing_parent = existing["parent"]
+
+    if candidate_custody and existing_custody:
+        if candidate_parent and existing_parent and candidate_parent != existing_parent:
+            return "custody-overlap", f"{existing_parent} already has custody on this day."
+        return "duplicate-custody", "A custody event already exists for this day."
+
+    if candidate_custody or existing_custody:
+        custody_parent = candidate_parent if candidate_custody else existing_parent
+        event_parent = existing_parent if candidate_custody else candidate_parent
+        if custody_parent and event_parent and custody_parent != event_parent:
+            return "other-parent-time", f"This falls during {custody_parent}'s custody time."
+        return None
+
+    return "overlap", f"Overlaps with '{existing['title']}'."
+
+
+def find_conflicts(family_id: str, event_doc: dict) -> List[Dict[str, Any]]:
+    """
+    Find events in the family's calendar that conflict with event_doc.
+
+    The event itself (matched by id, or by _id for legacy events) is
+    ignored, so this can be used for both new and updated events.
+    """
+    span = event_span(event_doc)
+    if span is None:
+        return []
+
+    own_id = _event_id(event_doc) if event_doc.get("id") or event_doc.get("_id") else None
+    conflicts = []
+    with _lock:
+        overlaps = _get_index(family_id).overlapping(*span)
+
+    for existing in overlaps:
+        if own_id and existing["id"] == own_id:
+            continue
+        classified = _classify(event_doc, existing)
+        if not classified:
+            continue
+        kind, message = classified
+        conflicts.append({
+            "kind": kind,
+            "event_id": existing["id"],
+            "title": existing["title"],
+            "date": existing["start"],
+            "parent": existing["parent"],
+            "message": message,
+        })
+    return conflicts
+
+
+def record_event(family_id: str, event_doc: dict):
+    """Add or replace an event in the family's index after it was written."""
+    with _lock:
+        _get_index(family_id).add(event_doc)
+
+
+def remove_event(family_id: str, event_id: str):
+    """Drop an event from the family's index after it was deleted."""
+    with _lock:
+        index = _indexes.get(family_id)
+        if index is not None:
+            index.remove(event_id)
+
+
+def invalidate_family(family_id: str):
+    """Forget a family's index after a bulk write; it is rebuilt on next use."""
+    with _lock:
+        _indexes.pop(family_id, None)
@@ -0,0 +1,348 @@
+"""
+Document Text Extraction Pool
+
+pdfplumber is CPU-bound and can take seconds on a long decree, which would
+block the event loop if it ran inside the upload handlers. Extraction runs
+in a dedicated process pool instead: a PDF's pages are split into ranges
+and extracted by several workers in parallel. With PDF_EARLY_EXIT (off by
+default) ranges are extracted in waves, in page order, until the custody
+sections have been read; PDF_PAGE_BUDGET caps the pages read either way.
+Scanned PDFs with no text layer are then OCR'd (services/ocr.py), one page
+per task, under their own time limit (OCR_TIMEOUT_SECONDS). OCR workers read
+the PDF from a temporary file rather than being sent its bytes per page, and
+a page that fails to OCR is logged and skipped: a document whose OCR fails
+falls back to the text already extracted.
+
+Each worker caps its own address space (EXTRACTION_MEMORY_LIMIT_MB), so a
+pathological PDF fails with a MemoryError in the worker instead of taking
+the API process down, and every job has a timeout. When a worker dies or a
+job times out, the pool is torn down and recreated on the next job.
+
+EXTRACTION_WORKERS=0 disables the pool and extracts in a thread instead.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple, Union
+
+from services import file_storage, metrics
+
+WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "60"))
+MEMORY_LIMIT_MB = int(os.getenv("EXTRACTION_MEMORY_LIMIT_MB", "1024"))
+PAGES_PER_TASK = int(os.getenv("EXTRACTION_PAGES_PER_TASK", "8"))
+# "spawn" keeps workers from inheriting the API process's sockets and threads
+START_METHOD = os.getenv("EXTRACTION_START_METHOD", "spawn")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_latency = metrics.LatencyRecorder()
+_stats = {
+    "jobs": 0, "tasks": 0, "pages": 0, "early_exits": 0, "failures": 0, "timeouts": 0, "pool_restarts": 0,
+    "ocr_jobs": 0, "ocr_pages": 0, "ocr_cache_hits": 0, "ocr_failures": 0,
+}
+
+
+def _init_worker(memory_limit_mb: int):
+    """Runs once in each worker process: apply the memory ceiling."""
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        # Not available on this platform, or the hard limit is already lower
+        print(f"⚠️  Could not apply extraction memory limit: {e}")
+
+
+def _worker_count_pages(file_content: bytes) -> int:
+    from services.document_parser import count_pdf_pages
+    return count_pdf_pages(file_content)
+
+
+def _worker_extract_pages(file_content: bytes, start: int, end: int) -> List[str]:
+    from services.document_parser import extract_pdf_pages
+    return extract_pdf_pages(file_content, start, end)
+
+
+def _worker_ocr_page(pdf_path: str, page_number: int) -> Tuple[str, bool]:
+    from services.ocr import ocr_page
+    return ocr_page(pdf_path, page_number)
+
+
+def _worker_extract_text(file_content: bytes, file_type: str) -> str:
+    from services.document_parser import DocumentParser
+    return DocumentParser().extract_text_from_file(file_content, file_type)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=WORKERS,
+                mp_context=multiprocessing.get_context(START_METHOD),
+                initializer=_init_worker,
+                initargs=(MEMORY_LIMIT_MB,),
+            )
+        return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    """Kill the workers of a broken or stuck pool; the next job starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return  # Another job already replaced it
+        _pool = None
+        _stats["pool_restarts"] += 1
+    # A timed-out task keeps its worker busy, so terminate rather than wait for it
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        if process.is_alive():
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _submit(pool: ProcessPoolExecutor, fn, *args):
+    _stats["tasks"] += 1
+    return await asyncio.wrap_future(pool.submit(fn, *args))
+
+
+def _page_ranges(page_count: int, per_task: int) -> List[tuple]:
+    return [(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)]
+
+
+async def _extract_pdf(pool: ProcessPoolExecutor, file_content: bytes) -> Tuple[List[str], int]:
+    """Text of the pages read, and the number of pages considered."""
+    from services.document_parser import PDF_EARLY_EXIT, PDF_PAGE_BUDGET
+
+    page_count = await _submit(pool, _worker_count_pages, file_content)
+    if PDF_PAGE_BUDGET:
+        page_count = min(page_count, PDF_PAGE_BUDGET)
+
+    if PDF_EARLY_EXIT:
+        parts = await _extract_pdf_until_captured(pool, file_content, page_count)
+    else:
+        # Enough ranges to keep every worker busy, but no fewer than PAGES_PER_TASK pages each
+        ranges = _page_ranges(page_count, max(PAGES_PER_TASK, -(-page_count // max(WORKERS, 1))))
+        results = await asyncio.gather(*(
+            _submit(pool, _worker_extract_pages, file_content, start, end) for start, end in ranges
+        ))
+        parts = [text for chunk in results for text in chunk]
+        _stats["pages"] += page_count
+    return parts, page_count
+
+
+async def _ocr_pdf(pool: ProcessPoolExecutor, file_content: bytes, page_count: int) -> List[str]:
+    """
+    OCR a scanned PDF one page per task. With PDF_EARLY_EXIT, pages go out in
+    waves of one per worker and stop once the required sections are captured.
+
+    The PDF is written to a temporary file once and the workers render pages
+    from it, so each task pickles a path instead of the whole document. Pages
+    whose OCR fails are left out; a broken pool is raised to the caller.
+    """
+    from services import ocr
+    from services.agreement_sections import SectionCapture
+    from services.document_parser import PDF_EARLY_EXIT
+
+    if ocr.OCR_MAX_PAGES:
+        page_count = min(page_count, ocr.OCR_MAX_PAGES)
+    capture = SectionCapture()
+    parts: List[str] = []
+    wave_size = max(WORKERS, 1) if PDF_EARLY_EXIT else max(page_count, 1)
+    fd, pdf_path = tempfile.mkstemp(prefix="ocr-", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(file_content)
+        for wave_start in range(0, page_count, wave_size):
+            wave = range(wave_start, min(wave_start + wave_size, page_count))
+            results = await asyncio.gather(
+                *(_submit(pool, _worker_ocr_page, pdf_path, number) for number in wave),
+                return_exceptions=True,
+            )
+            for number, result in zip(wave, results):
+                if isinstance(result, BrokenProcessPool):
+                    raise result
+                if isinstance(result, Exception):
+                    # A Tesseract or pdfium error on one page; the others still count
+                    _stats["ocr_failures"] += 1
+                    print(f"[ERROR] OCR failed on page {number + 1}: {result}")
+                    continue
+                text, cached = result
+                _stats["ocr_pages"] += 1
+                _stats["ocr_cache_hits"] += cached
+                if text.strip():
+                    parts.append(text)
+                capture.feed(text)
+            if PDF_EARLY_EXIT and capture.complete:
+                if wave[-1] + 1 < page_count:
+                    _stats["early_exits"] += 1
+                break
+    finally:
+        file_storage.remove_file(pdf_path)
+    return parts
+
+
+async def _extract_pdf_until_captured(pool: ProcessPoolExecutor, file_content: bytes, page_count: int) -> List[str]:
+    """
+    Extract PAGES_PER_TASK-page ranges in waves of one range per worker, in
+    document order, and stop after the wave in which the required sections
+    have been captured.
+    """
+    from services.agreement_sections import SectionCapture
+
+    capture = SectionCapture()
+    ranges = _page_ranges(page_count, PAGES_PER_TASK)
+    parts: List[str] = []
+    wave_size = max(WORKERS, 1)
+    for wave_start in range(0, len(ranges), wave_size):
+        wave = ranges[wave_start:wave_start + wave_size]
+        results = await asyncio.gather(*(
+            _submit(pool, _worker_extract_pages, file_content, start, end) for start, end in wave
+        ))
+        _stats["pages"] += wave[-1][1] - wave[0][0]
+        # Pages after the capture point in this wave were extracted anyway; keep them
+        for chunk in results:
+            for text in chunk:
+                parts.append(text)
+                capture.feed(text)
+        if capture.complete:
+            if wave[-1][1] < page_count:
+                _stats["early_exits"] += 1
+            break
+    return parts
+
+
+async def extract_text(file_content: Union[bytes, memoryview], file_type: str) -> str:
+    """
+    Extract text from a document without blocking the event loop.
+
+    Raises ValueError with a user-facing message on unsupported files,
+    extraction errors, timeouts and worker crashes, like
+    DocumentParser.extract_text_from_file.
+    """
+    file_type = file_type.lower().replace('.', '')
+    if file_type == "txt":
+        # Nothing to parse; not worth a round trip to a worker
+        return str(file_content, 'utf-8', errors='ignore')
+    # Worker arguments are pickled, which a memoryview can't be
+    file_content = file_storage.as_bytes(file_content)
+
+    _stats["jobs"] += 1
+    started = time.perf_counter()
+
+    if WORKERS <= 0:
+        from services.document_parser import DocumentParser
+        try:
+            return await asyncio.to_thread(DocumentParser().extract_text_from_file, file_content, file_type)
+        finally:
+            _latency.record(time.perf_counter() - started)
+
+    from services import ocr
+    from services.document_parser import has_text_layer, join_pdf_pages
+
+    pool = _get_pool()
+    timeout = TIMEOUT_SECONDS
+    try:
+        if file_type != "pdf":
+            return await asyncio.wait_for(_submit(pool, _worker_extract_text, file_content, file_type), timeout=timeout)
+        parts, page_count = await asyncio.wait_for(_extract_pdf(pool, file_content), timeout=timeout)
+        if not has_text_layer(parts) and ocr.available():
+            # A scan: read the page images instead, under the OCR time limit
+            _stats["ocr_jobs"] += 1
+            timeout = ocr.OCR_TIMEOUT_SECONDS
+            try:
+                ocr_parts = await asyncio.wait_for(_ocr_pdf(pool, file_content, page_count), timeout=timeout)
+            except BrokenProcessPool as e:
+                # A worker crashed rendering a page: keep the text layer rather than fail the upload
+                _stats["ocr_failures"] += 1
+                _reset_pool(pool)
+                print(f"[ERROR] OCR failed: {e}")
+                ocr_parts = []
+            parts = ocr_parts or parts
+        return join_pdf_pages(parts)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        _reset_pool(pool)
+        raise ValueError(f"Document text extraction timed out after {timeout:g} seconds")
+    except BrokenProcessPool:
+        _stats["failures"] += 1
+        _reset_pool(pool)
+        raise ValueError("Document text extraction failed: the file could not be processed")
+    except MemoryError:
+        _stats["failures"] += 1
+        raise ValueError(f"Document text extraction failed: the file exceeded the {MEMORY_LIMIT_MB} MB memory limit")
+    except ValueError:
+        _stats["failures"] += 1
+        raise
+    finally:
+        _latency.record(time.perf_counter() - started)
+
+
+async def extract_leading_text(file_content: Union[bytes, memoryview], file_type: str, pages: int) -> str:
+    """
+    Text of the first `pages` pages of a PDF (other formats whole), for
+    callers that only look at a document's title and caption. Scans aren't
+    OCR'd: their text comes back empty. Raises ValueError like extract_text.
+    """
+    file_type = file_type.lower().replace('.', '')
+    if file_type != "pdf":
+        return await extract_text(file_content, file_type)
+    file_content = file_storage.as_bytes(file_content)
+
+    from services.document_parser import extract_pdf_pages
+
+    _stats["jobs"] += 1
+    started = time.perf_counter()
+    if WORKERS <= 0:
+        try:
+            return "\n\n".join(await asyncio.to_thread(extract_pdf_pages, file_content, 0, pages))
+        finally:
+            _latency.record(time.perf_counter() - started)
+
+    pool = _get_pool()
+    try:
+        parts = await asyncio.wait_for(_submit(pool, _worker_extract_pages, file_content, 0, pages), timeout=TIMEOUT_SECONDS)
+        return "\n\n".join(parts)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        _reset_pool(pool)
+        raise ValueError(f"Document text extraction timed out after {TIMEOUT_SECONDS:g} seconds")
+    except BrokenProcessPool:
+        _stats["failures"] += 1
+        _reset_pool(pool)
+        raise ValueError("Document text extraction failed: the file could not be processed")
+    except MemoryError:
+        _stats["failures"] += 1
+        raise ValueError(f"Document text extraction failed: the file exceeded the {MEMORY_LIMIT_MB} MB memory limit")
+    finally:
+        _latency.record(time.perf_counter() - started)
+
+
+def shutdown():
+    """Stop the worker processes (called from the app's lifespan)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "workers": WORKERS,
+        "pool_running": _pool is not None,
+        "latency": _latency.summary(),
+    }
+
+
+metrics.register("extraction_pool", stats)
@@ -0,0 +1,151 @@
+"""
+Upload Storage
+
+The JSON upload endpoints carry files as base64 strings, so a request holds
+the body, the pydantic string and the decoded bytes in memory at once. The
+multipart endpoints use this module instead: each file part is copied to
+its final location in UPLOAD_CHUNK_BYTES chunks while its size and SHA-256
+are computed, so a large video costs one chunk of memory, not three copies
+of the file. (Starlette keeps parts up to 1 MB in memory and spools larger
+ones to a temporary file while the request is read.)
+
+The JSON endpoints decode their base64 string once, with decode_base64().
+The resulting memoryview is what gets sized, hashed, written and parsed;
+none of those steps copies it or decodes the string again.
+
+Files are written to a temporary name in the target directory and renamed
+into place once complete, so a failed or oversized upload never leaves a
+partial file under its real name.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, Union
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOCUMENTS_DIR = os.path.join(BACKEND_DIR, "documents")
+RECEIPTS_DIR = os.path.join(BACKEND_DIR, "receipts")
+CONTRACTS_DIR = os.path.join(BACKEND_DIR, "contracts")
+
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Largest file accepted by the multipart endpoints (0 = no limit)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+
+
+@dataclass
+class StoredFile:
+    path: str
+    size: int
+    sha256: str
+
+
+def _too_large(max_bytes: int) -> ValueError:
+    return ValueError(f"File is too large: the limit is {max_bytes // (1024 * 1024)} MB")
+
+
+@contextmanager
+def atomic_write(path: str):
+    """A file opened under a temporary name, renamed to `path` if the block succeeds."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def copy_to_file(source: BinaryIO, path: str, max_bytes: int = MAX_UPLOAD_BYTES) -> StoredFile:
+    """
+    Copy a file object to `path` chunk by chunk, hashing as it goes. Blocking.
+    Raises ValueError if the file is empty or larger than max_bytes.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with atomic_write(path) as f:
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise _too_large(max_bytes)
+            digest.update(chunk)
+            f.write(chunk)
+        if size == 0:
+            raise ValueError("File is empty")
+    return StoredFile(path, size, digest.hexdigest())
+
+
+def decode_base64(encoded: str, max_bytes: int = MAX_UPLOAD_BYTES) -> memoryview:
+    """
+    Decode a base64 upload once. Raises ValueError if it isn't base64, or
+    the file is empty or larger than max_bytes.
+    """
+    # Four base64 characters carry three bytes; refuse oversized files before decoding
+    if max_bytes and len(encoded) // 4 * 3 > max_bytes + 2:
+        raise _too_large(max_bytes)
+    try:
+        content = base64.b64decode(encoded or "")
+    except binascii.Error:
+        raise ValueError("File content is not valid base64")
+    if not content:
+        raise ValueError("Uploaded file is empty")
+    if max_bytes and len(content) > max_bytes:
+        raise _too_large(max_bytes)
+    return memoryview(content)
+
+
+def write_buffer(buffer: Union[bytes, memoryview], path: str) -> StoredFile:
+    """Hash and write an in-memory file to `path`. Blocking."""
+    with atomic_write(path) as f:
+        f.write(buffer)
+    return StoredFile(path, len(buffer), hashlib.sha256(buffer).hexdigest())
+
+
+async def store_buffer(buffer: Union[bytes, memoryview], path: str) -> StoredFile:
+    """write_buffer() without blocking the event loop."""
+    return await asyncio.to_thread(write_buffer, buffer, path)
+
+
+def as_bytes(buffer: Union[bytes, memoryview]) -> bytes:
+    """
+    The bytes behind a buffer, for APIs that need bytes (pickling to a
+    worker process, pdf libraries). A view of a whole bytes object returns
+    that object; only a partial view is copied.
+    """
+    if isinstance(buffer, memoryview):
+        if isinstance(buffer.obj, bytes) and buffer.nbytes == len(buffer.obj):
+            return buffer.obj
+        return buffer.tobytes()
+    return buffer
+
+
+async def store_upload(upload, path: str, max_bytes: int = MAX_UPLOAD_BYTES) -> StoredFile:
+    """Stream a FastAPI UploadFile to `path` without blocking the event loop."""
+    return await asyncio.to_thread(copy_to_file, upload.file, path, max_bytes)
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def remove_file(path: str):
+    """Delete a stored file if it exists; failures are logged, not raised."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"⚠️  Could not remove {path}: {e}")
@@ -0,0 +1,240 @@
+"""
+Holiday Rules Engine
+
+Compiles the free-text `CustodyAgreement.holidaySchedule` into holiday rules
+(fixed dates, nth-weekday holidays, Easter, winter break) that alternate
+between parents by odd/even year, and expands them into per-year override
+tables mapping a date to the parent who has the children that day.
+
+The base custody rotation is still the only thing written to the database.
+Overrides are merged over it when a calendar range is read, and both the
+compiled rules and the yearly tables are cached, so a holiday-aware month
+costs one dictionary lookup per custody day.
+
+Supported phrasings:
+- Table rows such as "Thanksgiving (Thurs–Sun) Parent 1 Parent 2" under an
+  "Odd Years / Even Years" header
+- Clauses such as "Easter: Parent 1 in even years, Parent 2 in odd years"
+- "Winter Break ... First half: Parent 1 ... Second half: Parent 2", with the
+  halves swapping every year
+- A bare "alternating holidays" falls back to the standard holiday list,
+  alternated so each parent has half of the holidays in any given year
+
+A holiday whose clause doesn't say which parent has it is left out rather
+than guessed; the base rotation applies on that day. School breaks other
+than winter break (spring break, mid-winter break) follow each school's
+calendar and are not compiled.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+PARENT_KEYS = ("parent1", "parent2")
+
+# Winter break runs from Dec 20 through Jan 3 and is split at the end of Dec 26.
+WINTER_BREAK_START = (12, 20)
+WINTER_BREAK_DAYS = 15
+WINTER_BREAK_FIRST_HALF_DAYS = 7
+
+
+@dataclass(frozen=True)
+class HolidayRule:
+    """One holiday and who has it in even years (the other parent has odd years)."""
+    name: str
+    kind: str  # 'fixed', 'nth-weekday', 'easter', 'winter-break'
+    even_year_parent: str = "parent1"
+    month: int = 0
+    day: int = 0
+    weekday: int = 0  # Monday = 0
+    nth: int = 0  # 1-based; -1 means the last one in the month
+    offset: int = 0  # Days from the anchor date to the first covered day
+    length: int = 1  # Number of days covered
+
+
+# (name, pattern matched against the lowercased schedule, rule template)
+HOLIDAY_CATALOG: List[Tuple[str, str, HolidayRule]] = [
+    ("New Year's Day", r"new\s+year['’]?s?(?:\s+day)?", HolidayRule("New Year's Day", "fixed", month=1, day=1)),
+    ("Martin Luther King Jr. Day", r"martin\s+luther\s+king|mlk", HolidayRule("Martin Luther King Jr. Day", "nth-weekday", month=1, weekday=0, nth=3)),
+    ("Presidents' Day", r"president['’]?s['’]?\s+day", HolidayRule("Presidents' Day", "nth-weekday", month=2, weekday=0, nth=3)),
+    ("Easter", r"easter(?:\s+weekend)?", HolidayRule("Easter", "easter")),
+    ("Memorial Day", r"memorial\s+day", HolidayRule("Memorial Day", "nth-weekday", month=5, weekday=0, nth=-1)),
+    ("July 4th", r"july\s+4(?:th)?|fourth\s+of\s+july|independence\s+day", HolidayRule("July 4th", "fixed", month=7, day=4)),
+    ("Labor Day", r"labor\s+day", HolidayRule("Labor Day", "nth-weekday", month=9, weekday=0, nth=1)),
+    ("Halloween", r"halloween", HolidayRule("Halloween", "fixed", month=10, day=31)),
+    ("Thanksgiving", r"thanksgiving", HolidayRule("Thanksgiving", "nth-weekday", month=11, weekday=3, nth=4)),
+    ("Christmas Eve", r"christmas\s+eve", HolidayRule("Christmas Eve", "fixed", month=12, day=24)),
+    ("Christmas Day", r"christmas\s+day", HolidayRule("Christmas Day", "fixed", month=12, day=25)),
+    ("Christmas", r"christmas(?!\s+(?:eve|day|break))", HolidayRule("Christmas", "fixed", month=12, day=24, length=2)),
+    ("Winter Break", r"winter\s+break|christmas\s+break|holiday\s+break", HolidayRule("Winter Break", "winter-break")),
+]
+
+# Holidays used when the agreement only says "alternating holidays".
+DEFAULT_HOLIDAYS = [
+    "New Year's Day", "Easter", "Memorial Day", "July 4th",
+    "Labor Day", "Thanksgiving", "Christmas Eve", "Christmas Day",
+]
+
+_CATALOG_BY_NAME = {name: rule for name, _, rule in HOLIDAY_CATALOG}
+_HOLIDAY_PATTERN = re.compile("|".join(f"(?P<h{i}>{pattern})" for i, (_, pattern, _) in enumerate(HOLIDAY_CATALOG)))
+_TABLE_HEADER = re.compile(r"\b(odd|even)\s+years?\b[^\n]{0,40}?\b(odd|even)\b")
+_PARENT_IN_YEARS = re.compile(r"parent\s*([12])\s*(?:\w+\s+){0,2}?(even|odd)\s+years?|(even|odd)\s+years?\s*(?:\w+\s+){0,2}?parent\s*([12])")
+_PARENT_REF = re.compile(r"parent\s*([12])")
+_FIRST_HALF = re.compile(r"first\s+half\W+(?:\w+\W+){0,2}?parent\s*([12])")
+
+
+def _other(parent_key: str) -> str:
+    return "parent2" if parent_key == "parent1" else "parent1"
+
+
+def _even_year_parent(clause: str, odd_first: bool) -> Optional[str]:
+    """
+    Work out who has a holiday in even years from the text that follows its name.
+
+    The rest of the holiday's own line is checked first, so a table row is not
+    read through into an unrelated clause below it.
+    """
+    first_line = clause.split("\n", 1)[0]
+    if first_line.strip() and first_line != clause:
+        parent_key = _even_year_parent(first_line, odd_first)
+        if parent_key:
+            return parent_key
+
+    explicit = _PARENT_IN_YEARS.search(clause)
+    if explicit:
+        if explicit.group(1):
+            number, parity = explicit.group(1), explicit.group(2)
+        else:
+            parity, number = explicit.group(3), explicit.group(4)
+        parent_key = f"parent{number}"
+        return parent_key if parity == "even" else _other(parent_key)
+
+    columns = _PARENT_REF.findall(clause)
+    if len(columns) >= 2 and columns[0] != columns[1]:
+        even_column = columns[1] if odd_first else columns[0]
+        return f"parent{even_column}"
+    return None
+
+
+@lru_cache(maxsize=256)
+def compile_holiday_rules(holiday_schedule: Optional[str]) -> Tuple[HolidayRule, ...]:
+    """Compile a free-text holiday schedule into holiday rules."""
+    if not holiday_schedule:
+        return ()
+
+    text_lower = holiday_schedule.lower()
+    header = _TABLE_HEADER.search(text_lower)
+    odd_first = header is None or header.group(1) == "odd"
+
+    mentions = list(_HOLIDAY_PATTERN.finditer(text_lower))
+    rules: Dict[str, HolidayRule] = {}
+    for position, match in enumerate(mentions):
+        name = HOLIDAY_CATALOG[int(match.lastgroup[1:])][0]
+        if name in rules:
+            continue
+        clause_end = mentions[position + 1].start() if position + 1 < len(mentions) else len(text_lower)
+        clause = text_lower[match.end():clause_end]
+        template = _CATALOG_BY_NAME[name]
+
+        if template.kind == "winter-break":
+            first_half = _FIRST_HALF.search(clause)
+            parent_key = f"parent{first_half.group(1)}" if first_half else _even_year_parent(clause, odd_first)
+        else:
+            parent_key = _even_year_parent(clause, odd_first)
+        if parent_key is None:
+            continue
+
+        overrides = {"even_year_parent": parent_key}
+        if name == "Thanksgiving" and re.match(r"\s*\(?\s*thu\w*\s*[-–]\s*sun", clause):
+            overrides["length"] = 4
+        if name == "Easter" and "weekend" in match.group(0):
+            overrides.update(offset=-1, length=2)
+        rules[name] = HolidayRule(**{**template.__dict__, **overrides})
+
+    if not mentions and re.search(r"alternat", text_lower):
+        for position, name in enumerate(DEFAULT_HOLIDAYS):
+            template = _CATALOG_BY_NAME[name]
+            rules[name] = HolidayRule(**{**template.__dict__, "even_year_parent": PARENT_KEYS[position % 2]})
+
+    return tuple(rules.values())
+
+
+def _easter_sunday(year: int) -> date:
+    """Gregorian Easter (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, nth: int) -> date:
+    if nth > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (nth - 1))
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _rule_days(rule: HolidayRule, year: int) -> List[Tuple[date, str]]:
+    """Expand a rule into (day, parent_key) pairs for the occurrence anchored in `year`."""
+    parent_key = rule.even_year_parent if year % 2 == 0 else _other(rule.even_year_parent)
+
+    if rule.kind == "winter-break":
+        start = date(year, *WINTER_BREAK_START)
+        return [
+            (start + timedelta(days=i), parent_key if i < WINTER_BREAK_FIRST_HALF_DAYS else _other(parent_key))
+            for i in range(WINTER_BREAK_DAYS)
+        ]
+
+    if rule.kind == "fixed":
+        anchor = date(year, rule.month, rule.day)
+    elif rule.kind == "nth-weekday":
+        anchor = _nth_weekday(year, rule.month, rule.weekday, rule.nth)
+    elif rule.kind == "easter":
+        anchor = _easter_sunday(year)
+    else:
+        return []
+
+    start = anchor + timedelta(days=rule.offset)
+    return [(start + timedelta(days=i), parent_key) for i in range(rule.length)]
+
+
+@lru_cache(maxsize=1024)
+def holiday_overrides(rules: Tuple[HolidayRule, ...], year: int) -> Mapping[date, Tuple[str, str]]:
+    """
+    Precompute the override table for one calendar year.
+
+    Returns a read-only mapping of date -> (parent_key, holiday name). Breaks
+    are applied first so single-day holidays inside them (Christmas Eve/Day)
+    take precedence.
+    """
+    table: Dict[date, Tuple[str, str]] = {}
+    ordered = sorted(rules, key=lambda rule: rule.kind != "winter-break")
+    for rule in ordered:
+        # Winter break starting the previous December spills into this January
+        anchor_years = (year - 1, year) if rule.kind == "winter-break" else (year,)
+        for anchor_year in anchor_years:
+            for day, parent_key in _rule_days(rule, anchor_year):
+                if day.year == year:
+                    table[day] = (parent_key, rule.name)
+    return MappingProxyType(table)
+
+
+def overrides_for_family(family: dict, year: int) -> Mapping[date, Tuple[str, str]]:
+    """Return the holiday override table for a family's current agreement."""
+    agreement = family.get("custodyAgreement") or {}
+    rules = compile_holiday_rules(agreement.get("holidaySchedule"))
+    if not rules:
+        return MappingProxyType({})
+    return holiday_overrides(rules, year)
@@ -0,0 +1,181 @@
+"""
+Shared LLM Client
+
+One OpenAI client per API key for the whole process, instead of one per
+DocumentParser, so uploads reuse the client's keep-alive connection pool.
+On top of the client:
+
+- a global semaphore caps requests in flight across all uploads and jobs
+- 429 / 5xx / connection errors are retried with jittered exponential
+  backoff (honouring Retry-After), so a burst of uploads that hits a rate
+  limit spreads its retries out instead of retrying in lockstep
+- identical requests already in flight are coalesced: the second caller
+  awaits the first caller's response instead of sending its own
+
+The OpenAI SDK's built-in retries are turned off so only this module retries.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+from services import metrics
+
+try:
+    import openai
+    from openai import AsyncOpenAI
+    OPENAI_SUPPORT = True
+except ImportError:
+    OPENAI_SUPPORT = False
+
+# Requests in flight to the LLM provider across the whole process
+LLM_GLOBAL_CONCURRENCY = int(os.getenv("LLM_GLOBAL_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
+
+_stats = {
+    "requests": 0,      # calls to complete()
+    "sent": 0,          # HTTP attempts, including retries
+    "coalesced": 0,     # calls answered by an identical request already in flight
+    "retries": 0,
+    "failures": 0,
+}
+_latency = metrics.LatencyRecorder()
+
+
+class _LoopState:
+    """Clients, semaphore and in-flight requests for one event loop (asyncio objects can't cross loops)."""
+
+    def __init__(self):
+        self.clients: Dict[tuple, Any] = {}
+        self.semaphore = asyncio.Semaphore(LLM_GLOBAL_CONCURRENCY)
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.active = 0
+
+
+_loop_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    state = _loop_states.get(loop)
+    if state is None:
+        state = _loop_states[loop] = _LoopState()
+    return state
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After if it sent one."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_RETRY_MAX_SECONDS) + random.uniform(0, LLM_RETRY_BASE_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+class LLMClient:
+    """Chat completions through the shared client for one API key. Cheap to create."""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
+        if not OPENAI_SUPPORT:
+            raise ValueError("openai not installed. Install with: pip install openai")
+        self.api_key = api_key
+        # Read at call time so tests can point OPENAI_BASE_URL at a local stub
+        self.base_url = base_url
+
+    def _client(self, state: _LoopState):
+        base_url = self.base_url or os.getenv("OPENAI_BASE_URL") or None
+        key = (self.api_key, base_url)
+        client = state.clients.get(key)
+        if client is None:
+            client = state.clients[key] = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=base_url,
+                timeout=LLM_REQUEST_TIMEOUT_SECONDS,
+                max_retries=0,
+            )
+        return client
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], **params) -> str:
+        """Return the reply text of one chat completion, sharing identical in-flight requests."""
+        _stats["requests"] += 1
+        state = _state()
+        client = self._client(state)
+        key = hashlib.sha256(
+            json.dumps([self.api_key, str(client.base_url), model, messages, params], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+        shared = state.in_flight.get(key)
+        if shared is not None:
+            _stats["coalesced"] += 1
+            return await asyncio.shield(shared)
+
+        task = asyncio.ensure_future(self._send(client, state, model, messages, params))
+        state.in_flight[key] = task
+        task.add_done_callback(lambda _: state.in_flight.pop(key, None))
+        # Shielded so one caller giving up doesn't cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _send(self, client, state: _LoopState, model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                # Hold a slot only while a request is on the wire, not while backing off
+                async with state.semaphore:
+                    state.active += 1
+                    _stats["sent"] += 1
+                    try:
+                        response = await client.chat.completions.create(model=model, messages=messages, **params)
+                    finally:
+                        state.active -= 1
+                _latency.record(time.perf_counter() - started)
+                return response.choices[0].message.content
+            except Exception as e:
+                if attempt >= LLM_MAX_RETRIES or not _retryable(e):
+                    _stats["failures"] += 1
+                    raise
+                delay = _retry_delay(e, attempt)
+                attempt += 1
+                _stats["retries"] += 1
+                print(f"⚠️  LLM request failed ({e.__class__.__name__}), retry {attempt}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+
+async def close():
+    """Close the HTTP connection pools of the current event loop's clients."""
+    state = _loop_states.pop(asyncio.get_running_loop(), None)
+    if state is None:
+        return
+    for client in state.clients.values():
+        await client.close()
+
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "in_flight": sum(state.active for state in list(_loop_states.values())),
+        "max_concurrency": LLM_GLOBAL_CONCURRENCY,
+        "latency": _latency.summary(),
+    }
+
+
+metrics.register("llm_client", stats)
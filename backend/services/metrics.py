@@ -0,0 +1,61 @@
+"""
+In-process metrics
+
+Services register a snapshot function under a name; the admin metrics
+endpoint (GET /api/v1/admin/metrics) returns all snapshots in one payload.
+Values are per worker process and reset on restart.
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable
+
+
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, snapshot_fn: Callable[[], dict]):
+    """Expose a service's stats under `name` in the metrics snapshot."""
+    _providers[name] = snapshot_fn
+
+
+def snapshot() -> dict:
+    """Collect the current stats from every registered service."""
+    return {name: snapshot_fn() for name, snapshot_fn in _providers.items()}
+
+
+def hit_rate(hits: int, misses: int) -> float:
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
+
+
+def percentile(samples: Iterable[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LatencyRecorder:
+    """Keeps the most recent latency samples (in seconds) and summarizes them."""
+
+    def __init__(self, max_samples: int = 1000):
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+        return {
+            "count": self.count,
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        }
@@ -0,0 +1,141 @@
+"""
+OCR for Scanned Agreements
+
+Many court orders arrive as scans with no text layer, so pdfplumber finds
+nothing in them. This module renders a PDF page to an image with pypdfium2
+(installed with pdfplumber) and reads it with Tesseract through pytesseract.
+
+OCR is slow (about a second or more per page), so:
+- extraction_pool runs one page per task across its worker processes; the
+  workers open a temporary copy of the PDF instead of each being sent its bytes
+- results are cached on disk by a hash of the rendered page image, so the
+  same scan (or the same page inside another upload) is only read once
+
+Requires the tesseract binary plus: pip install pytesseract
+"""
+
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+
+try:
+    import pypdfium2
+    RENDER_SUPPORT = True
+except ImportError:
+    RENDER_SUPPORT = False
+
+try:
+    import pytesseract
+    OCR_SUPPORT = RENDER_SUPPORT
+except ImportError:
+    OCR_SUPPORT = False
+    print("⚠️  pytesseract not installed. Scanned PDFs will not be parsed. Install with: pip install pytesseract (and the tesseract binary)")
+
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+# Never OCR more than this many pages of one document (0 = no limit)
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "60"))
+# Wall-clock limit for the OCR stage of one document
+OCR_TIMEOUT_SECONDS = float(os.getenv("OCR_TIMEOUT_SECONDS", "180"))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bridge-ocr-cache"))
+# Bump when rendering or OCR settings change in a way that changes the text
+OCR_VERSION = "1"
+
+
+@lru_cache(maxsize=None)
+def _tesseract_installed() -> bool:
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except (pytesseract.TesseractNotFoundError, OSError):
+        print("⚠️  tesseract binary not found. Scanned PDFs will not be parsed.")
+        return False
+
+
+def available() -> bool:
+    """True when OCR is enabled and both pytesseract and the tesseract binary are installed."""
+    return OCR_ENABLED and OCR_SUPPORT and _tesseract_installed()
+
+
+def render_page(source: Union[bytes, str], page_number: int):
+    """Render one page (0-based) of a PDF, given as bytes or a file path, to a grayscale PIL image at OCR_DPI."""
+    if not RENDER_SUPPORT:
+        raise ValueError("PDF rendering not available. Install pypdfium2: pip install pypdfium2")
+    pdf = pypdfium2.PdfDocument(source)
+    try:
+        page = pdf[page_number]
+        try:
+            return page.render(scale=OCR_DPI / 72, grayscale=True).to_pil()
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+
+
+def page_key(image) -> str:
+    """Cache key for a rendered page: its pixels plus the OCR settings."""
+    digest = hashlib.sha256()
+    digest.update(f"{OCR_VERSION}:{OCR_LANG}:{image.mode}:{image.size}".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(OCR_CACHE_DIR, key[:2], f"{key}.txt")
+
+
+def get_cached(key: str) -> Optional[str]:
+    try:
+        with open(_cache_path(key), encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def put_cached(key: str, text: str):
+    path = _cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a concurrent reader never sees a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️  Could not cache OCR result: {e}")
+
+
+def ocr_page(source: Union[bytes, str], page_number: int) -> Tuple[str, bool]:
+    """
+    OCR one page (0-based) of a PDF given as bytes or a file path; returns
+    (text, served from cache). Module-level so extraction workers can run it
+    one page per task.
+    """
+    if not OCR_SUPPORT:
+        raise ValueError("OCR not available. Install pytesseract and the tesseract binary.")
+    image = render_page(source, page_number)
+    key = page_key(image)
+    cached = get_cached(key)
+    if cached is not None:
+        return cached, True
+    try:
+        text = pytesseract.image_to_string(image, lang=OCR_LANG)
+    except pytesseract.TesseractError as e:
+        raise ValueError(f"OCR failed on page {page_number + 1}: {e}")
+    put_cached(key, text)
+    return text, False
+
+
+def ocr_pdf_pages(file_content: bytes, page_count: int):
+    """
+    OCR pages one after another in this process; yields (page text, from
+    cache). A page that fails to OCR is logged and skipped, as in the pool.
+    """
+    for page_number in range(page_count):
+        try:
+            yield ocr_page(file_content, page_number)
+        except Exception as e:
+            print(f"[ERROR] OCR failed on page {page_number + 1}: {e}")
@@ -0,0 +1,107 @@
+"""
+Agreement Parse Cache
+
+The same agreement is often uploaded more than once (as the family contract,
+as a custody-agreement document, and again after small edits elsewhere in
+the app). Results are cached in the `parse_cache` collection, keyed by the
+SHA-256 of the file bytes:
+
+    text:<sha256>:<extractor version>            extracted text
+    parse:<sha256>:<parser version>:<mode>       normalized parse result
+
+The parse mode is "patterns" for the regex fallback, or "ai-<fingerprint>"
+where the fingerprint covers the model, system message and prompt template.
+Bumping a version constant in document_parser or editing the prompt changes
+the keys, so stale entries are simply never read again.
+"""
+
+import hashlib
+import os
+from copy import deepcopy
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from database import db
+from services import metrics
+
+ENABLED = os.getenv("PARSE_CACHE_ENABLED", "true").lower() == "true"
+# MongoDB documents are capped at 16 MB; don't try to cache text near that size
+MAX_TEXT_CHARS = int(os.getenv("PARSE_CACHE_MAX_TEXT_CHARS", str(4 * 1024 * 1024)))
+
+_stats = {"text_hits": 0, "text_misses": 0, "parse_hits": 0, "parse_misses": 0, "writes": 0, "errors": 0}
+
+
+def file_digest(file_content: bytes) -> str:
+    """SHA-256 hex digest of the raw file bytes."""
+    return hashlib.sha256(file_content).hexdigest()
+
+
+def _get(key: str) -> Optional[Dict[str, Any]]:
+    if not ENABLED:
+        return None
+    try:
+        return db.parse_cache.find_one({"_id": key})
+    except Exception as e:
+        _stats["errors"] += 1
+        print(f"[ERROR] Parse cache lookup failed: {e}")
+        return None
+
+
+def _put(key: str, fields: Dict[str, Any]):
+    if not ENABLED:
+        return
+    try:
+        db.parse_cache.update_one(
+            {"_id": key},
+            {"$set": {**fields, "createdAt": datetime.utcnow()}},
+            upsert=True
+        )
+        _stats["writes"] += 1
+    except Exception as e:
+        # A cache write failing must never fail the upload
+        _stats["errors"] += 1
+        print(f"[ERROR] Parse cache write failed: {e}")
+
+
+def get_text(digest: str, extractor_version: str) -> Optional[str]:
+    entry = _get(f"text:{digest}:{extractor_version}")
+    if entry is None:
+        _stats["text_misses"] += 1
+        return None
+    _stats["text_hits"] += 1
+    return entry["text"]
+
+
+def put_text(digest: str, extractor_version: str, text: str):
+    if len(text) > MAX_TEXT_CHARS:
+        return
+    _put(f"text:{digest}:{extractor_version}", {"kind": "text", "sha256": digest, "text": text})
+
+
+def get_parse(digest: str, parser_version: str, mode: str) -> Optional[Dict[str, Any]]:
+    entry = _get(f"parse:{digest}:{parser_version}:{mode}")
+    if entry is None:
+        _stats["parse_misses"] += 1
+        return None
+    _stats["parse_hits"] += 1
+    # Callers add fields to the result, so never hand out the stored dict
+    return deepcopy(entry["parsed"])
+
+
+def put_parse(digest: str, parser_version: str, mode: str, parsed: Dict[str, Any]):
+    _put(
+        f"parse:{digest}:{parser_version}:{mode}",
+        {"kind": "parse", "sha256": digest, "mode": mode, "parsed": deepcopy(parsed)}
+    )
+
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "enabled": ENABLED,
+        "text_hit_rate": metrics.hit_rate(_stats["text_hits"], _stats["text_misses"]),
+        "parse_hit_rate": metrics.hit_rate(_stats["parse_hits"], _stats["parse_misses"]),
+    }
+
+
+metrics.register("parse_cache", stats)
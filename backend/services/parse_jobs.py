@@ -0,0 +1,326 @@
+"""
+Background Parse Jobs
+
+Parsing an agreement (text extraction, the LLM call, regenerating custody
+events) can take longer than a proxy will hold a request open. Upload routes
+enqueue a job instead and return its id right away; clients poll
+GET /api/v1/documents/jobs/{id} or subscribe to /jobs/{id}/events.
+
+Jobs are persisted in the `parse_jobs` collection, so queued work survives a
+restart: start() re-queues anything left `queued`. A running job holds a
+lease (`lease_until`) that its worker renews every PARSE_JOB_LEASE_SECONDS / 3;
+only jobs whose lease has expired are taken back, at start and then every
+lease period, so several processes can share the collection without running
+a job twice while its worker is alive. Routers
+register a handler per job kind (register_handler); a handler gets the job
+document and returns a small result dict stored on the job.
+
+A handler raising ValueError marks the job failed right away (the input is
+bad and retrying won't help). Any other exception is retried with
+exponential backoff up to PARSE_JOB_MAX_ATTEMPTS times.
+"""
+
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from database import db
+from services import metrics
+
+WORKERS = int(os.getenv("PARSE_JOB_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("PARSE_JOB_MAX_ATTEMPTS", "3"))
+RETRY_BASE_SECONDS = float(os.getenv("PARSE_JOB_RETRY_BASE_SECONDS", "5"))
+# A running job whose worker hasn't renewed its lease for this long is run again
+LEASE_SECONDS = float(os.getenv("PARSE_JOB_LEASE_SECONDS", "60"))
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+JobHandler = Callable[[dict], Awaitable[Optional[dict]]]
+FailureHandler = Callable[[dict, str], None]
+
+_handlers: Dict[str, JobHandler] = {}
+_failure_handlers: Dict[str, FailureHandler] = {}
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+_recovery_task: Optional[asyncio.Task] = None
+# Identifies this process's workers on the jobs they hold
+_owner = str(uuid.uuid4())
+_retry_tasks: set = set()
+_subscribers: Dict[str, List[asyncio.Queue]] = {}
+_stats = {"enqueued": 0, "succeeded": 0, "failed": 0, "retries": 0, "requeued_on_start": 0, "leases_expired": 0}
+_wait_latency = metrics.LatencyRecorder()
+_run_latency = metrics.LatencyRecorder()
+_total_latency = metrics.LatencyRecorder()
+
+
+def register_handler(kind: str, handler: JobHandler, on_failure: Optional[FailureHandler] = None):
+    """
+    Register the coroutine that runs jobs of `kind`, and optionally a function
+    called with (job, error) once a job of that kind has failed for good.
+    """
+    _handlers[kind] = handler
+    if on_failure is not None:
+        _failure_handlers[kind] = on_failure
+
+
+def job_view(job: dict) -> dict:
+    """Client-facing representation of a job."""
+    def iso(value):
+        return value.isoformat() if isinstance(value, datetime) else value
+
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "documentId": job.get("document_id"),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "createdAt": iso(job.get("created_at")),
+        "startedAt": iso(job.get("started_at")),
+        "finishedAt": iso(job.get("finished_at")),
+    }
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    return db.parse_jobs.find_one({"id": job_id})
+
+
+def _publish(job_id: str):
+    listeners = _subscribers.get(job_id)
+    if not listeners:
+        return
+    job = get_job(job_id)
+    if job is None:
+        return
+    view = job_view(job)
+    for listener in listeners:
+        listener.put_nowait(view)
+
+
+def subscribe(job_id: str) -> asyncio.Queue:
+    """Return a queue that receives the job's view on every status change."""
+    listener: asyncio.Queue = asyncio.Queue()
+    _subscribers.setdefault(job_id, []).append(listener)
+    return listener
+
+
+def unsubscribe(job_id: str, listener: asyncio.Queue):
+    listeners = _subscribers.get(job_id, [])
+    if listener in listeners:
+        listeners.remove(listener)
+    if not listeners:
+        _subscribers.pop(job_id, None)
+
+
+def enqueue(kind: str, family_id: str, payload: dict, document_id: Optional[str] = None, created_by: Optional[str] = None) -> dict:
+    """Persist a new job and hand it to the workers. Returns the job document."""
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for parse job kind '{kind}'")
+
+    job = {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "status": "queued",
+        "family_id": family_id,
+        "document_id": document_id,
+        "created_by": created_by,
+        "payload": payload,
+        "attempts": 0,
+        "result": None,
+        "error": None,
+        "created_at": datetime.utcnow(),
+        "started_at": None,
+        "finished_at": None,
+    }
+    db.parse_jobs.insert_one(job)
+    _stats["enqueued"] += 1
+    if _queue is not None:
+        _queue.put_nowait(job["id"])
+    # Without running workers the job stays queued in the database and is
+    # picked up by start() on the next boot
+    return job
+
+
+def _lease_until() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)
+
+
+def _claim(job_id: str) -> Optional[dict]:
+    """Mark a queued job as running; returns None if another worker got it first."""
+    result = db.parse_jobs.update_one(
+        {"id": job_id, "status": "queued"},
+        {"$set": {"status": "running", "started_at": datetime.utcnow(), "lease_owner": _owner, "lease_until": _lease_until()}}
+    )
+    if result.matched_count == 0:
+        return None
+    return get_job(job_id)
+
+
+async def _renew_lease(job_id: str):
+    """Keep a running job's lease from expiring while its handler works."""
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        db.parse_jobs.update_one(
+            {"id": job_id, "status": "running", "lease_owner": _owner},
+            {"$set": {"lease_until": _lease_until()}}
+        )
+
+
+def _requeue_expired() -> List[str]:
+    """Take back running jobs whose worker stopped renewing their lease."""
+    now = datetime.utcnow()
+    expired = db.parse_jobs.find({
+        "status": "running",
+        # Jobs started before leases were recorded have none
+        "$or": [{"lease_until": {"$lt": now}}, {"lease_until": None}],
+    })
+    requeued = []
+    for job in list(expired):
+        # Matching the lease means a worker that renewed it meanwhile keeps the job
+        result = db.parse_jobs.update_one(
+            {"id": job["id"], "status": "running", "lease_until": job.get("lease_until")},
+            {"$set": {"status": "queued", "lease_owner": None, "lease_until": None}}
+        )
+        if result.modified_count:
+            requeued.append(job["id"])
+            _stats["leases_expired"] += 1
+    return requeued
+
+
+async def _retry_later(job_id: str, delay: float):
+    await asyncio.sleep(delay)
+    if _queue is not None:
+        _queue.put_nowait(job_id)
+
+
+def _finish(job: dict, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+    finished_at = datetime.utcnow()
+    db.parse_jobs.update_one(
+        {"id": job["id"]},
+        {"$set": {
+            "status": status,
+            "result": result,
+            "error": error,
+            "finished_at": finished_at,
+            "lease_owner": None,
+            "lease_until": None,
+            # The file can be large and is no longer needed
+            "payload.fileContent": None,
+        }}
+    )
+    _stats[status] += 1
+    _total_latency.record((finished_at - job["created_at"]).total_seconds())
+
+    on_failure = _failure_handlers.get(job["kind"])
+    if status == "failed" and on_failure is not None:
+        try:
+            on_failure(job, error)
+        except Exception as e:
+            print(f"[ERROR] Parse job {job['id']} failure handler: {e}")
+
+
+async def _run(job: dict):
+    attempts = job.get("attempts", 0) + 1
+    db.parse_jobs.update_one({"id": job["id"]}, {"$set": {"attempts": attempts}})
+    _wait_latency.record((job["started_at"] - job["created_at"]).total_seconds())
+
+    handler = _handlers.get(job["kind"])
+    started = time.perf_counter()
+    lease = asyncio.create_task(_renew_lease(job["id"]))
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for parse job kind '{job['kind']}'")
+        result = await handler(job)
+        _finish(job, "succeeded", result=result)
+    except ValueError as e:
+        _finish(job, "failed", error=str(e))
+    except Exception as e:
+        print(f"[ERROR] Parse job {job['id']} attempt {attempts}: {e}")
+        if attempts >= MAX_ATTEMPTS:
+            _finish(job, "failed", error=str(e))
+        else:
+            _stats["retries"] += 1
+            db.parse_jobs.update_one({"id": job["id"]}, {"$set": {"status": "queued", "error": str(e), "lease_owner": None, "lease_until": None}})
+            delay = RETRY_BASE_SECONDS * (2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+            task = asyncio.create_task(_retry_later(job["id"], delay))
+            _retry_tasks.add(task)
+            task.add_done_callback(_retry_tasks.discard)
+    finally:
+        lease.cancel()
+        _run_latency.record(time.perf_counter() - started)
+        _publish(job["id"])
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        try:
+            job = _claim(job_id)
+            if job is not None:
+                _publish(job_id)
+                await _run(job)
+        except Exception as e:
+            print(f"[ERROR] Parse job worker: {e}")
+        finally:
+            _queue.task_done()
+
+
+async def _recover_expired():
+    while True:
+        await asyncio.sleep(LEASE_SECONDS)
+        try:
+            for job_id in _requeue_expired():
+                _queue.put_nowait(job_id)
+        except Exception as e:
+            print(f"[ERROR] Parse job lease recovery: {e}")
+
+
+def start():
+    """Start the workers and re-queue unfinished jobs (called from the app's lifespan)."""
+    global _queue, _recovery_task
+    if _queue is not None:
+        return
+    _queue = asyncio.Queue()
+
+    # Jobs whose worker died (this process before a restart, or another one)
+    # have stopped renewing their lease; jobs still being worked on keep it
+    _requeue_expired()
+    for job in db.parse_jobs.find({"status": "queued"}).sort("created_at", 1):
+        _queue.put_nowait(job["id"])
+        _stats["requeued_on_start"] += 1
+
+    for _ in range(max(WORKERS, 1)):
+        _workers.append(asyncio.create_task(_worker()))
+    _recovery_task = asyncio.create_task(_recover_expired())
+
+
+async def stop():
+    global _queue, _recovery_task
+    tasks = _workers + list(_retry_tasks) + ([_recovery_task] if _recovery_task else [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _workers.clear()
+    _retry_tasks.clear()
+    _recovery_task = None
+    _queue = None
+
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "depth": _queue.qsize() if _queue is not None else 0,
+        "waiting_retry": len(_retry_tasks),
+        "workers": len(_workers),
+        "queue_wait": _wait_latency.summary(),
+        "run_time": _run_latency.summary(),
+        "total_time": _total_latency.summary(),
+    }
+
+
+metrics.register("parse_jobs", stats)
@@ -0,0 +1,308 @@
+"""
+Agreement Parsing Pipeline
+
+Every custody agreement takes the same route, whether it was uploaded to
+/api/v1/family/contract, stored as a custody-agreement document, or
+picked up by a background parse job:
+
+    decode -> extract -> segment -> rules -> llm -> normalize -> persist -> schedule
+
+Each stage is a small class with a `name` and an async `run(run)` that
+reads and updates the shared ParseRun, so a stage can be replaced or
+dropped by building a ParsingPipeline with a different stage list.
+
+For every run the pipeline records each stage's wall time, bytes in and
+out, and outcome (ok / cached / skipped / fallback / error). Totals per
+stage are in the "parsing_pipeline" metrics snapshot, together with the
+stage records of the most recent runs.
+"""
+
+import json
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from services import agreement_sections, file_storage, metrics
+
+# Stage records of this many recent runs are kept for the metrics snapshot
+PIPELINE_RECENT_RUNS = int(os.getenv("PIPELINE_RECENT_RUNS", "20"))
+
+OK, CACHED, SKIPPED, FALLBACK, ERROR = "ok", "cached", "skipped", "fallback", "error"
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    seconds: float
+    bytes_in: int
+    bytes_out: int
+    outcome: str
+    detail: str = ""
+
+
+@dataclass
+class ParseRun:
+    """State of one document passing through the pipeline."""
+    parser: Any
+    file_type: str
+    file_content: Optional[Union[bytes, memoryview]] = None
+    encoded_content: Optional[str] = None      # base64, as uploaded; decoded by the decode stage
+    family: Optional[dict] = None               # custody events are regenerated for this family
+    persist: Optional[Callable[["ParseRun"], Awaitable[None]]] = None
+    refresh: bool = False                       # parse again even if parse_cache has a result
+    digest: str = ""                            # SHA-256 of file_content; given when the caller already hashed it
+    parser_version: str = ""
+    mode: str = ""
+    cached: bool = False                        # the parse itself was served from parse_cache
+    text: str = ""
+    text_bytes: int = 0
+    index: Any = None
+    parsed: Optional[Dict[str, Any]] = None
+    weak: Optional[List[str]] = None            # fields left for the LLM; None = full LLM parse
+    schedule_data: Optional[Dict[str, Any]] = None
+    events_generated: bool = False
+    records: List[StageRecord] = field(default_factory=list)
+
+    def timings(self) -> List[dict]:
+        return [asdict(record) for record in self.records]
+
+
+def _json_bytes(value: Any) -> int:
+    return len(json.dumps(value, default=str).encode("utf-8")) if value is not None else 0
+
+
+class DecodeStage:
+    """Base64 upload -> file bytes."""
+    name = "decode"
+
+    async def run(self, run: ParseRun) -> Tuple[str, int, int]:
+        if run.file_content is not None:
+            return SKIPPED, len(run.file_content), len(run.file_content)
+        run.file_content = file_storage.decode_base64(run.encoded_content or "")
+        return OK, len(run.encoded_content), len(run.file_content)
+
+
+class ExtractStage:
+    """File bytes -> text, in the extraction pool. A cached parse of the same file ends the parse here."""
+    name = "extract"
+
+    async def run(self, run: ParseRun) -> Tuple[str, int, int]:
+        from services import extraction_pool, parse_cache
+        from services.document_parser import PARSER_VERSION, extraction_cache_version
+
+        if not run.digest:
+            run.digest = parse_cache.file_digest(run.file_content)
+        extractor_version = extraction_cache_version()
+        # A parse depends on which pages were extracted as well as on the parser
+        run.parser_version = f"{PARSER_VERSION}/{extractor_version}"
+        run.mode = run.parser._parse_mode()
+        cached = None if run.refresh else parse_cache.get_parse(run.digest, run.parser_version, run.mode)
+        if cached is not None:
+            run.parsed, run.cached = cached, True
+            return CACHED, len(run.file_content), _json_bytes(cached)
+
+        outcome = CACHED
+        text = parse_cache.get_text(run.digest, extractor_version)
+        if text is None:
+            outcome = OK
+            text = await extraction_pool.extract_text(run.file_content, run.file_type)
+            parse_cache.put_text(run.digest, extractor_version, text)
+        run.text = text
+        run.text_bytes = len(text.encode("utf-8"))
+        return outcome, len(run.file_content), run.text_bytes
+
+
+class SegmentStage:
+    """Text -> section index, shared with the rule and LLM stages."""
+    name = "segment"
+
+    async def run(self, run: ParseRun) -> Tuple[str, int, int]:
+        if run.cached:
+            return SKIPPED, 0, 0
+        run.index = agreement_sections.index_for(run.text)
+        sections = run.index.sections
+        return OK, run.text_bytes, sum(len(section.text) for section in sections)
+
+
+class RuleParseStage:
+    """Pattern rules; with tiered parsing, also decides which fields still need the LLM."""
+    name = "rules"
+
+    async def run(self, run: ParseRun) -> Tuple[str, int, int]:
+        if run.cached:
+            return SKIPPED, 0, 0
+        parser = run.parser
+        if not parser._uses_ai():
+            run.parsed, run.mode = parser._parse_with_patterns(run.text), "patterns"
+        elif parser.tiered:
+            run.parsed, run.weak = parser._rule_parse(run.text)
+        else:
+            return SKIPPED, 0, 0
+        return OK, run.text_bytes, _json_bytes(run.parsed)
+
+
+class LLMRefineStage:
+    """LLM parse of the weak fields (or of the whole document without tiering); patterns on failure."""
+    name = "llm"
+
+    async def run(self, run: ParseRun) -> Tuple[str, int, int]:
+        parser = run.parser
+        if run.cached or run.mode == "patterns" or (parser.tiered and not run.weak):
+            return SKIPPED, 0, 0
+        try:
+            if parser.tiered:
+                run.parsed = await parser._llm_refine(run.text, run.parsed, run.weak)
+            else:
+                run.parsed = await parser._request_ai_parse(run.text)
+        except Exception as e:
+            print(f"⚠️  OpenAI API error: {e}")
+            # Cached under "patterns", so a fallback is never served as an AI result
+            run.parsed, run.mode = parser._parse_with_patterns(run.text), "patterns"
+            return FALLBACK, run.text_bytes, _json_bytes(run.parsed)
+        return OK, run.text_bytes, _json_bytes(run.parsed)
+
+
+class NormalizeStage:
+    """Normalize the AI result and store the finished parse in parse_cache."""
+    name = "normalize"
+
+    async def run(self, run: ParseRun) -> Tuple[str, int, int]:
+        if run.cached:
+            return SKIPPED, 0, 0
+        from services import parse_cache
+
+        bytes_in = _json_bytes(run.parsed)
+        outcome = SKIPPED
+        if run.mode != "patterns":
+            run.parsed = run.parser._normalize_parsed_data(run.parsed, run.text)
+            outcome = OK
+        parse_cache.put_parse(run.digest, run.parser_version, run.mode, run.parsed)
+        return outcome, bytes_in, _json_bytes(run.parsed)
+
+
+class PersistStage:
+    """Hand the parse to the caller's persist callback (which may set schedule_data)."""
+    name = "persist"
+
+    async def run(self, run: ParseRun) -> Tuple[str, int, int]:
+        if run.persist is None:
+            return SKIPPED, 0, 0
+        await run.persist(run)
+        return OK, _json_bytes(run.parsed), _json_bytes(run.schedule_data)
+
+
+class ScheduleStage:
+    """Regenerate the family's custody events from the persisted agreement, or from a parse with a schedule."""
+    name = "schedule"
+
+    async def run(self, run: ParseRun) -> Tuple[str, int, int]:
+        data = run.schedule_data
+        if data is None and run.parsed and run.parsed.get("custodySchedule"):
+            data = run.parsed
+        if run.family is None or data is None:
+            return SKIPPED, 0, 0
+        from services.calendar_generator import regenerate_custody_events
+
+        family_id = run.family.get("id") or str(run.family["_id"])
+        await regenerate_custody_events(family_id, data)
+        run.events_generated = True
+        return OK, _json_bytes(data), 0
+
+
+DEFAULT_STAGES = [
+    DecodeStage(), ExtractStage(), SegmentStage(), RuleParseStage(),
+    LLMRefineStage(), NormalizeStage(), PersistStage(), ScheduleStage(),
+]
+
+
+class ParsingPipeline:
+    """Runs a ParseRun through its stages in order, recording every stage."""
+
+    def __init__(self, stages: List[Any]):
+        self.stages = list(stages)
+        self._stats = {"runs": 0, "failures": 0}
+        self._latency = metrics.LatencyRecorder()
+        self._stage_latency = {stage.name: metrics.LatencyRecorder() for stage in self.stages}
+        self._stage_totals = {stage.name: {"bytes_in": 0, "bytes_out": 0, "outcomes": {}} for stage in self.stages}
+        self._recent = deque(maxlen=PIPELINE_RECENT_RUNS)
+
+    async def run(
+        self,
+        parser,
+        file_type: str,
+        file_content: Optional[Union[bytes, memoryview]] = None,
+        encoded_content: Optional[str] = None,
+        family: Optional[dict] = None,
+        persist: Optional[Callable[[ParseRun], Awaitable[None]]] = None,
+        refresh: bool = False,
+        digest: str = "",
+    ) -> ParseRun:
+        """
+        Parse one document. Pass the raw bytes (or a memoryview of them),
+        or the base64 upload as encoded_content. Raises ValueError for bad
+        or unsupported files; the failing stage is recorded with outcome
+        "error".
+        """
+        run = ParseRun(parser, file_type, file_content, encoded_content, family, persist, refresh, digest)
+        self._stats["runs"] += 1
+        started = time.perf_counter()
+        try:
+            for stage in self.stages:
+                stage_started = time.perf_counter()
+                try:
+                    outcome, bytes_in, bytes_out = await stage.run(run)
+                except Exception as e:
+                    self._record(run, StageRecord(stage.name, time.perf_counter() - stage_started, 0, 0, ERROR, str(e)[:200]))
+                    raise
+                self._record(run, StageRecord(stage.name, time.perf_counter() - stage_started, bytes_in, bytes_out, outcome))
+        except Exception:
+            self._stats["failures"] += 1
+            raise
+        finally:
+            self._latency.record(time.perf_counter() - started)
+            self._recent.append({"fileType": file_type, "sha256": run.digest, "stages": run.timings()})
+        return run
+
+    def _record(self, run: ParseRun, record: StageRecord):
+        run.records.append(record)
+        self._stage_latency[record.stage].record(record.seconds)
+        totals = self._stage_totals[record.stage]
+        totals["bytes_in"] += record.bytes_in
+        totals["bytes_out"] += record.bytes_out
+        totals["outcomes"][record.outcome] = totals["outcomes"].get(record.outcome, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "latency": self._latency.summary(),
+            "stages": {
+                name: {**self._stage_totals[name], "outcomes": dict(self._stage_totals[name]["outcomes"]), "latency": recorder.summary()}
+                for name, recorder in self._stage_latency.items()
+            },
+            "recent": list(self._recent),
+        }
+
+
+pipeline = ParsingPipeline(DEFAULT_STAGES)
+
+
+def agreement_fields(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """The parse as stored on a family's custodyAgreement, with the defaults for missing fields."""
+    return {
+        "custodySchedule": parsed.get("custodySchedule", "Extracted from agreement"),
+        "holidaySchedule": parsed.get("holidaySchedule", "As specified in agreement"),
+        "decisionMaking": parsed.get("decisionMaking", "Joint legal custody"),
+        "expenseSplit": parsed.get("expenseSplit", {"ratio": "50-50", "parent1": 50, "parent2": 50}),
+        "parsedData": parsed.get("parsedData", parsed),
+    }
+
+
+def default_parser():
+    """The parser every upload route uses, configured from the environment."""
+    from services.document_parser import DocumentParser
+    return DocumentParser(ai_provider=os.getenv("AI_PROVIDER", "openai"))
+
+
+metrics.register("parsing_pipeline", pipeline.stats)
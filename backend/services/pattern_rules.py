@@ -0,0 +1,134 @@
+"""
+Pattern Rule Engine
+
+The fallback parsers' regex heuristics live in pattern_rules.json (or the
+file named by PATTERN_RULES_FILE) instead of if/elif chains, so a new
+schedule or decision-making phrasing is a table entry, not a code change.
+
+Each rule set has `defaults` and a list of `rules`:
+
+    id          name used in errors and logs
+    group       rules in a group are alternatives; only the winner applies
+    priority    higher wins within a group (like the order of an elif chain)
+    patterns    regexes matched against the lowercased text; any may match
+    set         fields to set when the rule wins
+    term/value/confidence   optional entry appended to extractedTerms
+    confidence  also the confidence of the fields the rule sets
+                (DEFAULT_RULE_CONFIDENCE if omitted); see field_confidence
+
+Patterns are compiled once per rule set when the file is loaded, and matched
+through the document's shared SectionIndex, so each pattern scans a given
+text at most once no matter how many consumers ask.
+"""
+
+import json
+import os
+import re
+from copy import deepcopy
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from services import agreement_sections
+
+# Field confidence for rules that don't state one
+DEFAULT_RULE_CONFIDENCE = 0.5
+
+RULES_FILE = os.getenv("PATTERN_RULES_FILE", os.path.join(os.path.dirname(__file__), "pattern_rules.json"))
+
+
+@dataclass
+class PatternRule:
+    id: str
+    group: str
+    priority: int
+    patterns: List[str]
+    set: Dict[str, Any] = field(default_factory=dict)
+    term: Optional[str] = None
+    value: Optional[str] = None
+    confidence: Optional[float] = None
+
+
+class PatternRuleSet:
+    """One compiled rule set; apply() turns a text into the parsed fields."""
+
+    def __init__(self, name: str, defaults: Dict[str, Any], rules: List[PatternRule]):
+        self.name = name
+        self.defaults = defaults
+        # Groups keep the order they first appear in, which is the order
+        # their terms are added to extractedTerms
+        self.groups: Dict[str, List[PatternRule]] = {}
+        for rule in rules:
+            self.groups.setdefault(rule.group, []).append(rule)
+        for group_rules in self.groups.values():
+            group_rules.sort(key=lambda rule: -rule.priority)
+
+        try:
+            self._compiled = agreement_sections.RuleSet({rule.id: "|".join(rule.patterns) for rule in rules})
+        except re.error as e:
+            raise ValueError(f"Invalid pattern in rule set '{name}': {e}")
+
+    def matching_rules(self, text: str) -> List[PatternRule]:
+        """The winning rule of each group that has a match, in group order."""
+        matches = agreement_sections.index_for(text).rule_matches(self._compiled)
+        winners = []
+        for group_rules in self.groups.values():
+            winner = next((rule for rule in group_rules if matches[rule.id]), None)
+            if winner is not None:
+                winners.append(winner)
+        return winners
+
+    def field_confidence(self, text: str) -> Dict[str, float]:
+        """Confidence of each field a winning rule sets; fields left at their defaults aren't listed."""
+        confidence = {}
+        for rule in self.matching_rules(text):
+            for key in rule.set:
+                confidence[key] = rule.confidence if rule.confidence is not None else DEFAULT_RULE_CONFIDENCE
+        return confidence
+
+    def apply(self, text: str) -> Dict[str, Any]:
+        """Start from the defaults and apply each group's winning rule."""
+        parsed = deepcopy(self.defaults)
+        terms = parsed.setdefault("extractedTerms", [])
+        for rule in self.matching_rules(text):
+            for key, value in rule.set.items():
+                parsed[key] = deepcopy(value)
+            if rule.term:
+                terms.append({"term": rule.term, "value": rule.value, "confidence": rule.confidence})
+        return parsed
+
+
+def _build_rule_set(name: str, spec: Dict[str, Any]) -> PatternRuleSet:
+    rules = []
+    for entry in spec.get("rules", []):
+        if not entry.get("patterns"):
+            raise ValueError(f"Rule '{entry.get('id')}' in rule set '{name}' has no patterns")
+        rules.append(PatternRule(
+            id=entry["id"],
+            group=entry.get("group", entry["id"]),
+            priority=entry.get("priority", 0),
+            patterns=entry["patterns"],
+            set=entry.get("set", {}),
+            term=entry.get("term"),
+            value=entry.get("value"),
+            confidence=entry.get("confidence"),
+        ))
+    ids = [rule.id for rule in rules]
+    if len(ids) != len(set(ids)):
+        raise ValueError(f"Duplicate rule ids in rule set '{name}'")
+    return PatternRuleSet(name, spec.get("defaults", {}), rules)
+
+
+@lru_cache(maxsize=None)
+def _load(path: str) -> Dict[str, PatternRuleSet]:
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    return {name: _build_rule_set(name, rule_set) for name, rule_set in spec.items()}
+
+
+def get_rule_set(name: str) -> PatternRuleSet:
+    """Return a compiled rule set from the rules file (loaded and compiled once)."""
+    rule_sets = _load(RULES_FILE)
+    if name not in rule_sets:
+        raise ValueError(f"Unknown pattern rule set '{name}'")
+    return rule_sets[name]
@@ -0,0 +1,209 @@
+"""
+Test Suite for Re-parsing Stored Agreements
+
+Tests:
+1. A dry run counts the changes without writing anything
+2. A run stopped after its first batch resumes from the checkpoint
+3. Only changed agreements are written; calendars are regenerated only
+   where the custody schedule changed, and cached months are dropped for
+   every written family
+4. A family whose file can't be parsed is recorded and skipped
+5. An agreement uploaded while its family was being parsed is neither
+   overwritten nor used to regenerate the calendar
+6. Confidence scores and quoted terms alone don't count as a change
+
+Runs on the in-memory database with the pattern parser (no API key).
+"""
+
+import asyncio
+import base64
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from services import agreement_reparse, calendar_cache, metrics, parsing_pipeline
+from services.calendar_generator import family_calendar_id
+from services.document_parser import DocumentParser
+
+SCHEDULE_223 = "The parents share joint legal custody. Physical custody follows a 2-2-3 rotating schedule."
+SCHEDULE_WEEKLY = "The parents share joint legal custody. The children alternate weeks with each parent, week on, week off."
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def cache_month(family_id: str) -> str:
+    """Cache a calendar month for a family; returns its calendar id."""
+    calendar_id = family_calendar_id(db.families.find_one({"id": family_id}))
+    calendar_cache.put(calendar_id, 2025, 12, b"[]", calendar_cache.generation(calendar_id))
+    return calendar_id
+
+
+def stored_agreement(text: str, file_type: str = "txt", **fields) -> dict:
+    agreement = {
+        "uploadDate": datetime(2025, 1, 15),
+        "fileName": f"agreement.{file_type}",
+        "fileType": file_type,
+        "fileContent": base64.b64encode(text.encode("utf-8")).decode("ascii"),
+        "custodySchedule": "Extracted from agreement",
+        "holidaySchedule": "As specified in agreement",
+        "decisionMaking": "Joint legal custody",
+        "expenseSplit": {"ratio": "50-50", "parent1": 50, "parent2": 50},
+        "parsedData": {"parsed": True},
+    }
+    agreement.update(fields)
+    return agreement
+
+
+async def seed_families(parser) -> dict:
+    """Five families: stale schedules, one already current, one stale in parsedData only, one unreadable."""
+    current = await parsing_pipeline.pipeline.run(parser, "txt", file_content=SCHEDULE_223.encode("utf-8"))
+    families = {
+        "fam-a": stored_agreement(SCHEDULE_223),
+        "fam-b": stored_agreement(SCHEDULE_WEEKLY, custodySchedule="2-2-3 schedule"),
+        "fam-c": stored_agreement(SCHEDULE_223, **parsing_pipeline.agreement_fields(current.parsed)),
+        "fam-d": stored_agreement(SCHEDULE_223, **{**parsing_pipeline.agreement_fields(current.parsed), "parsedData": {"stale": True}}),
+        "fam-e": stored_agreement("not a pdf", file_type="pdf"),
+    }
+    for family_id, agreement in families.items():
+        db.families.insert_one({"id": family_id, "familyName": family_id, "custodyAgreement": agreement})
+    db.families.insert_one({"id": "fam-0", "familyName": "No agreement yet"})
+    return families
+
+
+async def test_dry_run(parser):
+    print("\n" + "=" * 60)
+    print("Testing Dry Run")
+    print("=" * 60)
+
+    run = agreement_reparse.create_run(dry_run=True)
+    run = await agreement_reparse.reparse(run["id"], batch_size=10, max_per_second=0, parser=parser)
+    counters = run["counters"]
+    print(f"  {counters}")
+    return report([
+        ("Dry run completes", run["status"] == "completed"),
+        ("Every stored agreement is scanned", counters["scanned"] == 5),
+        ("Changes are counted", counters["changed"] == 3 and counters["unchanged"] == 1 and counters["failed"] == 1),
+        ("Nothing is written", counters["written"] == 0 and not any(
+            (family.get("custodyAgreement") or {}).get("reparsedAt") for family in db.families.find())),
+    ])
+
+
+async def test_resume(parser):
+    print("\n" + "=" * 60)
+    print("Testing Stop, Resume and Write-back")
+    print("=" * 60)
+
+    regenerations_before = metrics.snapshot()["custody_regeneration"]["requests"]
+    # fam-d is written without a schedule change, fam-c isn't written at all
+    rewritten_calendar, current_calendar = cache_month("fam-d"), cache_month("fam-c")
+    run = agreement_reparse.create_run()
+    batches = []
+
+    def stop_after_first_batch(progress):
+        batches.append(progress["counters"]["scanned"])
+        agreement_reparse.request_stop(run["id"])
+
+    paused = await agreement_reparse.reparse(run["id"], batch_size=2, max_per_second=0, parser=parser, on_batch=stop_after_first_batch)
+    paused_status, paused_scanned = paused["status"], paused["counters"]["scanned"]
+    finished = await agreement_reparse.reparse(run["id"], batch_size=2, max_per_second=0, parser=parser)
+    regenerations = metrics.snapshot()["custody_regeneration"]["requests"] - regenerations_before
+
+    agreements = {family["id"]: family.get("custodyAgreement") for family in db.families.find()}
+    counters = finished["counters"]
+    print(f"  paused after {batches[0]} families; finished with {counters}")
+    print(f"  changed fields: {finished['changed_fields']}")
+    return report([
+        ("Stop pauses after the current batch", paused_status == "paused" and paused_scanned == 2),
+        ("Resume continues from the checkpoint", finished["status"] == "completed" and counters["scanned"] == 5),
+        ("Stale schedules are rewritten", agreements["fam-a"]["custodySchedule"] == "2-2-3 schedule"
+            and agreements["fam-b"]["custodySchedule"] == "Week-on/week-off"),
+        ("Current agreements are left alone", "reparsedAt" not in agreements["fam-c"]),
+        ("parsedData-only changes are written", agreements["fam-d"]["parsedData"] != {"stale": True}),
+        ("Calendars regenerate only on schedule changes", counters["schedulesChanged"] == 2 and regenerations == 2),
+        ("Written agreements drop their cached months", calendar_cache.get(rewritten_calendar, 2025, 12) is None),
+        ("Unwritten agreements keep theirs", calendar_cache.get(current_calendar, 2025, 12) == b"[]"),
+        ("Unreadable file is recorded", counters["failed"] == 1 and finished["errors"][0]["familyId"] == "fam-e"),
+        ("Original file is kept", agreements["fam-a"]["fileContent"] == base64.b64encode(SCHEDULE_223.encode()).decode()),
+    ])
+
+
+class UploadDuringParse(DocumentParser):
+    """Simulates a new agreement upload landing while the old one is being parsed."""
+
+    def _parse_with_patterns(self, text):
+        if "Addendum" in text:
+            db.families.update_one({"id": "fam-f"}, {"$set": {"custodyAgreement.uploadDate": datetime(2025, 6, 1)}})
+        return super()._parse_with_patterns(text)
+
+
+async def test_concurrent_upload(parser):
+    print("\n" + "=" * 60)
+    print("Testing Uploads During a Run and Volatile Fields")
+    print("=" * 60)
+
+    current = await parsing_pipeline.pipeline.run(parser, "txt", file_content=SCHEDULE_223.encode("utf-8"))
+    fields = parsing_pipeline.agreement_fields(current.parsed)
+    reworded = {**fields["parsedData"], "confidence": 0.42, "fieldConfidence": {"custodySchedule": 0.5},
+                "extractedTerms": [{"term": "Custody", "value": "2-2-3", "confidence": 0.7}]}
+    db.families.insert_one({"id": "fam-f", "custodyAgreement": stored_agreement(SCHEDULE_WEEKLY + " Addendum.", custodySchedule="2-2-3 schedule")})
+    db.families.insert_one({"id": "fam-g", "custodyAgreement": stored_agreement(SCHEDULE_223, **{**fields, "parsedData": reworded})})
+    # Families created before the `id` field was added only have _id
+    db.families.insert_one({"familyName": "Legacy", "custodyAgreement": stored_agreement(SCHEDULE_223, **fields)})
+
+    regenerations_before = metrics.snapshot()["custody_regeneration"]["requests"]
+    run = agreement_reparse.create_run()
+    run = await agreement_reparse.reparse(run["id"], batch_size=3, max_per_second=0, parser=UploadDuringParse(ai_provider="none"))
+    regenerations = metrics.snapshot()["custody_regeneration"]["requests"] - regenerations_before
+    agreements = {family.get("id"): family["custodyAgreement"] for family in db.families.find() if family.get("custodyAgreement")}
+    print(f"  {run['counters']}")
+    return report([
+        ("Families are paged by _id, with or without an id", run["counters"]["scanned"] == 8),
+        ("Agreement uploaded mid-run is not overwritten", agreements["fam-f"]["custodySchedule"] == "2-2-3 schedule"
+            and "reparsedAt" not in agreements["fam-f"]),
+        ("Its calendar is not regenerated from the old file", regenerations == 0),
+        ("Differing confidence and terms are not a change", "reparsedAt" not in agreements["fam-g"]),
+    ])
+
+
+async def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 AGREEMENT RE-PARSE TEST SUITE")
+    print("=" * 60)
+
+    parser = DocumentParser(ai_provider="none")
+    await seed_families(parser)
+    total_passed = 0
+    total_failed = 0
+    for test in (test_dry_run, test_resume, test_concurrent_upload):
+        p, f = await test(parser)
+        total_passed += p
+        total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
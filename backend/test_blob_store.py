@@ -0,0 +1,155 @@
+"""
+Test Suite for the Blob Store
+
+Tests:
+1. Identical files are stored once and reference-counted
+2. Releasing the last reference deletes the blob and its file
+3. Streamed uploads end up in the same blob as in-memory ones
+4. Compressible formats are stored compressed (when zstandard is
+   installed) and read back unchanged
+5. A store racing the last release of the same content keeps its file
+
+Runs on the in-memory database; blobs are written to a temporary directory.
+"""
+
+import io
+import os
+import sys
+import tempfile
+import threading
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from services import blob_store
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def refcount(sha256: str):
+    record = db.blobs.find_one({"sha256": sha256})
+    return record["refcount"] if record else None
+
+
+def test_dedup_and_release():
+    print("\n" + "=" * 60)
+    print("Testing Deduplication and Reference Counts")
+    print("=" * 60)
+
+    content = b"%PDF-1.4 " + os.urandom(4096)
+    first = blob_store.put_buffer(content, "pdf")
+    second = blob_store.put_buffer(memoryview(content), "pdf")
+    streamed = blob_store.put_stream(io.BytesIO(content), "pdf")
+    path = blob_store.blob_path(first.sha256, first.compression)
+    print(f"  {first.sha256[:12]}: refcount {refcount(first.sha256)}")
+
+    checks = [
+        ("First copy is written", first.created and os.path.exists(path)),
+        ("Identical copies only add references", not second.created and not streamed.created and refcount(first.sha256) == 3),
+        ("Contents read back unchanged", blob_store.read(first.sha256) == content),
+        ("No staging files are left", not os.listdir(blob_store.INCOMING_DIR)),
+    ]
+    blob_store.release(first.sha256)
+    blob_store.release(first.sha256)
+    kept = os.path.exists(path) and refcount(first.sha256) == 1
+    blob_store.release(first.sha256)
+    checks += [
+        ("File is kept while referenced", kept),
+        ("Last release deletes the blob", not os.path.exists(path) and refcount(first.sha256) is None),
+    ]
+    return report(checks)
+
+
+def test_release_race():
+    print("\n" + "=" * 60)
+    print("Testing a Store Racing the Last Release")
+    print("=" * 60)
+
+    content = b"%PDF-1.4 " + os.urandom(4096)
+    blob = blob_store.put_buffer(content, "pdf")
+    path = blob_store.blob_path(blob.sha256, blob.compression)
+    delete_one = db.blobs.delete_one
+    racers = []
+
+    def delete_then_race(query):
+        # The same content is uploaded again right after the record is deleted
+        result = delete_one(query)
+        racer = threading.Thread(target=blob_store.put_buffer, args=(content, "pdf"))
+        racer.start()
+        racers.append(racer)
+        racer.join(0.2)
+        return result
+
+    db.blobs.delete_one = delete_then_race
+    try:
+        blob_store.release(blob.sha256)
+    finally:
+        db.blobs.delete_one = delete_one
+    for racer in racers:
+        racer.join()
+    print(f"  refcount after the race: {refcount(blob.sha256)}")
+    return report([
+        ("Racing store is recorded", refcount(blob.sha256) == 1),
+        ("Its file was not deleted by the release", os.path.exists(path) and blob_store.read(blob.sha256) == content),
+    ])
+
+
+def test_compression():
+    print("\n" + "=" * 60)
+    print("Testing Compression")
+    print("=" * 60)
+
+    text = ("Pickup at 6pm on Fridays; the children return Sunday evening.\n" * 500).encode()
+    blob = blob_store.put_buffer(text, "txt")
+    image = blob_store.put_buffer(os.urandom(2048), "jpg")
+    print(f"  txt {blob.size} -> {blob.stored_size} bytes ({blob.compression or 'uncompressed'})")
+    if not blob_store.ZSTD_SUPPORT:
+        print("  ⚠️  zstandard not installed; files are stored uncompressed")
+    return report([
+        ("Text is compressed when zstd is available", (blob.compression == "zstd") == blob_store.ZSTD_SUPPORT),
+        ("Compressed blob is smaller", blob.stored_size < blob.size if blob.compression else blob.stored_size == blob.size),
+        ("Text reads back unchanged", blob_store.read(blob.sha256) == text),
+        ("Images are stored as uploaded", image.compression is None),
+    ])
+
+
+def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 BLOB STORE TEST SUITE")
+    print("=" * 60)
+
+    total_passed = 0
+    total_failed = 0
+    with tempfile.TemporaryDirectory(prefix="blobs-") as directory:
+        blob_store.BLOBS_DIR = directory
+        blob_store.INCOMING_DIR = os.path.join(directory, "incoming")
+        for test in (test_dedup_and_release, test_release_race, test_compression):
+            p, f = test()
+            total_passed += p
+            total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
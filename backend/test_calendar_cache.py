@@ -0,0 +1,144 @@
+"""
+Test Suite for the Calendar Month Cache
+
+Tests:
+1. The least recently used month is evicted past MAX_ENTRIES
+2. Entries expire after TTL_SECONDS
+3. Invalidation drops a family's months and rejects payloads built before it
+4. Custody generation invalidates the family's months, even when it
+   writes nothing
+
+Runs on the in-memory database.
+"""
+
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from services import calendar_cache, calendar_generator
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def fill(family_id, month, payload=b"[]"):
+    calendar_cache.put(family_id, 2025, month, payload, calendar_cache.generation(family_id))
+
+
+def test_eviction_and_expiry():
+    print("\n" + "=" * 60)
+    print("Testing LRU Eviction and TTL Expiry")
+    print("=" * 60)
+
+    max_entries, ttl = calendar_cache.MAX_ENTRIES, calendar_cache.TTL_SECONDS
+    calendar_cache.MAX_ENTRIES = 3
+    try:
+        for month in (1, 2, 3):
+            fill("cache-lru", month)
+        calendar_cache.get("cache-lru", 2025, 1)
+        fill("cache-lru", 4)
+        evicted = calendar_cache.get("cache-lru", 2025, 2) is None
+        kept = all(calendar_cache.get("cache-lru", 2025, month) is not None for month in (1, 3, 4))
+
+        calendar_cache.TTL_SECONDS = 0.05
+        fill("cache-ttl", 1)
+        fresh = calendar_cache.get("cache-ttl", 2025, 1) is not None
+        time.sleep(0.1)
+        expired = calendar_cache.get("cache-ttl", 2025, 1) is None
+    finally:
+        calendar_cache.MAX_ENTRIES, calendar_cache.TTL_SECONDS = max_entries, ttl
+    print(f"  {calendar_cache.stats()}")
+    return report([
+        ("Least recently used month is evicted", evicted),
+        ("Recently read months are kept", kept),
+        ("Entry is served within its TTL", fresh),
+        ("Entry expires after its TTL", expired),
+    ])
+
+
+def test_invalidation():
+    print("\n" + "=" * 60)
+    print("Testing Invalidation")
+    print("=" * 60)
+
+    fill("cache-a", 1)
+    fill("cache-a", 2)
+    fill("cache-b", 1)
+    calendar_cache.invalidate_family("cache-a")
+    dropped = calendar_cache.get("cache-a", 2025, 1) is None and calendar_cache.get("cache-a", 2025, 2) is None
+
+    # A read that scanned the events before a regeneration finishes after it
+    generation = calendar_cache.generation("cache-a")
+    calendar_cache.invalidate_family("cache-a")
+    calendar_cache.put("cache-a", 2025, 1, b"stale", generation)
+    stale_rejected = calendar_cache.get("cache-a", 2025, 1) is None
+    fill("cache-a", 1, b"fresh")
+    return report([
+        ("Family's months are dropped", dropped),
+        ("Other families are kept", calendar_cache.get("cache-b", 2025, 1) is not None),
+        ("Payload built before an invalidation is not cached", stale_rejected),
+        ("Payload built after it is cached", calendar_cache.get("cache-a", 2025, 1) == b"fresh"),
+    ])
+
+
+def test_regeneration():
+    print("\n" + "=" * 60)
+    print("Testing Invalidation on Custody Generation")
+    print("=" * 60)
+
+    agreement = {"custodySchedule": "2-2-3"}
+    db.families.insert_one({"id": "cache-single", "parent1_email": "a@example.com"})
+    db.families.insert_one({"id": "cache-pair", "parent1_email": "a@example.com", "parent2_email": "b@example.com"})
+    single_id = calendar_generator.family_calendar_id(calendar_generator.find_family("cache-single"))
+    pair_id = calendar_generator.family_calendar_id(calendar_generator.find_family("cache-pair"))
+    fill(single_id, 1)
+    fill(pair_id, 1)
+    written_single = calendar_generator.generate_custody_events("cache-single", agreement)
+    written_pair = calendar_generator.generate_custody_events("cache-pair", agreement)
+    print(f"  written: {written_single} (one parent), {written_pair} (two parents)")
+    return report([
+        ("Family with one parent gets no custody days", written_single == 0),
+        ("Its cached months are still invalidated", calendar_cache.get(single_id, 2025, 1) is None),
+        ("Regeneration invalidates the family's months", written_pair > 0 and calendar_cache.get(pair_id, 2025, 1) is None),
+    ])
+
+
+def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 CALENDAR CACHE TEST SUITE")
+    print("=" * 60)
+
+    total_passed = 0
+    total_failed = 0
+    for test in (test_eviction_and_expiry, test_invalidation, test_regeneration):
+        p, f = test()
+        total_passed += p
+        total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
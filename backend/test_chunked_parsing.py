@@ -0,0 +1,362 @@
+"""
+Test Suite for Section-Aware Chunked Parsing
+
+Tests:
+1. Section splitting and chunk selection for a long agreement
+2. Merging partial results by per-field confidence
+3. Chunked AI parsing against the local stub completion server
+   (coverage of the whole document, concurrency limit, latency)
+4. Early exit while streaming pages once the required sections are read,
+   without stopping on the title or before the holiday article
+5. Tiered parsing: the LLM is called only for fields the patterns can't settle
+6. Prompt compaction keeps the relevant paragraphs within the token budget
+7. The parsing pipeline records every stage, including cache hits and fallbacks
+
+Runs without an API key: llm_stub_server.py stands in for OpenAI.
+"""
+
+import asyncio
+import base64
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_stub_server import start_in_thread
+from benchmark_parser import make_pdf
+from services import agreement_sections, document_parser, metrics, parsing_pipeline
+from services.document_parser import DocumentParser, LLM_MAX_CONCURRENCY, merge_partial_results
+
+STUB_DELAY = 0.3
+
+BOILERPLATE = (
+    "The parties acknowledge that each has had the opportunity to consult independent counsel, "
+    "that this agreement was negotiated at arm's length, and that the division set out below is "
+    "fair and reasonable in light of the marital estate as disclosed in the financial statements.\n\n"
+)
+
+
+def build_long_agreement() -> str:
+    """A settlement agreement whose custody articles start well past 8,000 characters."""
+    parts = [
+        "MARITAL SETTLEMENT AGREEMENT\n\n",
+        "This agreement is made between Jane Doe (Parent 1) and John Doe (Parent 2).\n\n",
+    ]
+    for number, title in enumerate(["REAL PROPERTY", "RETIREMENT ACCOUNTS", "VEHICLES", "DEBTS", "TAXES", "SPOUSAL MAINTENANCE"], start=1):
+        parts.append(f"ARTICLE {number} - {title}\n\n")
+        parts.append(BOILERPLATE * 12)
+    parts.append("ARTICLE 7 - PHYSICAL CUSTODY AND PARENTING TIME\n\n")
+    parts.append("The parents shall share physical custody on a 2-2-3 rotating schedule. Parent 1 and Parent 2 "
+                 "share joint legal custody of the minor children.\n\n")
+    parts.append("ARTICLE 8 - HOLIDAY SCHEDULE\n\n")
+    parts.append("The parents shall alternate holidays each year as set out in Exhibit A.\n\n")
+    parts.append("ARTICLE 9 - CHILD SUPPORT\n\n")
+    parts.append("Parent 1 shall pay child support to Parent 2 in the amount of $850 per month.\n\n")
+    parts.append("ARTICLE 10 - GENERAL PROVISIONS\n\n")
+    parts.append(BOILERPLATE * 6)
+    return "".join(parts)
+
+
+async def test_chunk_selection():
+    print("\n" + "=" * 60)
+    print("Testing Section Splitting and Chunk Selection")
+    print("=" * 60)
+
+    text = build_long_agreement()
+    chunks = agreement_sections.build_chunks(text)
+    custody_offset = text.find("2-2-3")
+    checks = [
+        ("Custody article is past the first 8000 chars", custody_offset > 8000),
+        ("Long document is split into several chunks", len(chunks) > 1),
+        ("Custody article is in a chunk", any("2-2-3 rotating" in chunk for chunk in chunks)),
+        ("Child support article is in a chunk", any("$850" in chunk for chunk in chunks)),
+        ("Chunks fit the prompt budget", all(len(chunk) <= agreement_sections.CHUNK_CHARS for chunk in chunks)),
+        ("Short document stays whole", agreement_sections.build_chunks("Short agreement.") == ["Short agreement."]),
+    ]
+
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+async def test_merge():
+    print("\n" + "=" * 60)
+    print("Testing Confidence-Based Merge")
+    print("=" * 60)
+
+    merged = merge_partial_results([
+        {"custodySchedule": "Week-on/week-off", "fieldConfidence": {"custodySchedule": 0.4}, "confidence": 0.5,
+         "extractedTerms": [{"term": "Legal Custody", "value": "Joint", "confidence": 0.7}]},
+        {"custodySchedule": "2-2-3 schedule", "holidaySchedule": None, "confidence": 0.9,
+         "extractedTerms": [{"term": "legal custody", "value": "Joint Legal Custody", "confidence": 0.95}]},
+        {"holidaySchedule": "Alternating holidays", "fieldConfidence": {"holidaySchedule": 0.8}, "confidence": 0.6},
+    ])
+    checks = [
+        ("More confident schedule wins", merged.get("custodySchedule") == "2-2-3 schedule"),
+        ("Null fields don't override", merged.get("holidaySchedule") == "Alternating holidays"),
+        ("Terms are de-duplicated", len(merged["extractedTerms"]) == 1 and merged["extractedTerms"][0]["confidence"] == 0.95),
+        ("Per-field confidence is reported", merged["fieldConfidence"].get("custodySchedule") == 0.9),
+    ]
+
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+async def test_chunked_ai_parsing():
+    print("\n" + "=" * 60)
+    print("Testing Chunked Parsing Against the Stub LLM")
+    print("=" * 60)
+
+    server, base_url = start_in_thread(delay=STUB_DELAY)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    try:
+        # Full AI parsing, so every chunk is sent
+        parser = DocumentParser(api_key="stub", tiered=False)
+        text = build_long_agreement()
+        chunk_count = len(agreement_sections.build_chunks(text))
+
+        started = time.perf_counter()
+        result = await parser.parse_with_ai(text)
+        elapsed = time.perf_counter() - started
+
+        handler = server.RequestHandlerClass
+        # Sequential calls would take chunk_count * delay; allow one extra round for overhead
+        rounds = -(-chunk_count // LLM_MAX_CONCURRENCY)
+        print(f"  {chunk_count} chunks, {handler.request_count} requests, "
+              f"max {handler.max_in_flight} in flight, {elapsed:.2f}s")
+        checks = [
+            ("Custody schedule found past the cut-off", result.get("custodySchedule") == "2-2-3 schedule"),
+            ("Holiday schedule found", result.get("holidaySchedule") == "Alternating holidays"),
+            ("Child support found", (result.get("childSupport") or {}).get("amount") == 850),
+            ("One request per chunk", handler.request_count == chunk_count),
+            ("Requests ran concurrently", chunk_count == 1 or handler.max_in_flight > 1),
+            ("Concurrency limit respected", handler.max_in_flight <= LLM_MAX_CONCURRENCY),
+            ("Latency close to parallel rounds", elapsed < (rounds + 1) * STUB_DELAY + 1.0),
+        ]
+    finally:
+        server.shutdown()
+        os.environ.pop("OPENAI_BASE_URL", None)
+
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+async def test_section_capture():
+    print("\n" + "=" * 60)
+    print("Testing Early Exit on Captured Sections")
+    print("=" * 60)
+
+    pages = [
+        ["CUSTODY AGREEMENT", "Between Parent 1 and Parent 2, who agree as follows."],
+        ["ARTICLE 1 - LEGAL CUSTODY", "The parents share joint legal custody of the children."],
+        ["ARTICLE 2 - PARENTING TIME", "Physical custody follows a 2-2-3 rotating schedule."],
+        ["ARTICLE 3 - CHILD SUPPORT AND EXPENSES", "Expenses are split 50/50."],
+        ["ARTICLE 4 - HOLIDAYS", "Holidays alternate each year between the parents."],
+        ["ARTICLE 5 - PROPERTY", "The house is sold."],
+        ["EXHIBIT A", "Financial statements."],
+    ]
+    texts = ["\n".join(lines) for lines in pages]
+    capture = agreement_sections.SectionCapture()
+    stopped_at = next((number for number, page in enumerate(texts, start=1) if capture.feed(page)), None)
+
+    partial = agreement_sections.SectionCapture()
+    for page in texts[:5]:
+        partial.feed(page)
+
+    # Streamed from a PDF with early exit on, then parsed
+    early_exit = document_parser.PDF_EARLY_EXIT
+    document_parser.PDF_EARLY_EXIT = True
+    try:
+        text = DocumentParser(ai_provider="none").extract_text_from_file(make_pdf(pages), "pdf")
+    finally:
+        document_parser.PDF_EARLY_EXIT = early_exit
+    parsed = DocumentParser(ai_provider="none")._parse_with_patterns(text)
+    print(f"  stopped at page {stopped_at}; custody section: {capture.found.get('custody')!r}")
+    print(f"  holidaySchedule: {parsed.get('holidaySchedule')!r}")
+
+    checks = [
+        ("Early exit is off unless configured", not early_exit or bool(os.getenv("PDF_EARLY_EXIT"))),
+        ("Holidays are required by default", "holidays" in agreement_sections.REQUIRED_SECTIONS),
+        ("Title heading doesn't start the custody section", capture.found.get("custody") == "article 1 - legal custody"),
+        ("Stops at the first heading after the last required section", stopped_at == 6),
+        ("Last required section is not cut short", not partial.complete),
+        ("No required sections means no early exit", not agreement_sections.SectionCapture([]).feed(texts[0])),
+        ("Holiday article is read before stopping", "Holidays alternate" in text and "Financial statements" not in text),
+        ("holidaySchedule is still extracted", parsed.get("holidaySchedule") == "Alternating holidays"),
+    ]
+
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+async def test_tiered_parsing():
+    print("\n" + "=" * 60)
+    print("Testing Confidence-Tiered Parsing")
+    print("=" * 60)
+
+    clear = ("PARENTING PLAN\n\nThe parents share joint legal custody and equal time (50/50). "
+             "Physical custody follows a 2-2-3 rotating schedule. Holidays alternate each year.")
+    unclear = build_long_agreement()  # 2-2-3 and joint legal custody, but no stated split
+
+    server, base_url = start_in_thread()
+    os.environ["OPENAI_BASE_URL"] = base_url
+    try:
+        parser = DocumentParser(api_key="stub")
+        handler = server.RequestHandlerClass
+        before = metrics.snapshot()["parse_tiers"]
+
+        fast = await parser.parse_with_ai(clear)
+        fast_requests = handler.request_count
+
+        slow = await parser.parse_with_ai(unclear)
+        slow_requests = handler.request_count - fast_requests
+        after = metrics.snapshot()["parse_tiers"]
+    finally:
+        server.shutdown()
+        os.environ.pop("OPENAI_BASE_URL", None)
+
+    print(f"  clear agreement: {fast_requests} requests; long agreement: {slow_requests} requests, "
+          f"fields sent to the LLM: {after['llm_fields'] - before['llm_fields']}")
+    checks = [
+        ("Confident patterns skip the LLM", fast_requests == 0 and fast.get("parseTier") == "patterns"),
+        ("Fast path keeps the pattern fields", fast.get("custodySchedule") == "2-2-3 schedule" and fast.get("custodyArrangement") == "50-50"),
+        ("Weak fields go to the LLM in one request", slow_requests == 1 and slow.get("parseTier") == "llm"),
+        ("Only the unsettled field is asked for", after["llm_fields"] - before["llm_fields"] == 1),
+        ("Confident fields are kept", slow.get("custodySchedule") == "2-2-3 schedule" and slow.get("decisionMaking") == "joint"),
+        ("Tier counts are exposed", after["patterns_only"] - before["patterns_only"] == 1 and after["llm"] - before["llm"] == 1),
+    ]
+
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+async def test_prompt_compaction():
+    print("\n" + "=" * 60)
+    print("Testing Prompt Compaction")
+    print("=" * 60)
+
+    text = build_long_agreement()
+    compacted = agreement_sections.compact_text(text, 500)
+    original_tokens = agreement_sections.estimate_tokens(text)
+    compacted_tokens = agreement_sections.estimate_tokens(compacted)
+    print(f"  {original_tokens} tokens -> {compacted_tokens} tokens")
+    checks = [
+        ("Fits the token budget", compacted_tokens <= 500),
+        ("Parties are kept", "Jane Doe (Parent 1)" in compacted),
+        ("Custody, holiday and support paragraphs are kept", all(phrase in compacted for phrase in ("2-2-3 rotating", "alternate holidays", "$850"))),
+        ("Headings are kept for context", "ARTICLE 9 - CHILD SUPPORT" in compacted),
+        ("Boilerplate is dropped", "arm's length" not in compacted),
+        ("Dropped text is marked", agreement_sections.COMPACTION_GAP in compacted),
+        ("Budget 0 turns compaction off", agreement_sections.compact_text(text, 0) == text),
+    ]
+
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+async def test_parsing_pipeline():
+    print("\n" + "=" * 60)
+    print("Testing the Parsing Pipeline")
+    print("=" * 60)
+
+    document = (build_long_agreement() + "Pipeline test copy.").encode("utf-8")
+    persisted = []
+
+    async def persist(run):
+        persisted.append(run.parsed.get("custodySchedule"))
+
+    server, base_url = start_in_thread()
+    os.environ["OPENAI_BASE_URL"] = base_url
+    try:
+        handler = server.RequestHandlerClass
+        pipeline = parsing_pipeline.ParsingPipeline(parsing_pipeline.DEFAULT_STAGES)
+        parser = DocumentParser(api_key="stub")
+        encoded = base64.b64encode(document).decode("ascii")
+
+        first = await pipeline.run(parser, "txt", encoded_content=encoded, persist=persist)
+        again = await pipeline.run(parser, "txt", file_content=document)
+
+        handler.fail_with = [400]
+        fallback = await pipeline.run(parser, "txt", file_content=document + b" Failing copy.")
+        handler.fail_with = []
+
+        try:
+            await pipeline.run(parser, "txt", encoded_content="not base64!")
+            rejected = None
+        except ValueError:
+            rejected = pipeline.stats()
+    finally:
+        server.shutdown()
+        os.environ.pop("OPENAI_BASE_URL", None)
+
+    outcomes = lambda run: {record.stage: record.outcome for record in run.records}
+    for record in first.records:
+        print(f"  {record.stage:<10} {record.outcome:<8} {record.seconds * 1000:8.2f} ms  {record.bytes_in:>7} -> {record.bytes_out} bytes")
+    checks = [
+        ("Every stage is recorded in order", [record.stage for record in first.records] == [stage.name for stage in parsing_pipeline.DEFAULT_STAGES]),
+        ("Base64 upload is decoded", first.records[0].outcome == "ok" and first.records[0].bytes_out == len(document)),
+        ("Rules and LLM both run on the weak field", outcomes(first)["rules"] == "ok" and outcomes(first)["llm"] == "ok"),
+        ("Persist callback gets the normalized parse", persisted == ["2-2-3 schedule"]),
+        ("No family, no schedule regeneration", outcomes(first)["schedule"] == "skipped"),
+        ("Re-upload is served from the parse cache", outcomes(again)["extract"] == "cached" and outcomes(again)["llm"] == "skipped"),
+        ("LLM failure falls back to patterns", outcomes(fallback)["llm"] == "fallback" and fallback.mode == "patterns"),
+        ("Bad upload fails in the decode stage", rejected is not None and rejected["stages"]["decode"]["outcomes"].get("error") == 1),
+        ("Runs and failures are counted", rejected is not None and rejected["runs"] == 4 and rejected["failures"] == 1),
+    ]
+
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+async def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 CHUNKED PARSING TEST SUITE")
+    print("=" * 60)
+
+    total_passed = 0
+    total_failed = 0
+    for test in (test_chunk_selection, test_merge, test_chunked_ai_parsing, test_section_capture, test_tiered_parsing, test_prompt_compaction, test_parsing_pipeline):
+        p, f = await test()
+        total_passed += p
+        total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
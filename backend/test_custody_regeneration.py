@@ -0,0 +1,144 @@
+"""
+Test Suite for Coalesced Custody Regeneration
+
+Tests:
+1. Concurrent requests for one family run one regeneration, with the last
+   agreement, and all of them get its result
+2. A request arriving while a run holds the family's write lock starts
+   the next run instead of joining the one in progress
+3. Families don't wait for each other
+
+Runs on the in-memory database.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from services import calendar_generator
+
+PARENTS = {"parent1_email": "a@example.com", "parent2_email": "b@example.com"}
+AGREEMENTS = [{"custodySchedule": "Week on, week off"}] * 9 + [{"custodySchedule": "2-2-3"}]
+
+runs = []
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def record_runs(generate):
+    """Wrap generate_custody_events to record (family, schedule, start, end) per run."""
+    def wrapped(family_id, custody_agreement):
+        started = time.monotonic()
+        time.sleep(0.1)
+        written = generate(family_id, custody_agreement)
+        runs.append((family_id, custody_agreement["custodySchedule"], started, time.monotonic()))
+        return written
+    return wrapped
+
+
+async def test_coalescing():
+    print("\n" + "=" * 60)
+    print("Testing Coalescing of Concurrent Requests")
+    print("=" * 60)
+
+    db.families.insert_one({"id": "regen-burst", **PARENTS})
+    before = calendar_generator.regeneration_stats()
+    runs.clear()
+    results = await asyncio.gather(*(
+        calendar_generator.regenerate_custody_events("regen-burst", agreement) for agreement in AGREEMENTS
+    ))
+    after = calendar_generator.regeneration_stats()
+    family = calendar_generator.find_family("regen-burst")
+    print(f"  {len(AGREEMENTS)} requests -> {len(runs)} run(s); results {set(results)}")
+    return report([
+        ("One regeneration for the burst", len(runs) == 1 and after["runs"] - before["runs"] == 1),
+        ("The last agreement wins", runs[0][1] == "2-2-3" and family["custodyHorizon"]["schedule"] == "2-2-3"),
+        ("Every caller gets the run's result", len(set(results)) == 1 and results[0] > 0),
+        ("Joined requests are counted", after["coalesced"] - before["coalesced"] == len(AGREEMENTS) - 1),
+        ("Nothing is left pending", after["pending"] == 0),
+    ])
+
+
+async def test_request_during_run():
+    print("\n" + "=" * 60)
+    print("Testing Requests During a Run")
+    print("=" * 60)
+
+    db.families.insert_one({"id": "regen-during", **PARENTS})
+    runs.clear()
+    first = asyncio.create_task(calendar_generator.regenerate_custody_events("regen-during", AGREEMENTS[0]))
+    # Past the debounce: the first run holds the write lock now
+    await asyncio.sleep(calendar_generator.REGENERATION_DEBOUNCE_SECONDS + 0.05)
+    second = asyncio.create_task(calendar_generator.regenerate_custody_events("regen-during", AGREEMENTS[0]))
+    third = asyncio.create_task(calendar_generator.regenerate_custody_events("regen-during", AGREEMENTS[-1]))
+    await asyncio.gather(first, second, third)
+    schedules = [schedule for _, schedule, _, _ in runs]
+    print(f"  runs: {schedules}")
+    return report([
+        ("Request during a run starts one more run", len(runs) == 2),
+        ("Runs don't overlap", len(runs) == 2 and runs[0][3] <= runs[1][2]),
+        ("The later run uses the last agreement", schedules[-1:] == ["2-2-3"]),
+    ])
+
+
+async def test_families_independent():
+    print("\n" + "=" * 60)
+    print("Testing Independent Families")
+    print("=" * 60)
+
+    db.families.insert_one({"id": "regen-one", **PARENTS})
+    db.families.insert_one({"id": "regen-two", **PARENTS})
+    runs.clear()
+    await asyncio.gather(
+        calendar_generator.regenerate_custody_events("regen-one", AGREEMENTS[0]),
+        calendar_generator.regenerate_custody_events("regen-two", AGREEMENTS[0]),
+    )
+    return report([
+        ("Each family gets its own run", sorted(family for family, _, _, _ in runs) == ["regen-one", "regen-two"]),
+        ("Their runs overlap in time", len(runs) == 2 and runs[0][2] < runs[1][3] and runs[1][2] < runs[0][3]),
+    ])
+
+
+async def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 CUSTODY REGENERATION TEST SUITE")
+    print("=" * 60)
+
+    calendar_generator.REGENERATION_DEBOUNCE_SECONDS = 0.05
+    calendar_generator.generate_custody_events = record_runs(calendar_generator.generate_custody_events)
+    total_passed = 0
+    total_failed = 0
+    for test in (test_coalescing, test_request_during_run, test_families_independent):
+        p, f = await test()
+        total_passed += p
+        total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,184 @@
+"""
+Test Suite for the Rolling Custody Horizon Scheduler
+
+Tests:
+1. Calendars generated from an uploaded agreement (no saved custodyAgreement)
+   are topped up, following the schedule that generated them
+2. Families with a saved agreement, including ones generated before horizons
+   were recorded, are topped up
+3. Families with a long horizon or a single parent are left alone
+
+Runs on the in-memory database.
+"""
+
+import asyncio
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from services import calendar_generator, custody_scheduler
+
+TODAY = date.today()
+PARENTS = {"parent1_email": "a@example.com", "parent2_email": "b@example.com"}
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def horizon(family_id):
+    return calendar_generator.find_family(family_id).get("custodyHorizon") or {}
+
+
+def shorten_horizon(family_id, days_ahead):
+    """Pretend the family's calendar was generated long ago."""
+    family = calendar_generator.find_family(family_id)
+    through = TODAY + timedelta(days=days_ahead)
+    db.events.delete_many({
+        "family_id": calendar_generator.family_calendar_id(family),
+        "type": "custody",
+        "date": {"$gt": datetime.combine(through, datetime.max.time())},
+    })
+    db.families.update_one({"_id": family["_id"]}, {"$set": {"custodyHorizon.through": through.isoformat()}})
+    return through
+
+
+def parent_on(family_id, day):
+    family = calendar_generator.find_family(family_id)
+    event = db.events.find_one({
+        "family_id": calendar_generator.family_calendar_id(family),
+        "type": "custody",
+        "date": datetime.combine(day, datetime.min.time()),
+    })
+    return event and event.get("parent")
+
+
+def expected_parent(day, schedule_kind):
+    number = calendar_generator.custody_parent_number(day, schedule_kind, date(TODAY.year, 1, 1))
+    return PARENTS[f"parent{number}_email"]
+
+
+def run_once():
+    return asyncio.run(custody_scheduler.run_once())
+
+
+def test_uploaded_agreement():
+    print("\n" + "=" * 60)
+    print("Testing Top-Up of Calendars From Uploaded Agreements")
+    print("=" * 60)
+
+    # The upload pipeline generates from the parse without saving custodyAgreement;
+    # a saved agreement with another schedule must not take over the extension
+    db.families.insert_one({"id": "sched-upload", **PARENTS})
+    db.families.insert_one({"id": "sched-mismatch", **PARENTS, "custodyAgreement": {"custodySchedule": "Week on, week off"}})
+    calendar_generator.generate_custody_events("sched-upload", {"custodySchedule": "2-2-3"})
+    calendar_generator.generate_custody_events("sched-mismatch", {"custodySchedule": "2-2-3"})
+    upload_through = shorten_horizon("sched-upload", 30)
+    mismatch_through = shorten_horizon("sched-mismatch", 30)
+
+    run_once()
+    upload_after = horizon("sched-upload")
+    new_days = [upload_through + timedelta(days=offset) for offset in range(1, custody_scheduler.BATCH_DAYS + 1)]
+    print(f"  upload horizon: {upload_through} -> {upload_after.get('through')} ({upload_after.get('schedule')})")
+    return report([
+        ("Generation records the schedule with the horizon", upload_after.get("schedule") == "2-2-3"),
+        ("Family without a saved agreement is extended",
+         upload_after.get("through") == (upload_through + timedelta(days=custody_scheduler.BATCH_DAYS)).isoformat()),
+        ("New days follow the generating schedule",
+         all(parent_on("sched-upload", day) == expected_parent(day, "2-2-3") for day in new_days)),
+        ("Extension ignores a saved agreement with another schedule",
+         horizon("sched-mismatch").get("through") > mismatch_through.isoformat()
+         and all(parent_on("sched-mismatch", day) == expected_parent(day, "2-2-3") for day in new_days)),
+    ])
+
+
+def test_saved_agreement():
+    print("\n" + "=" * 60)
+    print("Testing Top-Up of Families With a Saved Agreement")
+    print("=" * 60)
+
+    agreement = {"custodySchedule": "Week on, week off"}
+    db.families.insert_one({"id": "sched-saved", **PARENTS, "custodyAgreement": agreement})
+    calendar_generator.generate_custody_events("sched-saved", agreement)
+    saved_through = shorten_horizon("sched-saved", 60)
+
+    # Generated before horizons were recorded: only the custody days exist
+    legacy_id = db.families.insert_one({"id": "sched-legacy", **PARENTS, "custodyAgreement": agreement}).inserted_id
+    legacy_through = TODAY + timedelta(days=10)
+    db.events.insert_many([
+        {"family_id": str(legacy_id), "type": "custody", "title": "Custody", "parent": PARENTS["parent1_email"],
+         "date": datetime.combine(TODAY + timedelta(days=offset), datetime.min.time())}
+        for offset in range(11)
+    ])
+
+    run_once()
+    print(f"  saved horizon: {saved_through} -> {horizon('sched-saved').get('through')}")
+    print(f"  legacy horizon: {legacy_through} -> {horizon('sched-legacy').get('through')}")
+    return report([
+        ("Family with a saved agreement is extended", horizon("sched-saved").get("through") > saved_through.isoformat()),
+        ("Family without a recorded horizon is extended", horizon("sched-legacy").get("through") > legacy_through.isoformat()),
+        ("Its horizon records the agreement's schedule", horizon("sched-legacy").get("schedule") == "week-on-week-off"),
+    ])
+
+
+def test_skipped():
+    print("\n" + "=" * 60)
+    print("Testing Families That Are Not Topped Up")
+    print("=" * 60)
+
+    db.families.insert_one({"id": "sched-full", **PARENTS})
+    db.families.insert_one({"id": "sched-single", "parent1_email": "a@example.com",
+                            "custodyHorizon": {"through": TODAY.isoformat(), "referenceDate": date(TODAY.year, 1, 1).isoformat(),
+                                               "schedule": "2-2-3"}})
+    calendar_generator.generate_custody_events("sched-full", {"custodySchedule": "2-2-3"})
+    full_through = horizon("sched-full").get("through")
+
+    query = custody_scheduler._short_horizon_query(TODAY)
+    candidates = {family.get("id") for family in db.families.find(query)}
+    run_once()
+    return report([
+        ("Family with a full year is not a candidate", "sched-full" not in candidates),
+        ("Family with one parent is not a candidate", "sched-single" not in candidates),
+        ("Full horizon is unchanged", horizon("sched-full").get("through") == full_through),
+    ])
+
+
+def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 CUSTODY SCHEDULER TEST SUITE")
+    print("=" * 60)
+
+    custody_scheduler.FAMILY_SPACING_SECONDS = 0
+    total_passed = 0
+    total_failed = 0
+    for test in (test_uploaded_agreement, test_saved_agreement, test_skipped):
+        p, f = test()
+        total_passed += p
+        total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
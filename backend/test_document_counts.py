@@ -0,0 +1,107 @@
+"""
+Test Suite for Document Counts
+
+Tests:
+1. Families with documents from before the counters are counted on first read
+2. Uploads and deletes adjust the counters
+3. Default folders sum their types; custom folders count their category
+
+Runs on the in-memory database.
+"""
+
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from services import document_counts
+
+FAMILY_ID = "counts-family"
+LEGAL_TYPES = ("custody-agreement", "court-order", "financial")
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def add_document(document_type, custom_category=None, counted=True):
+    db.documents.insert_one({"family_id": FAMILY_ID, "type": document_type, "custom_category": custom_category})
+    if counted:
+        document_counts.record_added(FAMILY_ID, document_type, custom_category)
+
+
+def test_backfill():
+    print("\n" + "=" * 60)
+    print("Testing Backfill of Existing Documents")
+    print("=" * 60)
+
+    for document_type, category in [("court-order", None), ("financial", None), ("school", None), ("other", "trips")]:
+        add_document(document_type, category, counted=False)
+    counts = document_counts.get_counts(FAMILY_ID)
+    print(f"  {counts}")
+    ready = db.document_counts.find_one({"family_id": FAMILY_ID, "key": document_counts.READY_KEY})
+    return report([
+        ("Legal folder counts both legal types", document_counts.folder_count(counts, LEGAL_TYPES) == 2),
+        ("School folder counted", document_counts.folder_count(counts, ("school",)) == 1),
+        ("Custom folder counted by category", document_counts.folder_count(counts, custom_category="trips") == 1),
+        ("Family is marked as counted", ready is not None),
+    ])
+
+
+def test_updates():
+    print("\n" + "=" * 60)
+    print("Testing Upload and Delete Updates")
+    print("=" * 60)
+
+    backfills = document_counts.stats()["backfills"]
+    add_document("custody-agreement")
+    add_document("other", "trips")
+    db.documents.delete_one({"family_id": FAMILY_ID, "type": "school"})
+    document_counts.record_removed(FAMILY_ID, "school")
+    counts = document_counts.get_counts(FAMILY_ID)
+    print(f"  {counts}")
+    return report([
+        ("Upload increments its folder", document_counts.folder_count(counts, LEGAL_TYPES) == 3),
+        ("Custom upload increments its folder", document_counts.folder_count(counts, custom_category="trips") == 2),
+        ("Delete decrements its folder", document_counts.folder_count(counts, ("school",)) == 0),
+        ("Counted family is not recounted", document_counts.stats()["backfills"] == backfills),
+        ("Rebuild agrees with the counters", document_counts.rebuild(FAMILY_ID) == counts),
+    ])
+
+
+def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 DOCUMENT COUNTS TEST SUITE")
+    print("=" * 60)
+
+    total_passed = 0
+    total_failed = 0
+    for test in (test_backfill, test_updates):
+        p, f = test()
+        total_passed += p
+        total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
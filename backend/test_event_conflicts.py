@@ -0,0 +1,142 @@
+"""
+Test Suite for the Event Conflict Index
+
+Tests:
+1. Conflicts are classified by event type and parent; an event, with or
+   without an `id`, never conflicts with itself
+2. Events added, moved and removed in place are found (or no longer found)
+3. All-day spans end exactly at midnight; a timed event defaults to one hour
+
+Runs on the in-memory database.
+"""
+
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from services import event_conflicts
+
+DAY = datetime(2025, 3, 10)
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def event(event_id, when, event_type="personal", parent=None, title=None):
+    return {"id": event_id, "date": when, "type": event_type, "parent": parent, "title": title or event_id}
+
+
+def kinds(family_id, candidate):
+    return sorted(conflict["kind"] for conflict in event_conflicts.find_conflicts(family_id, candidate))
+
+
+def test_classification():
+    print("\n" + "=" * 60)
+    print("Testing Conflict Classification")
+    print("=" * 60)
+
+    family_id = "conflicts-classify"
+    db.events.insert_one({"family_id": family_id, **event("custody-mom", DAY, "custody", "mom")})
+    db.events.insert_one({"family_id": family_id, **event("dentist", DAY.replace(hour=15), parent="mom")})
+    # Events created before the `id` field only have _id
+    legacy = {"family_id": family_id, **event(None, DAY.replace(day=DAY.day + 2, hour=18), parent="mom", title="Recital")}
+    del legacy["id"]
+    db.events.insert_one(legacy)
+    legacy = db.events.find_one({"title": "Recital"})
+    print(f"  {event_conflicts.find_conflicts(family_id, event('c1', DAY, 'custody', 'dad'))[0]['message']}")
+    return report([
+        ("Custody for the other parent overlaps (and covers their event)", kinds(family_id, event("c1", DAY, "custody", "dad")) == ["custody-overlap", "other-parent-time"]),
+        ("Second custody event for the same parent is a duplicate", kinds(family_id, event("c2", DAY, "custody", "mom")) == ["duplicate-custody"]),
+        ("Other parent's event during custody time", kinds(family_id, event("e1", DAY.replace(hour=9), parent="dad")) == ["other-parent-time"]),
+        ("Custody parent's own event is not a conflict", kinds(family_id, event("e2", DAY.replace(hour=9), parent="mom")) == []),
+        ("Overlapping timed events", kinds(family_id, event("e3", DAY.replace(hour=15, minute=30), parent="mom")) == ["overlap"]),
+        ("An event is not in conflict with itself", kinds(family_id, event("dentist", DAY.replace(hour=15), parent="mom")) == []),
+        ("Nor is a legacy event that only has _id", kinds(family_id, legacy) == []),
+    ])
+
+
+def test_index_updates():
+    print("\n" + "=" * 60)
+    print("Testing In-Place Index Updates")
+    print("=" * 60)
+
+    family_id = "conflicts-updates"
+    probe = event("probe", DAY.replace(hour=10))
+    event_conflicts.record_event(family_id, event("meeting", DAY.replace(hour=10)))
+    event_conflicts.record_event(family_id, event("lunch", DAY.replace(hour=12)))
+    added = kinds(family_id, probe) == ["overlap"]
+
+    event_conflicts.record_event(family_id, event("meeting", DAY.replace(hour=17)))
+    moved_away = kinds(family_id, probe) == []
+    moved_to = kinds(family_id, event("probe", DAY.replace(hour=17, minute=30))) == ["overlap"]
+
+    event_conflicts.remove_event(family_id, "lunch")
+    removed = kinds(family_id, event("probe", DAY.replace(hour=12))) == []
+    index = event_conflicts._indexes[family_id]
+    print(f"  index: {[event_id for _, event_id in index.starts]}")
+    return report([
+        ("Recorded event is found", added),
+        ("Moved event is gone from its old time", moved_away),
+        ("Moved event is found at its new time", moved_to),
+        ("Removed event is gone", removed),
+        ("Index stays sorted with one entry per event", index.starts == sorted(index.starts) and len(index.starts) == len(index.entries) == 1),
+    ])
+
+
+def test_span_boundaries():
+    print("\n" + "=" * 60)
+    print("Testing Span Boundaries")
+    print("=" * 60)
+
+    family_id = "conflicts-spans"
+    next_day = DAY.replace(day=DAY.day + 1)
+    event_conflicts.record_event(family_id, event("all-day", DAY))
+    event_conflicts.record_event(family_id, event("call", next_day.replace(hour=10)))
+    return report([
+        ("All-day event overlaps its last minute", kinds(family_id, event("p1", DAY.replace(hour=23, minute=59))) == ["overlap"]),
+        ("All-day event ends at midnight (MAX_SPAN)", kinds(family_id, event("p2", next_day.replace(minute=1))) == []),
+        ("Span of a timed event defaults to one hour", event_conflicts.event_span(event("x", DAY.replace(hour=10)))[1] == DAY.replace(hour=11)),
+        ("Timed event overlaps within its hour", kinds(family_id, event("p3", next_day.replace(hour=10, minute=59))) == ["overlap"]),
+        ("Timed event ends after one hour", kinds(family_id, event("p4", next_day.replace(hour=11))) == []),
+    ])
+
+
+def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 EVENT CONFLICT INDEX TEST SUITE")
+    print("=" * 60)
+
+    total_passed = 0
+    total_failed = 0
+    for test in (test_classification, test_index_updates, test_span_boundaries):
+        p, f = test()
+        total_passed += p
+        total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,233 @@
+"""
+Test Suite for Serving Document and Receipt Files
+
+Tests:
+1. Blob-stored files: strong ETag, 206 for Range requests, 304 for
+   If-None-Match and If-Modified-Since, and `immutable` only for a URL
+   whose ?v= matches the content hash
+2. Compressed blobs are sent whole (accept-ranges: none)
+3. Files stored before the blob store are served from their legacy path
+4. Receipts are served the same way
+
+Runs on the in-memory database; files are written to a temporary directory.
+"""
+
+import base64
+import hashlib
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from email.utils import formatdate
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import db
+from models import User
+from routers import documents, expenses
+from routers.auth import get_current_user
+from services import blob_store, file_storage
+
+EMAIL = "files-parent@example.com"
+PDF = b"%PDF-1.4 " + os.urandom(4096)
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.include_router(documents.router)
+    app.include_router(expenses.router)
+    app.dependency_overrides[get_current_user] = lambda: User(
+        firstName="Test", lastName="Parent", email=EMAIL, password="x"
+    )
+    return TestClient(app)
+
+
+def upload(client, file_name, content):
+    response = client.post("/api/v1/documents/upload", json={
+        "name": file_name, "type": "other", "file_name": file_name,
+        "file_content": base64.b64encode(content).decode(),
+    })
+    return response.json()
+
+
+def base_url(url):
+    return url.split("?", 1)[0]
+
+
+def test_blob_file(client):
+    print("\n" + "=" * 60)
+    print("Testing Blob-Stored Files")
+    print("=" * 60)
+
+    document = upload(client, "decree.pdf", PDF)
+    url = document["fileUrl"]
+    plain = client.get(base_url(url))
+    etag = plain.headers.get("etag")
+    sha256 = db.documents.find_one({"id": document["id"]})["sha256"]
+    versioned = client.get(url)
+    wrong_version = client.get(base_url(url) + "?v=0000000000000000")
+    ranged = client.get(base_url(url), headers={"Range": "bytes=0-9"})
+    by_etag = client.get(base_url(url), headers={"If-None-Match": etag})
+    other_etag = client.get(base_url(url), headers={"If-None-Match": '"other"'})
+    last_modified = plain.headers.get("last-modified")
+    by_date = client.get(base_url(url), headers={"If-Modified-Since": last_modified})
+    older = formatdate((datetime.now() - timedelta(days=2)).timestamp(), usegmt=True)
+    by_older_date = client.get(base_url(url), headers={"If-Modified-Since": older})
+    print(f"  {url}: {plain.status_code}, etag {etag}, {versioned.headers.get('cache-control')}")
+    return report([
+        ("Listed URL carries the content version", url.endswith(f"?v={sha256[:documents.FILE_VERSION_CHARS]}")),
+        ("File is served whole", plain.status_code == 200 and plain.content == PDF),
+        ("ETag is the strong content hash", etag == f'"{sha256}"'),
+        ("Unversioned URL must be revalidated", plain.headers.get("cache-control") == "private, no-cache"),
+        ("Versioned URL is immutable", "immutable" in versioned.headers.get("cache-control", "")),
+        ("Mismatched version is not immutable", "immutable" not in wrong_version.headers.get("cache-control", "")),
+        ("Range request gets 206 with the slice",
+         ranged.status_code == 206 and ranged.content == PDF[:10] and ranged.headers.get("content-range") == f"bytes 0-9/{len(PDF)}"),
+        ("Matching If-None-Match gets 304", by_etag.status_code == 304 and not by_etag.content and by_etag.headers.get("etag") == etag),
+        ("Other If-None-Match gets the file", other_etag.status_code == 200),
+        ("Current If-Modified-Since gets 304", by_date.status_code == 304),
+        ("Older If-Modified-Since gets the file", by_older_date.status_code == 200),
+    ])
+
+
+def test_compressed_blob(client):
+    print("\n" + "=" * 60)
+    print("Testing Compressed Blobs")
+    print("=" * 60)
+
+    text = ("Pickup at 6pm on Fridays; the children return Sunday evening.\n" * 200).encode()
+    document = upload(client, "notes.txt", text)
+    url = base_url(document["fileUrl"])
+    sha256 = db.documents.find_one({"id": document["id"]})["sha256"]
+    compressed = blob_store.get(sha256).compression == "zstd"
+    ranged = client.get(url, headers={"Range": "bytes=0-9"})
+    by_etag = client.get(url, headers={"If-None-Match": f'"{sha256}"'})
+    if not compressed:
+        print("  ⚠️  zstandard not installed; the file is stored uncompressed")
+    return report([
+        ("Text is stored compressed when zstd is available", compressed == blob_store.ZSTD_SUPPORT),
+        ("Range request gets the whole file" if compressed else "Range request gets 206",
+         (ranged.status_code, ranged.content) == ((200, text) if compressed else (206, text[:10]))),
+        ("Ranges are not offered" if compressed else "Ranges are offered",
+         ranged.headers.get("accept-ranges") == ("none" if compressed else "bytes")),
+        ("Original bytes are sent with their name", not compressed or 'filename="notes.txt"' in ranged.headers.get("content-disposition", "")),
+        ("Matching If-None-Match gets 304", by_etag.status_code == 304),
+    ])
+
+
+def test_legacy_file(client, family_id):
+    print("\n" + "=" * 60)
+    print("Testing Files Stored Before the Blob Store")
+    print("=" * 60)
+
+    document_id = str(uuid.uuid4())
+    with open(os.path.join(documents.DOCUMENTS_DIR, f"{document_id}.pdf"), "wb") as f:
+        f.write(PDF)
+    db.documents.insert_one({
+        "id": document_id, "family_id": family_id, "file_name": "old.pdf", "type": "other",
+        "file_url": f"/api/v1/documents/files/{document_id}.pdf", "created_at": datetime.utcnow(),
+    })
+    url = f"/api/v1/documents/files/{document_id}.pdf"
+    plain = client.get(url)
+    etag = plain.headers.get("etag")
+    ranged = client.get(url, headers={"Range": "bytes=10-19"})
+    by_etag = client.get(url, headers={"If-None-Match": etag or ""})
+    missing = client.get(f"/api/v1/documents/files/{uuid.uuid4()}.pdf")
+    print(f"  etag {etag}")
+    return report([
+        ("Legacy file is served", plain.status_code == 200 and plain.content == PDF),
+        ("Its ETag comes from the file", bool(etag)),
+        ("It is never immutable", "immutable" not in plain.headers.get("cache-control", "")),
+        ("Range request gets 206", ranged.status_code == 206 and ranged.content == PDF[10:20]),
+        ("Matching If-None-Match gets 304", by_etag.status_code == 304),
+        ("Unknown document is 404", missing.status_code == 404),
+    ])
+
+
+def test_receipts(client, family_id):
+    print("\n" + "=" * 60)
+    print("Testing Receipts")
+    print("=" * 60)
+
+    image = b"\xff\xd8\xff\xe0" + os.urandom(2048)
+    expense = client.post("/api/v1/expenses", json={
+        "description": "Shoes", "amount": 40.0, "category": "clothing", "date": "2025-03-01",
+        "receipt_file_name": "shoes.jpg", "receipt_content": base64.b64encode(image).decode(),
+    }).json()
+    url = expense["receiptUrl"]
+    versioned = client.get(url)
+    etag = versioned.headers.get("etag")
+    ranged = client.get(base_url(url), headers={"Range": "bytes=0-3"})
+    by_etag = client.get(base_url(url), headers={"If-None-Match": etag})
+
+    expense_id = str(uuid.uuid4())
+    with open(os.path.join(file_storage.RECEIPTS_DIR, f"{expense_id}.jpg"), "wb") as f:
+        f.write(image)
+    db.expenses.insert_one({"id": expense_id, "family_id": family_id, "receipt_file_name": "old.jpg", "created_at": datetime.utcnow()})
+    legacy = client.get(f"/api/v1/expenses/receipts/{expense_id}.jpg")
+    print(f"  {url}: {versioned.status_code}, {versioned.headers.get('cache-control')}")
+    return report([
+        ("Receipt is served with its hash as ETag", versioned.status_code == 200 and versioned.content == image and etag == f'"{hashlib.sha256(image).hexdigest()}"'),
+        ("Versioned receipt URL is immutable", "immutable" in versioned.headers.get("cache-control", "")),
+        ("Range request gets 206", ranged.status_code == 206 and ranged.content == image[:4]),
+        ("Matching If-None-Match gets 304", by_etag.status_code == 304),
+        ("Legacy receipt is served from its path", legacy.status_code == 200 and legacy.content == image),
+    ])
+
+
+def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 FILE SERVING TEST SUITE")
+    print("=" * 60)
+
+    total_passed = 0
+    total_failed = 0
+    with tempfile.TemporaryDirectory(prefix="files-") as directory:
+        blob_store.BLOBS_DIR = os.path.join(directory, "blobs")
+        blob_store.INCOMING_DIR = os.path.join(blob_store.BLOBS_DIR, "incoming")
+        documents.DOCUMENTS_DIR = os.path.join(directory, "documents")
+        file_storage.RECEIPTS_DIR = os.path.join(directory, "receipts")
+        os.makedirs(documents.DOCUMENTS_DIR)
+        os.makedirs(file_storage.RECEIPTS_DIR)
+        family_id = str(db.families.insert_one({"parent1_email": EMAIL}).inserted_id)
+        client = make_client()
+        for test in (test_blob_file, test_compressed_blob):
+            p, f = test(client)
+            total_passed += p
+            total_failed += f
+        for test in (test_legacy_file, test_receipts):
+            p, f = test(client, family_id)
+            total_passed += p
+            total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
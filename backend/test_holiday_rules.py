@@ -0,0 +1,135 @@
+"""
+Test Suite for the Holiday Rules Engine
+
+Tests:
+1. Table rows, clauses and winter break halves compile to the right parent
+2. Holidays that don't name a parent are left out, not guessed
+3. Override tables alternate by year, with holidays inside winter break
+   taking precedence and the break spilling into January
+
+No database or API key needed.
+"""
+
+import os
+import sys
+from datetime import date
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import holiday_rules
+
+TABLE_SCHEDULE = """Holiday            Odd Years    Even Years
+Thanksgiving (Thurs–Sun)    Parent 1    Parent 2
+Christmas Eve    Parent 2    Parent 1
+"""
+CLAUSE_SCHEDULE = (
+    "Easter weekend: Parent 1 in even years, Parent 2 in odd years. "
+    "Winter Break: First half: Parent 2, second half: Parent 1, alternating each year."
+)
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def by_name(rules):
+    return {rule.name: rule for rule in rules}
+
+
+def test_compile():
+    print("\n" + "=" * 60)
+    print("Testing Rule Compilation")
+    print("=" * 60)
+
+    table = by_name(holiday_rules.compile_holiday_rules(TABLE_SCHEDULE))
+    clauses = by_name(holiday_rules.compile_holiday_rules(CLAUSE_SCHEDULE))
+    for name, rule in {**table, **clauses}.items():
+        print(f"  {name}: {rule.even_year_parent} in even years, {rule.length} day(s)")
+    return report([
+        ("Table row reads the even-years column", table["Thanksgiving"].even_year_parent == "parent2"),
+        ("Thanksgiving (Thurs–Sun) covers four days", table["Thanksgiving"].length == 4),
+        ("Second table row is read on its own line", table["Christmas Eve"].even_year_parent == "parent1"),
+        ("Clause names the even-year parent", clauses["Easter"].even_year_parent == "parent1"),
+        ("Easter weekend starts on Saturday", (clauses["Easter"].offset, clauses["Easter"].length) == (-1, 2)),
+        ("Winter break first half goes to the named parent", clauses["Winter Break"].even_year_parent == "parent2"),
+    ])
+
+
+def test_unresolved():
+    print("\n" + "=" * 60)
+    print("Testing Holidays Without a Parent")
+    print("=" * 60)
+
+    partial = by_name(holiday_rules.compile_holiday_rules(
+        "Thanksgiving: Parent 1 in odd years. Halloween: as the parents agree."
+    ))
+    unnamed = holiday_rules.compile_holiday_rules("Holidays alternate, including Thanksgiving and July 4th.")
+    bare = by_name(holiday_rules.compile_holiday_rules("The parents will share alternating holidays."))
+    print(f"  partial: {sorted(partial)}; bare: {len(bare)} default holidays")
+    return report([
+        ("Holiday with a parent is compiled", partial["Thanksgiving"].even_year_parent == "parent2"),
+        ("Holiday without a parent is left out", "Halloween" not in partial),
+        ("Named holidays without parents don't fall back to the default list", unnamed == ()),
+        ("Bare 'alternating holidays' uses the default list", set(bare) == set(holiday_rules.DEFAULT_HOLIDAYS)),
+        ("Default list splits holidays between the parents",
+         {rule.even_year_parent for rule in bare.values()} == set(holiday_rules.PARENT_KEYS)),
+    ])
+
+
+def test_overrides():
+    print("\n" + "=" * 60)
+    print("Testing Override Tables")
+    print("=" * 60)
+
+    rules = holiday_rules.compile_holiday_rules(TABLE_SCHEDULE + "Winter Break: first half Parent 1, then Parent 2.\n")
+    overrides_2024 = holiday_rules.holiday_overrides(rules, 2024)
+    overrides_2025 = holiday_rules.holiday_overrides(rules, 2025)
+    family = {"custodyAgreement": {"holidaySchedule": TABLE_SCHEDULE}}
+    thanksgiving_2025 = [day for day, (_, name) in overrides_2025.items() if name == "Thanksgiving"]
+    print(f"  Thanksgiving 2025: {min(thanksgiving_2025)} – {max(thanksgiving_2025)}")
+    return report([
+        ("Thanksgiving 2025 runs Thursday to Sunday", sorted(thanksgiving_2025) == [date(2025, 11, d) for d in range(27, 31)]),
+        ("Even and odd years alternate", overrides_2024[date(2024, 11, 28)][0] == "parent2" and overrides_2025[date(2025, 11, 27)][0] == "parent1"),
+        ("Winter break halves", overrides_2024[date(2024, 12, 20)][0] == "parent1" and overrides_2024[date(2024, 12, 30)][0] == "parent2"),
+        ("Christmas Eve takes precedence inside the break", overrides_2025[date(2025, 12, 24)] == ("parent2", "Christmas Eve")),
+        ("Winter break spills into January", overrides_2025[date(2025, 1, 2)] == ("parent2", "Winter Break")),
+        ("Families without a schedule have no overrides", len(holiday_rules.overrides_for_family({}, 2025)) == 0),
+        ("Family overrides come from its agreement", date(2025, 11, 27) in holiday_rules.overrides_for_family(family, 2025)),
+    ])
+
+
+def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 HOLIDAY RULES TEST SUITE")
+    print("=" * 60)
+
+    total_passed = 0
+    total_failed = 0
+    for test in (test_compile, test_unresolved, test_overrides):
+        p, f = test()
+        total_passed += p
+        total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
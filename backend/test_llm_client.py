@@ -0,0 +1,186 @@
+"""
+Test Suite for the Shared LLM Client
+
+Tests:
+1. Parsers share one OpenAI client (and its connection pool)
+2. 429 / 5xx responses are retried with backoff; 4xx errors are not
+3. Identical in-flight requests are coalesced into one HTTP call
+4. The global concurrency limit holds across a burst of distinct requests
+
+Runs without an API key against llm_stub_server.py.
+"""
+
+import asyncio
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Small limits so the tests run quickly; read when llm_client is imported
+os.environ.setdefault("LLM_RETRY_BASE_SECONDS", "0.05")
+os.environ.setdefault("LLM_GLOBAL_CONCURRENCY", "3")
+
+import openai
+
+from llm_stub_server import start_in_thread
+from services import llm_client
+from services.document_parser import DocumentParser, OPENAI_MODEL
+
+
+def messages_for(text: str):
+    return [{"role": "user", "content": f"Document text:\n{text}"}]
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+async def test_shared_client(base_url: str):
+    print("\n" + "=" * 60)
+    print("Testing Shared Client")
+    print("=" * 60)
+
+    first, second = DocumentParser(api_key="stub"), DocumentParser(api_key="stub")
+    await first.parse_with_ai("The parents follow a 2-2-3 schedule.")
+    await second.parse_with_ai("Joint legal custody with alternating holidays.")
+    state = llm_client._state()
+    return report([
+        ("Both parsers use the AI path", first._uses_ai() and second._uses_ai()),
+        ("One OpenAI client for both parsers", len(state.clients) == 1),
+        ("SDK retries are disabled", all(client.max_retries == 0 for client in state.clients.values())),
+    ])
+
+
+async def test_retries(server):
+    print("\n" + "=" * 60)
+    print("Testing Retry and Backoff")
+    print("=" * 60)
+
+    handler = server.RequestHandlerClass
+    client = llm_client.LLMClient("stub")
+
+    handler.request_count, handler.fail_with = 0, [429, 503]
+    content = await client.complete(OPENAI_MODEL, messages_for("2-2-3 schedule, retry test"))
+    retried = handler.request_count
+
+    handler.request_count, handler.fail_with, handler.retry_after = 0, [429], 0.2
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await client.complete(OPENAI_MODEL, messages_for("2-2-3 schedule, retry-after test"))
+    waited = loop.time() - started
+    handler.retry_after = None
+
+    handler.request_count, handler.fail_with = 0, [400]
+    try:
+        await client.complete(OPENAI_MODEL, messages_for("bad request test"))
+        rejected = False
+    except openai.BadRequestError:
+        rejected = True
+    not_retried = handler.request_count
+
+    handler.request_count, handler.fail_with = 0, [500] * (llm_client.LLM_MAX_RETRIES + 1)
+    try:
+        await client.complete(OPENAI_MODEL, messages_for("persistent outage test"))
+        gave_up = False
+    except openai.InternalServerError:
+        gave_up = True
+    attempts = handler.request_count
+
+    print(f"  429+503 then success: {retried} requests; 5xx outage: {attempts} requests")
+    return report([
+        ("429 and 503 are retried until success", retried == 3 and "2-2-3" in content),
+        ("Retry-After is honoured", waited >= 0.2),
+        ("400 is raised without retrying", rejected and not_retried == 1),
+        ("Gives up after LLM_MAX_RETRIES", gave_up and attempts == llm_client.LLM_MAX_RETRIES + 1),
+    ])
+
+
+async def test_coalescing(server):
+    print("\n" + "=" * 60)
+    print("Testing Request Coalescing")
+    print("=" * 60)
+
+    handler = server.RequestHandlerClass
+    handler.request_count, handler.delay = 0, 0.3
+    client = llm_client.LLMClient("stub")
+    coalesced_before = llm_client.stats()["coalesced"]
+
+    same = messages_for("Joint legal custody, 2-2-3 schedule.")
+    results = await asyncio.gather(*(client.complete(OPENAI_MODEL, same) for _ in range(5)))
+    identical_requests = handler.request_count
+
+    handler.request_count = 0
+    await asyncio.gather(client.complete(OPENAI_MODEL, same), client.complete(OPENAI_MODEL, same, temperature=0.1))
+    distinct_requests = handler.request_count
+    handler.delay = 0.0
+
+    return report([
+        ("Five identical prompts send one request", identical_requests == 1),
+        ("Every caller gets the reply", len(set(results)) == 1 and "2-2-3" in results[0]),
+        ("Coalesced calls are counted", llm_client.stats()["coalesced"] - coalesced_before == 4),
+        ("Different parameters are not coalesced", distinct_requests == 2),
+        ("Nothing left in flight", not llm_client._state().in_flight),
+    ])
+
+
+async def test_concurrency_limit(server):
+    print("\n" + "=" * 60)
+    print("Testing Global Concurrency Limit")
+    print("=" * 60)
+
+    handler = server.RequestHandlerClass
+    handler.request_count, handler.max_in_flight, handler.delay = 0, 0, 0.1
+    # Separate parsers, as with simultaneous uploads
+    parsers = [DocumentParser(api_key="stub") for _ in range(12)]
+    await asyncio.gather(*(parser.parse_with_ai(f"Upload {i}: 2-2-3 schedule.") for i, parser in enumerate(parsers)))
+    handler.delay = 0.0
+
+    print(f"  {handler.request_count} requests, max {handler.max_in_flight} in flight")
+    return report([
+        ("All uploads were sent", handler.request_count == 12),
+        ("At most LLM_GLOBAL_CONCURRENCY in flight", handler.max_in_flight <= llm_client.LLM_GLOBAL_CONCURRENCY),
+    ])
+
+
+async def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 LLM CLIENT TEST SUITE")
+    print("=" * 60)
+
+    server, base_url = start_in_thread()
+    os.environ["OPENAI_BASE_URL"] = base_url
+    total_passed = 0
+    total_failed = 0
+    try:
+        for test, arg in ((test_shared_client, base_url), (test_retries, server), (test_coalescing, server), (test_concurrency_limit, server)):
+            p, f = await test(arg)
+            total_passed += p
+            total_failed += f
+    finally:
+        await llm_client.close()
+        server.shutdown()
+        os.environ.pop("OPENAI_BASE_URL", None)
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,187 @@
+"""
+Test Suite for the OCR Fallback on Scanned PDFs
+
+Tests:
+1. A scanned (image-only) PDF has no text layer
+2. Pages render to images with a stable page-hash cache key
+3. The on-disk OCR cache round-trips
+4. Scanned PDFs are read through OCR in the extraction pool, and a second
+   upload is served from the page cache (needs pytesseract + tesseract;
+   without them the upload must fail with the scanned-document error)
+5. Workers are sent a temporary copy of the PDF, not its bytes, and a page
+   that fails to OCR is skipped instead of failing the upload
+"""
+
+import asyncio
+import io
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the test's cache entries out of the real OCR cache
+os.environ["OCR_CACHE_DIR"] = tempfile.mkdtemp(prefix="ocr-cache-test-")
+
+from PIL import Image, ImageDraw, ImageFont
+
+from services import extraction_pool, ocr
+from services.document_parser import extract_pdf_pages, has_text_layer
+
+SCANNED_PAGES = [
+    ["MARITAL SETTLEMENT AGREEMENT", "Between Jane Doe (Parent 1) and John Doe (Parent 2)."],
+    ["ARTICLE 1 - CUSTODY", "The parents share joint legal custody.", "ARTICLE 2 - PARENTING TIME", "The parents follow a 2-2-3 rotating schedule."],
+    ["ARTICLE 3 - EXPENSES", "Expenses are split 50/50.", "ARTICLE 4 - PROPERTY", "The house is sold."],
+]
+
+
+def build_scanned_pdf(pages) -> bytes:
+    """An image-only PDF, like a scanner produces: each page is a picture of its text."""
+    font = ImageFont.load_default(size=28)
+    images = []
+    for lines in pages:
+        image = Image.new("L", (1275, 1650), 255)  # Letter size at 150 dpi
+        draw = ImageDraw.Draw(image)
+        for number, line in enumerate(lines):
+            draw.text((100, 120 + number * 60), line, fill=0, font=font)
+        images.append(image)
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="PDF", save_all=True, append_images=images[1:], resolution=150)
+    return buffer.getvalue()
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+async def test_scan_detection(pdf: bytes):
+    print("\n" + "=" * 60)
+    print("Testing Scan Detection and Page Rendering")
+    print("=" * 60)
+
+    first, again, second = ocr.render_page(pdf, 0), ocr.render_page(pdf, 0), ocr.render_page(pdf, 1)
+    key = ocr.page_key(first)
+    ocr.put_cached(key, "cached page text")
+    return report([
+        ("Scanned PDF has no text layer", not has_text_layer(extract_pdf_pages(pdf))),
+        ("Page renders to an image", first.size[0] > 1000),
+        ("Same page, same cache key", ocr.page_key(again) == key),
+        ("Different page, different key", ocr.page_key(second) != key),
+        ("Cache round-trips", ocr.get_cached(key) == "cached page text" and ocr.get_cached("0" * 64) is None),
+    ])
+
+
+async def test_ocr_extraction(pdf: bytes):
+    print("\n" + "=" * 60)
+    print("Testing OCR Extraction in the Worker Pool")
+    print("=" * 60)
+
+    if not ocr.available():
+        print("⚠️  pytesseract/tesseract not installed - checking the scanned-document error instead")
+        try:
+            await extraction_pool.extract_text(pdf, "pdf")
+            message = ""
+        except ValueError as e:
+            message = str(e)
+        return report([("Scan without OCR fails with a clear error", "scanned/image-based" in message)])
+
+    before = extraction_pool.stats()
+    text = await extraction_pool.extract_text(pdf, "pdf")
+    middle = extraction_pool.stats()
+    again = await extraction_pool.extract_text(pdf, "pdf")
+    after = extraction_pool.stats()
+    print(f"  OCR'd {middle['ocr_pages'] - before['ocr_pages']} pages; "
+          f"second upload: {after['ocr_cache_hits'] - middle['ocr_cache_hits']} cache hits")
+    return report([
+        ("Custody text is read from the scan", "2-2-3" in text and "custody" in text.lower()),
+        ("OCR ran once per page", middle["ocr_pages"] - before["ocr_pages"] <= len(SCANNED_PAGES)),
+        ("Second upload is served from the page cache", after["ocr_cache_hits"] - middle["ocr_cache_hits"] == middle["ocr_pages"] - before["ocr_pages"]),
+        ("Same text both times", again == text),
+    ])
+
+
+async def test_ocr_failures(pdf: bytes):
+    print("\n" + "=" * 60)
+    print("Testing OCR Worker Failures")
+    print("=" * 60)
+
+    sources = []
+
+    def flaky_ocr_page(source, page_number):
+        sources.append(source)
+        if page_number == 1 or not ok_pages:
+            raise RuntimeError("pdfium: failed to render page")
+        return " ".join(SCANNED_PAGES[page_number]), False
+
+    # Threads run the patched ocr_page; spawned workers would import the real one
+    available, ocr_page = ocr.available, ocr.ocr_page
+    extraction_pool.shutdown()
+    extraction_pool._pool = ThreadPoolExecutor(max_workers=2)
+    ocr.available, ocr.ocr_page = (lambda: True), flaky_ocr_page
+    try:
+        ok_pages = True
+        before = extraction_pool.stats()["ocr_failures"]
+        text = await extraction_pool.extract_text(pdf, "pdf")
+        failures = extraction_pool.stats()["ocr_failures"] - before
+        in_process = [text for text, _ in ocr.ocr_pdf_pages(pdf, len(SCANNED_PAGES))]
+        ok_pages = False
+        try:
+            await extraction_pool.extract_text(pdf, "pdf")
+            message = ""
+        except ValueError as e:
+            message = str(e)
+    finally:
+        ocr.available, ocr.ocr_page = available, ocr_page
+        extraction_pool.shutdown()
+
+    paths = {source for source in sources if isinstance(source, str)}
+    print(f"  OCR tasks were sent {sorted(paths)}")
+    return report([
+        ("Workers get a file path, not the PDF bytes", len(paths) == 2 and sum(isinstance(source, str) for source in sources) == 2 * len(SCANNED_PAGES)),
+        ("Temporary copies are removed", not any(os.path.exists(path) for path in paths)),
+        ("A failed page is skipped and the others are kept", "2-2-3" not in text and "Expenses" in text and failures == 1),
+        ("In-process OCR skips it too", len(in_process) == 2),
+        ("OCR failing on every page gives the scanned-document error", "scanned/image-based" in message),
+    ])
+
+
+async def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 OCR FALLBACK TEST SUITE")
+    print("=" * 60)
+
+    pdf = build_scanned_pdf(SCANNED_PAGES)
+    total_passed = 0
+    total_failed = 0
+    try:
+        for test in (test_scan_detection, test_ocr_extraction, test_ocr_failures):
+            p, f = await test(pdf)
+            total_passed += p
+            total_failed += f
+    finally:
+        extraction_pool.shutdown()
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,154 @@
+"""
+Test Suite for the Agreement Parse Cache
+
+Tests:
+1. Text and parse entries are read back by file hash, version and mode,
+   and missed when any of them changes
+2. Through the parsing pipeline: a repeated upload is served from the
+   cache, a parser or extractor version bump re-parses it, and refresh
+   bypasses the cached parse
+
+Runs on the in-memory database, with the pattern parser (no API key).
+"""
+
+import asyncio
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import document_parser, extraction_pool, parse_cache, parsing_pipeline
+from services.document_parser import DocumentParser
+
+AGREEMENT = (
+    "PARENTING PLAN\n\nThe parents share joint legal custody. Physical custody follows a "
+    "2-2-3 rotating schedule. Holidays alternate each year. Expenses are split 50/50.\n"
+)
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def extract_outcome(run):
+    return next(record.outcome for record in run.records if record.stage == "extract")
+
+
+async def test_keys():
+    print("\n" + "=" * 60)
+    print("Testing Cache Keys")
+    print("=" * 60)
+
+    digest = parse_cache.file_digest(b"cache keys agreement")
+    parsed = {"custodySchedule": "2-2-3", "parsedData": {"confidence": 0.9}}
+    parse_cache.put_parse(digest, "2/1", "patterns", parsed)
+    parse_cache.put_text(digest, "1", "agreement text")
+    hit = parse_cache.get_parse(digest, "2/1", "patterns")
+    hit["custodySchedule"] = "changed by the caller"
+
+    max_chars = parse_cache.MAX_TEXT_CHARS
+    parse_cache.MAX_TEXT_CHARS = 10
+    try:
+        parse_cache.put_text(digest, "huge", "x" * 11)
+    finally:
+        parse_cache.MAX_TEXT_CHARS = max_chars
+
+    parse_cache.ENABLED = False
+    try:
+        disabled = parse_cache.get_parse(digest, "2/1", "patterns")
+    finally:
+        parse_cache.ENABLED = True
+    print(f"  {parse_cache.stats()}")
+    return report([
+        ("Parse is read back by hash, version and mode", parse_cache.get_parse(digest, "2/1", "patterns") == parsed),
+        ("Callers get a copy, not the stored entry", parse_cache.get_parse(digest, "2/1", "patterns")["custodySchedule"] == "2-2-3"),
+        ("Another parser version misses", parse_cache.get_parse(digest, "3/1", "patterns") is None),
+        ("Another mode misses", parse_cache.get_parse(digest, "2/1", "ai-0123456789ab") is None),
+        ("Another file misses", parse_cache.get_parse(parse_cache.file_digest(b"other"), "2/1", "patterns") is None),
+        ("Text is read back by hash and extractor version", parse_cache.get_text(digest, "1") == "agreement text"),
+        ("Another extractor version misses", parse_cache.get_text(digest, "2") is None),
+        ("Oversized text is not cached", parse_cache.get_text(digest, "huge") is None),
+        ("Disabled cache is never read", disabled is None),
+        ("AI and pattern parsers use different modes",
+         DocumentParser(ai_provider="none")._parse_mode() == "patterns"
+         and (not document_parser.OPENAI_SUPPORT or DocumentParser(api_key="stub")._parse_mode().startswith("ai-"))),
+    ])
+
+
+async def test_pipeline():
+    print("\n" + "=" * 60)
+    print("Testing Cache Hits in the Parsing Pipeline")
+    print("=" * 60)
+
+    pipeline = parsing_pipeline.ParsingPipeline(parsing_pipeline.DEFAULT_STAGES)
+    parser = DocumentParser(ai_provider="none")
+    content = AGREEMENT.encode("utf-8")
+
+    first = await pipeline.run(parser, "txt", file_content=content)
+    again = await pipeline.run(parser, "txt", file_content=content)
+    refreshed = await pipeline.run(parser, "txt", file_content=content, refresh=True)
+
+    parser_version = document_parser.PARSER_VERSION
+    document_parser.PARSER_VERSION = parser_version + "-bumped"
+    try:
+        new_parser = await pipeline.run(parser, "txt", file_content=content)
+    finally:
+        document_parser.PARSER_VERSION = parser_version
+
+    extractor_version = document_parser.EXTRACTOR_VERSION
+    document_parser.EXTRACTOR_VERSION = extractor_version + "-bumped"
+    try:
+        new_extractor = await pipeline.run(parser, "txt", file_content=content)
+    finally:
+        document_parser.EXTRACTOR_VERSION = extractor_version
+
+    outcomes = [extract_outcome(run) for run in (first, again, refreshed, new_parser, new_extractor)]
+    print(f"  extract outcomes: {outcomes}")
+    return report([
+        ("First upload is extracted and parsed", outcomes[0] == "ok" and not first.cached),
+        ("Repeated upload is served from the cache", again.cached and again.parsed == first.parsed),
+        ("Refresh parses again from the cached text", not refreshed.cached and outcomes[2] == "cached"),
+        ("Parser version bump parses again", not new_parser.cached and outcomes[3] == "cached"),
+        ("Extractor version bump extracts again", not new_extractor.cached and outcomes[4] == "ok"),
+        ("Results agree", new_parser.parsed.get("custodySchedule") == new_extractor.parsed.get("custodySchedule") == first.parsed.get("custodySchedule")),
+    ])
+
+
+async def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 PARSE CACHE TEST SUITE")
+    print("=" * 60)
+
+    total_passed = 0
+    total_failed = 0
+    try:
+        for test in (test_keys, test_pipeline):
+            p, f = await test()
+            total_passed += p
+            total_failed += f
+    finally:
+        extraction_pool.shutdown()
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,215 @@
+"""
+Test Suite for Background Parse Jobs
+
+Tests:
+1. A claimed job keeps its lease; once it expires the job is requeued,
+   unless its worker renewed the lease in the meantime
+2. Failing jobs are retried up to PARSE_JOB_MAX_ATTEMPTS and then marked
+   failed; ValueError fails right away
+3. GET /api/v1/documents/jobs/{id} reports the job to its family only
+
+Runs on the in-memory database, with short leases and retry delays.
+"""
+
+import asyncio
+import copy
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import db
+from models import User
+from routers import documents
+from routers.auth import get_current_user
+from services import parse_jobs
+
+FAMILY_EMAIL = "jobs-parent@example.com"
+OTHER_EMAIL = "jobs-other@example.com"
+
+calls = {"flaky": 0, "bad": 0, "ok": 0}
+failures = []
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+async def flaky_handler(job):
+    calls["flaky"] += 1
+    raise RuntimeError("parser unavailable")
+
+
+async def bad_handler(job):
+    calls["bad"] += 1
+    raise ValueError("Unsupported file type")
+
+
+async def ok_handler(job):
+    calls["ok"] += 1
+    return {"parsed": True}
+
+
+def status(job_id):
+    return parse_jobs.get_job(job_id)["status"]
+
+
+async def wait_for(job_ids, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(status(job_id) in parse_jobs.TERMINAL_STATUSES for job_id in job_ids):
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+
+async def test_leases(family_id):
+    print("\n" + "=" * 60)
+    print("Testing Leases and Expiry")
+    print("=" * 60)
+
+    job = parse_jobs.enqueue("test-ok", family_id, {})
+    queued = status(job["id"]) == "queued"
+    claimed = copy.deepcopy(parse_jobs._claim(job["id"]))
+    second_claim = parse_jobs._claim(job["id"])
+    live_kept = parse_jobs._requeue_expired() == []
+
+    # The worker renews the lease between the expiry scan and the requeue
+    await asyncio.sleep(parse_jobs.LEASE_SECONDS + 0.1)
+    find = db.parse_jobs.find
+
+    def find_then_renew(query, *args):
+        # Copies, as a real database returns them
+        found = copy.deepcopy(list(find(query, *args)))
+        for expired in found:
+            db.parse_jobs.update_one({"id": expired["id"]}, {"$set": {"lease_until": parse_jobs._lease_until()}})
+        return found
+
+    db.parse_jobs.find = find_then_renew
+    try:
+        renewed_kept = parse_jobs._requeue_expired() == []
+    finally:
+        db.parse_jobs.find = find
+    still_running = status(job["id"]) == "running"
+
+    await asyncio.sleep(parse_jobs.LEASE_SECONDS + 0.1)
+    requeued = parse_jobs._requeue_expired()
+    after = parse_jobs.get_job(job["id"])
+    print(f"  requeued: {requeued}; lease: {after.get('lease_owner')}")
+    return report([
+        ("New job is persisted as queued", queued),
+        ("Claim takes a lease", claimed is not None and claimed["lease_owner"] == parse_jobs._owner and claimed["lease_until"] is not None),
+        ("A claimed job can't be claimed twice", second_claim is None),
+        ("Job with a live lease is not requeued", live_kept),
+        ("Lease renewed during the scan keeps the job", renewed_kept and still_running),
+        ("Expired lease requeues the job", requeued == [job["id"]] and after["status"] == "queued"),
+        ("Requeued job has no lease", after.get("lease_owner") is None and after.get("lease_until") is None),
+    ]), job["id"]
+
+
+async def test_retries(family_id, requeued_id):
+    print("\n" + "=" * 60)
+    print("Testing Retries and Failure")
+    print("=" * 60)
+
+    flaky = parse_jobs.enqueue("test-flaky", family_id, {"fileContent": "abc"})
+    bad = parse_jobs.enqueue("test-bad", family_id, {})
+    parse_jobs.start()
+    try:
+        finished = await wait_for([flaky["id"], bad["id"], requeued_id])
+    finally:
+        await parse_jobs.stop()
+    flaky_job, bad_job = parse_jobs.get_job(flaky["id"]), parse_jobs.get_job(bad["id"])
+    print(f"  flaky: {flaky_job['status']} after {flaky_job['attempts']} attempts ({flaky_job['error']})")
+    return report([
+        ("Jobs finish", finished),
+        ("Requeued job is run on start", status(requeued_id) == "succeeded" and calls["ok"] == 1),
+        ("Failing job is retried up to the limit", calls["flaky"] == parse_jobs.MAX_ATTEMPTS == flaky_job["attempts"]),
+        ("Then it is marked failed with its error", flaky_job["status"] == "failed" and flaky_job["error"] == "parser unavailable"),
+        ("Failure handler runs once", failures == [flaky["id"]]),
+        ("ValueError fails without a retry", bad_job["status"] == "failed" and bad_job["attempts"] == 1 and calls["bad"] == 1),
+        ("Finished jobs drop the file content", flaky_job["payload"].get("fileContent") is None),
+        ("Retries are counted", parse_jobs.stats()["retries"] == parse_jobs.MAX_ATTEMPTS - 1),
+    ]), flaky["id"]
+
+
+def test_status_endpoint(ok_id, failed_id):
+    print("\n" + "=" * 60)
+    print("Testing the Job Status Endpoint")
+    print("=" * 60)
+
+    app = FastAPI()
+    app.include_router(documents.router)
+    user = {"email": FAMILY_EMAIL}
+    app.dependency_overrides[get_current_user] = lambda: User(
+        firstName="Test", lastName="Parent", email=user["email"], password="x"
+    )
+    client = TestClient(app)
+
+    succeeded = client.get(f"/api/v1/documents/jobs/{ok_id}")
+    failed = client.get(f"/api/v1/documents/jobs/{failed_id}")
+    missing = client.get("/api/v1/documents/jobs/no-such-job")
+    user["email"] = OTHER_EMAIL
+    foreign = client.get(f"/api/v1/documents/jobs/{ok_id}")
+    print(f"  {succeeded.json()}")
+    return report([
+        ("Succeeded job is reported with its result",
+         succeeded.status_code == 200 and succeeded.json()["status"] == "succeeded" and succeeded.json()["result"] == {"parsed": True}),
+        ("Failed job is reported with attempts and error",
+         failed.status_code == 200 and failed.json()["attempts"] == parse_jobs.MAX_ATTEMPTS and failed.json()["error"] == "parser unavailable"),
+        ("Unknown job is 404", missing.status_code == 404),
+        ("Another family's job is 403", foreign.status_code == 403),
+    ])
+
+
+async def run_queue_tests(family_id):
+    (p1, f1), ok_id = await test_leases(family_id)
+    (p2, f2), failed_id = await test_retries(family_id, ok_id)
+    return p1 + p2, f1 + f2, ok_id, failed_id
+
+
+def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 PARSE JOBS TEST SUITE")
+    print("=" * 60)
+
+    parse_jobs.LEASE_SECONDS = 0.3
+    parse_jobs.RETRY_BASE_SECONDS = 0.01
+    parse_jobs.register_handler("test-ok", ok_handler)
+    parse_jobs.register_handler("test-flaky", flaky_handler, on_failure=lambda job, error: failures.append(job["id"]))
+    parse_jobs.register_handler("test-bad", bad_handler)
+    family_id = str(db.families.insert_one({"parent1_email": FAMILY_EMAIL}).inserted_id)
+    db.families.insert_one({"parent1_email": OTHER_EMAIL})
+
+    total_passed, total_failed, ok_id, failed_id = asyncio.run(run_queue_tests(family_id))
+    p, f = test_status_endpoint(ok_id, failed_id)
+    total_passed += p
+    total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
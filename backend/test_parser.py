@@ -16,6 +16,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from services.document_parser import DocumentParser
+from services import document_classifier, pattern_rules
 
 # Test cases for pattern matching
 TEST_CASES = [
@@ -161,6 +162,54 @@ async def test_pattern_matching():
     return passed, failed
 
 
+async def test_pattern_rule_table():
+    """Test that a new phrasing can be added as a rule table entry."""
+    print("\n" + "=" * 60)
+    print("Testing Pattern Rule Table")
+    print("=" * 60)
+    
+    # Same shape as an entry in services/pattern_rules.json
+    rule_set = pattern_rules._build_rule_set("custom", {
+        "defaults": {"custodySchedule": None, "extractedTerms": []},
+        "rules": [
+            {"id": "schedule-2-2-3", "group": "schedule", "priority": 20,
+             "patterns": ["2\\s*-\\s*2\\s*-\\s*3"], "set": {"custodySchedule": "2-2-3 schedule"}},
+            {"id": "every-other-week", "group": "schedule", "priority": 10,
+             "patterns": ["every\\s+other\\s+week"], "set": {"custodySchedule": "Week-on/week-off"},
+             "term": "Custody Schedule", "value": "Every Other Week", "confidence": 0.7},
+        ]
+    })
+    
+    weekly = rule_set.apply("The children reside with each parent every other week.")
+    both = rule_set.apply("A 2-2-3 rotation, or every other week during summer.")
+    checks = [
+        ("New phrasing matched", weekly["custodySchedule"] == "Week-on/week-off"),
+        ("Term added", weekly["extractedTerms"] == [{"term": "Custody Schedule", "value": "Every Other Week", "confidence": 0.7}]),
+        ("Higher priority wins within a group", both["custodySchedule"] == "2-2-3 schedule" and not both["extractedTerms"]),
+        ("Shipped rule sets compile", all(pattern_rules.get_rule_set(name) for name in ("agreement", "document-type"))),
+        ("Batch uploads are classified by name and text", [
+            document_classifier.classify_text(name, text)[0] for name, text in (
+                ("Parenting_Plan.pdf", ""),
+                ("scan001.pdf", "IN THE DISTRICT COURT ... IT IS HEREBY ORDERED that"),
+                ("report-card-2025.pdf", ""),
+                ("notes.txt", "Groceries and errands"),
+            )
+        ] == ["custody-agreement", "court-order", "school", "other"]),
+        ("Custody terms in a decree don't make it an agreement", document_classifier.classify_text(
+            "decree.pdf", "FINAL DECREE. IT IS HEREBY ORDERED that the parties share joint legal custody.")[0] == "court-order"),
+        ("Custody terms alone are too weak to act on", not document_classifier.is_confirmed(
+            document_classifier.classify_text("letter.pdf", "Re: parenting time over the holidays")[1])),
+        ("Agreement titles are sure enough to act on", document_classifier.is_confirmed(document_classifier.classify_text("Parenting_Plan.pdf", "")[1])),
+    ]
+    
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    
+    return passed, len(checks) - passed
+
+
 async def test_sample_agreement():
     """Test parsing the sample agreement file."""
     print("\n" + "=" * 60)
@@ -329,6 +378,11 @@ async def main():
     total_passed += p
     total_failed += f
     
+    # Test 2b: Rule table
+    p, f = await test_pattern_rule_table()
+    total_passed += p
+    total_failed += f
+    
     # Test 3: Sample agreement
     p, f = await test_sample_agreement()
     total_passed += p
@@ -0,0 +1,161 @@
+"""
+Test Suite for the Multipart Upload Endpoints
+
+Tests:
+1. A mixed batch (/upload/batch): good files are stored and classified,
+   a bad one fails on its own, and only confirmed agreements get a job
+2. An upload over the size limit is aborted mid-stream (/upload/stream)
+   without leaving a blob, a document or a staging file behind
+3. blobs/incoming is empty after every request
+
+Runs on the in-memory database; files are written to a temporary directory.
+"""
+
+import functools
+import os
+import sys
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import db
+from models import User
+from routers import documents
+from routers.auth import get_current_user
+from services import blob_store, file_storage
+
+EMAIL = "uploads-parent@example.com"
+SIZE_LIMIT = 4096
+AGREEMENT = (
+    b"CUSTODY AGREEMENT\n\nThe parents share joint legal custody. Physical custody follows a "
+    b"2-2-3 rotating schedule. Holidays alternate each year.\n"
+)
+
+
+def report(checks):
+    passed = 0
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+        passed += ok
+    return passed, len(checks) - passed
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.include_router(documents.router)
+    app.dependency_overrides[get_current_user] = lambda: User(
+        firstName="Test", lastName="Parent", email=EMAIL, password="x"
+    )
+    return TestClient(app)
+
+
+def incoming_files():
+    if not os.path.isdir(blob_store.INCOMING_DIR):
+        return []
+    return os.listdir(blob_store.INCOMING_DIR)
+
+
+def test_batch(client, family_id):
+    print("\n" + "=" * 60)
+    print("Testing a Mixed Batch Upload")
+    print("=" * 60)
+
+    blobs_before = db.blobs.count_documents({})
+    response = client.post("/api/v1/documents/upload/batch", files=[
+        ("files", ("Custody_Agreement.txt", AGREEMENT, "text/plain")),
+        ("files", ("letter.txt", b"Dear parents, the school trip is on Friday.", "text/plain")),
+        ("files", ("empty.pdf", b"", "application/pdf")),
+        ("files", ("huge.pdf", b"%PDF-1.4 " + os.urandom(SIZE_LIMIT), "application/pdf")),
+    ])
+    manifest = response.json()
+    entries = {entry["fileName"]: entry for entry in manifest.get("files", [])}
+    agreement, letter = entries.get("Custody_Agreement.txt", {}), entries.get("letter.txt", {})
+    for name, entry in entries.items():
+        print(f"  {name}: {entry['status']} {entry.get('classification') or entry.get('error')}")
+    stored_ids = {entry["document"]["id"] for entry in entries.values() if entry["status"] == "stored"}
+    return report([
+        ("Batch succeeds despite bad files", response.status_code == 200 and len(entries) == 4),
+        ("Good files are stored", agreement.get("status") == letter.get("status") == "stored"),
+        ("Empty file fails on its own", entries.get("empty.pdf", {}).get("status") == "failed"),
+        ("File over the size limit fails on its own", "too large" in entries.get("huge.pdf", {}).get("error", "")),
+        ("Confirmed agreement is protected and gets a parse job",
+         bool(agreement.get("document", {}).get("isProtected") and agreement["document"].get("jobId"))),
+        ("Unconfirmed guess is flagged for review and gets no job",
+         letter.get("classification", {}).get("needsReview") is True and not letter["document"].get("jobId")),
+        ("Only the stored files have documents",
+         {doc["id"] for doc in db.documents.find({"family_id": family_id})} >= stored_ids
+         and db.documents.count_documents({"family_id": family_id, "file_name": {"$in": ["empty.pdf", "huge.pdf"]}}) == 0),
+        ("Only the stored files keep a blob", db.blobs.count_documents({}) - blobs_before == 2),
+        ("No staging files are left", incoming_files() == []),
+    ])
+
+
+def test_stream_limit(client, family_id):
+    print("\n" + "=" * 60)
+    print("Testing the Size Limit on Streamed Uploads")
+    print("=" * 60)
+
+    blobs_before = db.blobs.count_documents({})
+    documents_before = db.documents.count_documents({"family_id": family_id})
+    too_large = client.post(
+        "/api/v1/documents/upload/stream",
+        data={"name": "Scan", "type": "other"},
+        files={"file": ("scan.pdf", b"%PDF-1.4 " + os.urandom(SIZE_LIMIT * 3), "application/pdf")},
+    )
+    within = client.post(
+        "/api/v1/documents/upload/stream",
+        data={"name": "Receipt", "type": "other"},
+        files={"file": ("receipt.pdf", b"%PDF-1.4 " + os.urandom(SIZE_LIMIT // 2), "application/pdf")},
+    )
+    print(f"  over the limit: {too_large.status_code} {too_large.json().get('detail')}")
+    return report([
+        ("Upload over the limit is rejected with 400", too_large.status_code == 400),
+        ("Upload within the limit is stored", within.status_code == 200 and within.json().get("status") == "processed"),
+        ("Rejected upload leaves no document", db.documents.count_documents({"family_id": family_id}) == documents_before + 1),
+        ("Rejected upload leaves no blob", db.blobs.count_documents({}) == blobs_before + 1),
+        ("No staging files are left", incoming_files() == []),
+    ])
+
+
+def main():
+    """Run all tests."""
+    print("\n" + "=" * 60)
+    print("🧪 UPLOAD ENDPOINTS TEST SUITE")
+    print("=" * 60)
+
+    total_passed = 0
+    total_failed = 0
+    with tempfile.TemporaryDirectory(prefix="uploads-") as directory:
+        blob_store.BLOBS_DIR = os.path.join(directory, "blobs")
+        blob_store.INCOMING_DIR = os.path.join(blob_store.BLOBS_DIR, "incoming")
+        # Small chunks and limit, so the limit is hit part-way through the stream
+        file_storage.UPLOAD_CHUNK_BYTES = 1024
+        blob_store.store_upload = functools.partial(blob_store.store_upload, max_bytes=SIZE_LIMIT)
+        family_id = str(db.families.insert_one({"parent1_email": EMAIL}).inserted_id)
+        client = make_client()
+        for test in (test_batch, test_stream_limit):
+            p, f = test(client, family_id)
+            total_passed += p
+            total_failed += f
+
+    print("\n" + "=" * 60)
+    print("📊 FINAL RESULTS")
+    print("=" * 60)
+    print(f"Total Passed: {total_passed}")
+    print(f"Total Failed: {total_failed}")
+
+    if total_failed == 0:
+        print("\n✅ All tests passed!")
+    else:
+        print(f"\n⚠️  {total_failed} test(s) need attention")
+
+    return total_failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)